@@ -0,0 +1,105 @@
+"""
+Анимация роз (/animate): розы кадров, отрисовка кадров и их распределение по воркерам.
+
+Розы всех кадров считаются запросами к одному TimeIndex (rolling_roses) и,
+для сравнения, processing и smartrose_processing по срезу на каждый кадр.
+Кадр рисуется поверх готового фона (blitting) и сравнивается с полной
+отрисовкой совмещённой розы. Затем кадры рисуются частями в RenderPool с
+разным числом воркеров и собираются в GIF — как в боте.
+
+Пример:
+    python bench/bench_animation.py --years 5 --frames 120 --workers 1 2 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import rozovetrovnitsa as rz  # noqa: E402
+from render_pool import RenderPool  # noqa: E402
+from synthetic import make_archive, read_archive  # noqa: E402
+
+
+def sliced_roses(dataset: rz.MeteoDataset, titles: list[str]) -> list:
+    """Розы кадров без индекса: срез наблюдений и processing на каждый кадр."""
+    times = dataset.data['time']
+    values = []
+    for title in titles:
+        start = pd.to_datetime(title.split(' — ')[0], format='%d.%m.%Y %H:%M')
+        end = start + pd.Timedelta(hours=rz.ANIMATION_SPAN_HOURS)
+        frame = dataset.data[(times >= start) & (times < end)]
+        simple = rz.processing(frame, rz.WIND_DIRECTIONS)['DD'].to_numpy(dtype='float64')
+        smart = rz.smartrose_processing(frame, rz.WIND_DIRECTIONS, dataset.decay_rate)['importance_wind'].to_numpy()
+        values.append([rz._normalize(smart).tolist(), rz._normalize(simple).tolist()])
+    return values
+
+
+async def render_in_pool(workers: int, frames: dict, paths: list[str], output_path: str) -> float:
+    """Время отрисовки кадров частями в пуле из workers воркеров и сборки GIF, секунды."""
+    pool = RenderPool(workers, 0, preload=('rozovetrovnitsa',), warm_up='rozovetrovnitsa:warm_up')
+    try:
+        await pool.start()
+        start = time.perf_counter()
+        bounds = [len(paths) * part // workers for part in range(workers + 1)]
+        await asyncio.gather(*(
+            pool.run('rozovetrovnitsa:render_rose_frames', frames['values'][lo:hi], frames['titles'][lo:hi], paths[lo:hi])
+            for lo, hi in zip(bounds, bounds[1:]) if hi > lo
+        ))
+        await pool.run('rozovetrovnitsa:encode_animation', paths, output_path, 50 * 1024 * 1024)
+        return time.perf_counter() - start
+    finally:
+        pool.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--years', type=float, default=5)
+    parser.add_argument('--frames', type=int, default=120)
+    parser.add_argument('--step', type=int, default=6, help='шаг между кадрами, часов')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        archive = make_archive(os.path.join(temp_dir, 'archive.xls.gz'), args.years)
+        dataset = rz.MeteoDataset(rz.read_rp5(read_archive(archive)))
+        dataset.time_index
+
+        start = time.perf_counter()
+        frames = rz.rolling_roses(dataset, step_hours=args.step, max_frames=args.frames)
+        index_time = time.perf_counter() - start
+        start = time.perf_counter()
+        sliced_roses(dataset, frames['titles'])
+        sliced_time = time.perf_counter() - start
+        count = len(frames['titles'])
+        print(f"архив {args.years:g} лет, {count} кадров через {args.step} ч, {os.cpu_count()} ядер")
+        print(f"{'розы кадров: срезы + processing':<38} {sliced_time * 1000:8.1f} мс")
+        print(f"{'розы кадров: TimeIndex':<38} {index_time * 1000:8.1f} мс")
+
+        rz.warm_up()
+        paths = [os.path.join(temp_dir, f'frame-{index:04d}.png') for index in range(count)]
+        start = time.perf_counter()
+        for frame, title, path in zip(frames['values'], frames['titles'], paths):
+            rz._render('combined_rose', [np.asarray(rose) for rose in frame], title, path)
+        full_time = (time.perf_counter() - start) / count
+        start = time.perf_counter()
+        rz.render_rose_frames(frames['values'], frames['titles'], paths)
+        blit_time = (time.perf_counter() - start) / count
+        print(f"{'кадр: полная отрисовка':<38} {full_time * 1000:8.1f} мс")
+        print(f"{'кадр: поверх фона':<38} {blit_time * 1000:8.1f} мс")
+
+        for workers in args.workers:
+            seconds = asyncio.run(render_in_pool(workers, frames, paths, os.path.join(temp_dir, 'animation')))
+            size = os.path.getsize(os.path.join(temp_dir, 'animation.gif'))
+            print(f"{f'кадры + GIF, воркеров {workers}':<38} {seconds:8.2f} с, {size / 1024:.0f} КБ")
+
+
+if __name__ == '__main__':
+    main()
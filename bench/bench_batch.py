@@ -0,0 +1,104 @@
+"""
+Пакет станций против отдельных архивов: сколько ждёт пользователь, присылая N станций.
+
+Бот запускается против bench/fake_telegram.py, как в bench/load_test.py, без
+кэшей. Один и тот же набор из --stations архивов присылается тремя способами:
+отдельными сообщениями (три графика и вердикт на каждый архив), одним zip и
+одним альбомом (сетка роз и таблица ADD). Меряется время до последнего ответа.
+
+Пример:
+    RENDER_WORKERS=4 python bench/bench_batch.py --stations 4 --years 5
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'bot'))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_telegram import FakeTelegram  # noqa: E402
+from load_test import final_status, start_bot  # noqa: E402
+from synthetic import make_archive  # noqa: E402
+
+
+def make_stations(temp_dir: str, count: int, years: float) -> list[str]:
+    """Архивы count разных станций."""
+    return [
+        make_archive(os.path.join(temp_dir, f'station{i}.xls.gz'), years, seed=i,
+                     station=f'Станция {i}', wmo_id=90000 + i)
+        for i in range(1, count + 1)
+    ]
+
+
+def make_zip(path: str, archives: list[str]) -> str:
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for archive in archives:
+            zf.write(archive, os.path.basename(archive))
+    return path
+
+
+def timed_uploads(server: FakeTelegram, send) -> tuple[float, list]:
+    """Присылает сообщения функцией send и ждёт последних ответов."""
+    started = time.perf_counter()
+    uploads = send()
+    server.wait_finished(600)
+    return time.perf_counter() - started, uploads
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--stations', type=int, default=4)
+    parser.add_argument('--years', type=float, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        archives = make_stations(temp_dir, args.stations, args.years)
+        server = FakeTelegram(('127.0.0.1', 0), is_final=final_status)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        file_ids = [server.add_file(archive) for archive in archives]
+        zip_id = server.add_file(make_zip(os.path.join(temp_dir, 'stations.zip'), archives))
+
+        def album():
+            uploads = [server.send_document(3, file_id, media_group_id='album') for file_id in file_ids]
+            # Бот отвечает только на первое сообщение альбома
+            for upload in uploads[1:]:
+                upload.status = 'album'
+            return uploads
+
+        bot = start_bot(server, os.path.join(temp_dir, 'bot.log'), no_cache=True)
+        try:
+            if not server.connected.wait(60):
+                sys.exit('бот не подключился к заглушке')
+            # Прогрев: первый архив после запуска ждёт загрузки воркеров
+            timed_uploads(server, lambda: [server.send_document(9, file_ids[0])])
+            results = {
+                'отдельными архивами': timed_uploads(
+                    server, lambda: [server.send_document(1, file_id) for file_id in file_ids]),
+                'одним zip': timed_uploads(server, lambda: [server.send_document(2, zip_id)]),
+                'альбомом': timed_uploads(server, album),
+            }
+        finally:
+            bot.send_signal(signal.SIGINT)
+            try:
+                bot.wait(60)
+            except subprocess.TimeoutExpired:
+                bot.kill()
+            server.shutdown()
+
+    print(f"{args.stations} станций по {args.years:g} лет, RENDER_WORKERS={os.environ.get('RENDER_WORKERS', 'число ядер')}")
+    for name, (seconds, uploads) in results.items():
+        photos = sum(kind == 'photo' for upload in uploads for kind, _ in upload.replies)
+        statuses = sorted({upload.status for upload in uploads} - {'album'})
+        print(f"{name:<22} {seconds:6.2f} с, картинок {photos:>2}, статус {', '.join(statuses)}")
+
+
+if __name__ == '__main__':
+    main()
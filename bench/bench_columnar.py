@@ -0,0 +1,59 @@
+"""
+Сравнивает разбор архива через xlrd и чтение из колоночного кэша (Arrow + mmap).
+
+Архивы на 1, 5 и 20 лет генерируются bench/synthetic.py во временной папке.
+
+Пример:
+    python bench/bench_columnar.py --repeat 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from columnar import ColumnarCache  # noqa: E402
+from result_cache import archive_digest  # noqa: E402
+from rozovetrovnitsa import load_meteo_dataset  # noqa: E402
+from synthetic import make_archive, read_archive  # noqa: E402
+
+
+def best_time(func, repeat: int) -> float:
+    """Лучшее время из repeat запусков, секунды."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--years', type=float, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'лет':>4} {'строк':>7} {'xls.gz, КБ':>11} {'arrow, КБ':>10} {'xlrd, с':>8} {'arrow, с':>9} {'ускорение':>10}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = ColumnarCache(os.path.join(temp_dir, 'columnar'), max_bytes=1 << 40)
+        for years in args.years:
+            archive = make_archive(os.path.join(temp_dir, f'{years}y.xls.gz'), years)
+            xls = read_archive(archive)
+            digest = archive_digest(xls)
+
+            xlrd_time = best_time(lambda: load_meteo_dataset(xls), args.repeat)
+            # Первый вызов с кэшем разбирает .xls и сохраняет таблицу
+            parsed = load_meteo_dataset(xls, cache, digest).observations
+            arrow_time = best_time(lambda: load_meteo_dataset(xls, cache, digest), args.repeat)
+
+            print(f"{years:>4g} {len(parsed):>7} {os.path.getsize(archive) / 1024:>11.0f} "
+                  f"{os.path.getsize(cache.path(digest)) / 1024:>10.0f} {xlrd_time:>8.3f} "
+                  f"{arrow_time:>9.4f} {xlrd_time / arrow_time:>9.0f}x")
+
+
+if __name__ == '__main__':
+    main()
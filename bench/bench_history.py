@@ -0,0 +1,95 @@
+"""
+Сравнивает расчёт графиков по самому архиву и по истории станции (StationHistory).
+
+Сценарий: станция уже есть в истории без последнего месяца, пользователь присылает
+архив за весь период. С историей в неё дописывается только этот месяц, а розы,
+ADD и осадки считаются по суточным суммам. Разбор .xls (xlrd) нужен в обоих
+случаях и печатается отдельно.
+
+Пример:
+    python bench/bench_history.py --years 1 5 20 --repeat 3
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import rozovetrovnitsa as rz  # noqa: E402
+from history import StationHistory  # noqa: E402
+from synthetic import make_archive, read_archive  # noqa: E402
+
+# Сколько суток наблюдений новые в присланном архиве
+NEW_DAYS = 30
+
+
+def best_time(func, repeat: int) -> float:
+    """Лучшее время из repeat запусков, секунды."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def aggregates(dataset: rz.MeteoDataset) -> tuple:
+    """Всё, что графики считают по наблюдениям, кроме отрисовки."""
+    return (
+        rz.processing(dataset.data, rz.WIND_DIRECTIONS)['DD'].to_numpy(dtype='float64'),
+        rz._smart_rose(dataset)['importance_wind'].to_numpy(),
+        rz.ADD(dataset),
+        rz.rain_processing(dataset.data, dataset.daily)['RRR'].to_numpy(),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--years', type=float, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'лет':>4} {'строк':>7} {'разбор, с':>10} {'по архиву, с':>13} {'дописать, с':>12} "
+          f"{'по истории, с':>14} {'ускорение':>10}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for years in args.years:
+            archive = make_archive(os.path.join(temp_dir, f'{years}y.xls.gz'), years)
+            xls = read_archive(archive)
+            parse_time = best_time(lambda: rz.read_rp5(xls), 1)
+            observations = rz.read_rp5(xls)
+            times = observations['time'].to_numpy(dtype='datetime64[ns]')
+            cutoff = times[0].astype('datetime64[D]') - (NEW_DAYS - 1)
+            known = observations[times < cutoff]
+            known.attrs = dict(observations.attrs)
+
+            scratch = rz.MeteoDataset(observations)
+            scratch_time = best_time(lambda: aggregates(scratch), args.repeat)
+
+            history_dir = os.path.join(temp_dir, 'history')
+            merged = rz.MeteoDataset(observations)
+
+            def merge() -> None:
+                # Каждый замер начинается с истории без последних NEW_DAYS суток
+                shutil.rmtree(history_dir, ignore_errors=True)
+                history = StationHistory(history_dir, max_bytes=1 << 40)
+                rz.merge_station_history(history, rz.MeteoDataset(known))
+                start = time.perf_counter()
+                merged.daily = rz.merge_station_history(history, merged)
+                merge_times.append(time.perf_counter() - start)
+
+            merge_times = []
+            for _ in range(args.repeat):
+                merge()
+            merge_time = min(merge_times)
+            daily_time = best_time(lambda: aggregates(merged), args.repeat)
+
+            print(f"{years:>4g} {len(observations):>7} {parse_time:>10.3f} {scratch_time:>13.4f} "
+                  f"{merge_time:>12.4f} {daily_time:>14.4f} {scratch_time / (merge_time + daily_time):>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
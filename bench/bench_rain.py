@@ -0,0 +1,76 @@
+"""
+Бенчмарк rain_processing: групповые операции над колонками против прежней
+реализации с лямбдами в groupby.agg.
+
+Архивы генерируются bench/synthetic.py во временной папке. Совпадение
+с прежней реализацией проверяет tests/test_processing.py.
+
+Пример:
+    python bench/bench_rain.py --years 1 5 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from rozovetrovnitsa import load_meteo_dataset, rain_processing  # noqa: E402
+from synthetic import make_archive, read_archive  # noqa: E402
+
+
+def legacy_rain_processing(df: pd.DataFrame) -> pd.DataFrame:
+    """Прежняя реализация rain_processing — для сравнения."""
+    df = df.iloc[::-1]
+    rain_df = df[['time', 'W1', 'RRR', 'tR', 'sss']].copy()
+    rain_df['RRR'] = pd.to_numeric(rain_df['RRR'], errors='coerce')
+    rain_df['RRR'] = rain_df['RRR'].fillna(0)
+    rain_df['sss'] = pd.to_numeric(rain_df['sss'], errors='coerce')
+    rain_df['sss'] = rain_df['sss'].interpolate(method='linear')
+    rain_df['tR'] = pd.to_numeric(rain_df['tR'], errors='coerce')
+    rain_df['time'] = pd.to_datetime(rain_df['time'], errors='coerce', dayfirst=True).dt.date
+    rain_df['W1'] = rain_df['W1'].fillna('').apply(lambda x: (x[:20] + '...') if len(x) > 20 else x)
+
+    grouped_rain_df = rain_df.groupby('time').agg({
+        'W1': lambda x: x.mode()[0] if not x.mode().empty else np.nan,
+        'RRR': lambda x: (x.sum() / rain_df.loc[x.index, 'tR'].sum()) * 24 if rain_df.loc[x.index, 'tR'].sum() != 0 else np.nan,
+        'sss': 'max'
+    }).reset_index()
+
+    return grouped_rain_df
+
+
+def best_time(func, repeat: int) -> float:
+    """Лучшее время из repeat запусков, секунды."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--years', type=float, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'лет':>4} {'строк':>7} {'прежняя, с':>11} {'новая, с':>9} {'ускорение':>10}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for years in args.years:
+            archive = make_archive(os.path.join(temp_dir, f'{years}y.xls.gz'), years)
+            df = load_meteo_dataset(read_archive(archive)).data
+
+            legacy = best_time(lambda: legacy_rain_processing(df), args.repeat)
+            vectorized = best_time(lambda: rain_processing(df), args.repeat)
+            print(f"{years:>4g} {len(df):>7} {legacy:>11.3f} {vectorized:>9.4f} {legacy / vectorized:>9.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Бенчмарк отрисовки: построение фигуры с нуля на каждый график
+против переиспользования заготовок (_TEMPLATES) с заменой только данных.
+
+Пример:
+    python bench/bench_render.py --years 1 --repeat 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import rozovetrovnitsa  # noqa: E402
+from rozovetrovnitsa import (  # noqa: E402
+    create_combined_rose, create_rain, create_speedrose, create_temperature, load_meteo_dataset,
+)
+from synthetic import make_archive, read_archive  # noqa: E402
+
+CHARTS = {
+    'роза ветров': create_combined_rose,
+    'температура': create_temperature,
+    'осадки': create_rain,
+    'роза скоростей': create_speedrose,
+}
+
+
+def mean_time(func, repeat: int, fresh: bool) -> float:
+    """Среднее время отрисовки, секунды; fresh — строить фигуру заново каждый раз."""
+    func()  # прогрев: шрифты, кэши matplotlib
+    total = 0.0
+    for _ in range(repeat):
+        if fresh:
+            rozovetrovnitsa._TEMPLATES.clear()
+        start = time.perf_counter()
+        func()
+        total += time.perf_counter() - start
+    return total / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--years', type=float, default=1)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        archive = make_archive(os.path.join(temp_dir, 'archive.xls.gz'), args.years)
+        dataset = load_meteo_dataset(read_archive(archive))
+        image_path = os.path.join(temp_dir, 'chart.jpg')
+
+        print(f"{'график':<14} {'с нуля, мс':>11} {'заготовка, мс':>14} {'выигрыш':>8}")
+        for name, create_chart in CHARTS.items():
+            def render():
+                create_chart(dataset, image_path)
+            fresh = mean_time(render, args.repeat, fresh=True)
+            reused = mean_time(render, args.repeat, fresh=False)
+            print(f"{name:<14} {fresh * 1000:>11.1f} {reused * 1000:>14.1f} {1 - reused / fresh:>8.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Перерисовка командами /window и /decay против повторной загрузки архива.
+
+Бот запускается против bench/fake_telegram.py, как в bench/load_test.py, без
+кэшей. Пользователь присылает архив, а потом перебирает окна дат и затухание
+умной розы: каждая команда перерисовывает графики по разобранному архиву из
+памяти бота. Для сравнения тот же архив присылается ещё раз. Меряется время
+до последнего ответа.
+
+Пример:
+    RENDER_WORKERS=4 python bench/bench_rerender.py --years 5 --commands 10
+"""
+import argparse
+import datetime as dt
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'bot'))
+sys.path.insert(0, BENCH_DIR)
+
+from bench_batch import timed_uploads  # noqa: E402
+from fake_telegram import FakeTelegram  # noqa: E402
+from load_test import final_status, start_bot  # noqa: E402
+from synthetic import END, make_archive  # noqa: E402
+
+
+def commands(count: int, years: float) -> list[str]:
+    """Чередует окна дат разной длины внутри архива и значения затухания."""
+    rng = np.random.default_rng(0)
+    result = []
+    for i in range(count):
+        if i % 2:
+            result.append(f'/decay {rng.uniform(0.05, 1):.2f}')
+            continue
+        days = int(rng.integers(3, max(4, int(years * 365))))
+        last = END.date() - dt.timedelta(days=int(rng.integers(0, max(1, int(years * 365) - days))))
+        result.append(f'/window {last - dt.timedelta(days=days):%Y-%m-%d} {last:%Y-%m-%d}')
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--years', type=float, default=1)
+    parser.add_argument('--commands', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        server = FakeTelegram(('127.0.0.1', 0), is_final=final_status)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        file_id = server.add_file(make_archive(os.path.join(temp_dir, 'archive.xls.gz'), args.years))
+
+        bot = start_bot(server, os.path.join(temp_dir, 'bot.log'), no_cache=True)
+        try:
+            if not server.connected.wait(60):
+                sys.exit('бот не подключился к заглушке')
+            # Первый архив после запуска ждёт прогрева воркеров, в замер не входит
+            timed_uploads(server, lambda: [server.send_document(1, file_id)])
+            upload_seconds, uploads = timed_uploads(server, lambda: [server.send_document(1, file_id)])
+            results = []
+            for command in commands(args.commands, args.years):
+                seconds, replies = timed_uploads(server, lambda: [server.send_command(1, command)])
+                results.append((command, seconds, replies[0].status))
+        finally:
+            bot.send_signal(signal.SIGINT)
+            try:
+                bot.wait(60)
+            except subprocess.TimeoutExpired:
+                bot.kill()
+            server.shutdown()
+
+    print(f"архив {args.years:g} лет, RENDER_WORKERS={os.environ.get('RENDER_WORKERS', 'число ядер')}, "
+          f"RENDER_MODE={os.environ.get('RENDER_MODE', 'sequential')}")
+    print(f"{'повторная загрузка архива':<36} {upload_seconds:6.2f} с, статус {uploads[0].status}")
+    for command, seconds, status in results:
+        print(f"{command:<36} {seconds:6.2f} с, статус {status}")
+    seconds = np.array([seconds for _, seconds, _ in results])
+    print(f"{'команды: p50 / макс.':<36} {np.percentile(seconds, 50):6.2f} / {seconds.max():.2f} с")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Микробенчмарк smartrose_processing: векторное ядро на np.bincount
+против прежней реализации через .dt.components и groupby.
+
+Пример:
+    python bench/bench_smartrose.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from rozovetrovnitsa import (  # noqa: E402
+    IMPORTANCE_DECAY_RATE, WIND_DIRECTIONS, encode_directions, smartrose_processing,
+)
+
+
+def legacy_smartrose_processing(df: pd.DataFrame, winds: list[str]) -> pd.DataFrame:
+    """Прежняя реализация smartrose_processing — для сравнения."""
+    rose = df.copy()
+    rose['time'] = pd.to_datetime(rose['time'], dayfirst=True)
+
+    reftime = rose.iloc[0, 0]
+    rose['reftime'] = reftime
+    rose['age'] = rose['reftime'] - rose['time']
+    rose['age'] = (rose['age'].dt.components.hours + (rose['age'].dt.components.days * 24)) / 24
+    rose['importance'] = np.exp(rose['age'] * IMPORTANCE_DECAY_RATE)
+    rose['importance_wind'] = rose['Ff'] * rose['importance']
+
+    windrose = rose.groupby('DD')['importance_wind'].sum()
+    return windrose.reindex(winds).rename_axis('index').reset_index()
+
+
+def make_observations(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Наблюдения раз в час от новых к старым со случайным ветром."""
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp('2025-10-17 21:00')
+    return pd.DataFrame({
+        'time': end - pd.to_timedelta(np.arange(rows), unit='h'),
+        'DD': np.array(WIND_DIRECTIONS, dtype=object)[rng.integers(0, len(WIND_DIRECTIONS), rows)],
+        'Ff': rng.integers(0, 15, rows).astype('float64'),
+    })
+
+
+def best_time(func, repeat: int) -> float:
+    """Лучшее время из repeat запусков, секунды."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_observations(args.rows)
+    # read_rp5 отдаёт направления уже закодированными категориями
+    encoded = df.assign(DD=encode_directions(df['DD']))
+    legacy = best_time(lambda: legacy_smartrose_processing(df, WIND_DIRECTIONS), args.repeat)
+    vectorized = best_time(lambda: smartrose_processing(encoded, WIND_DIRECTIONS), args.repeat)
+    print(f"{args.rows} наблюдений: прежняя {legacy:.3f} с, bincount {vectorized:.4f} с, "
+          f"ускорение {legacy / vectorized:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
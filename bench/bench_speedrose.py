@@ -0,0 +1,74 @@
+"""
+Микробенчмарк speed_processing: двумерная гистограмма одним np.bincount против
+np.histogram2d и groupby по направлению и классу скорости (pd.cut).
+
+Пример:
+    python bench/bench_speedrose.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from bench_smartrose import best_time, make_observations  # noqa: E402
+from rozovetrovnitsa import (  # noqa: E402
+    CALM_CODE, SPEED_CLASSES, WIND_DIRECTIONS, encode_directions, speed_class_labels, speed_processing, wind_codes,
+)
+
+
+def groupby_speed_processing(df: pd.DataFrame, winds: list[str]) -> pd.DataFrame:
+    """То же через groupby по направлению и классу скорости — для сравнения."""
+    labels = speed_class_labels(SPEED_CLASSES)
+    rose = df.dropna(subset=['Ff'])
+    classes = pd.cut(rose['Ff'], [0.0, *SPEED_CLASSES, np.inf], right=False, labels=labels)
+    counts = rose.groupby([rose['DD'].astype(str), classes], observed=False).size().unstack(fill_value=0)
+    counts = counts.reindex(index=winds, columns=labels, fill_value=0)
+    calm = (df['DD'].astype(str) == 'Х').sum()
+    return counts / (counts.to_numpy().sum() + calm) * 100
+
+
+def histogram2d_speed_processing(df: pd.DataFrame, winds: list[str]) -> pd.DataFrame:
+    """То же через np.histogram2d — для сравнения."""
+    codes = wind_codes(df)
+    speeds = df['Ff'].to_numpy(dtype='float64')
+    valid = (codes >= 0) & (codes < len(winds)) & ~np.isnan(speeds)
+    counts, _, _ = np.histogram2d(
+        codes[valid], speeds[valid], bins=[np.arange(len(winds) + 1), [0.0, *SPEED_CLASSES, np.inf]]
+    )
+    calm = np.count_nonzero(codes == CALM_CODE)
+    return pd.DataFrame(counts / (counts.sum() + calm) * 100, index=winds, columns=speed_class_labels(SPEED_CLASSES))
+
+
+def make_speed_observations(rows: int) -> pd.DataFrame:
+    """Наблюдения make_observations с дробными скоростями и штилем."""
+    df = make_observations(rows)
+    # Дробные скорости и скорости ровно на границах классов
+    df['Ff'] += np.random.default_rng(1).choice([0.0, 0.5], len(df))
+    # Каждое двадцатое наблюдение — штиль: он входит в знаменатель долей
+    df.loc[df.index % 20 == 0, ['DD', 'Ff']] = ['Х', 0.0]
+    return df
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_speed_observations(args.rows)
+    encoded = df.assign(DD=encode_directions(df['DD']))
+
+    grouped = best_time(lambda: groupby_speed_processing(df, WIND_DIRECTIONS), args.repeat)
+    histogram2d = best_time(lambda: histogram2d_speed_processing(encoded, WIND_DIRECTIONS), args.repeat)
+    bincount = best_time(lambda: speed_processing(encoded, WIND_DIRECTIONS), args.repeat)
+    print(f"{args.rows} наблюдений: groupby {grouped:.4f} с, histogram2d {histogram2d:.4f} с, "
+          f"bincount {bincount:.4f} с, ускорение {grouped / bincount:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Холодный старт бота: время импорта bot/main.py, ответа на /start после запуска
+и отрисовки первого и второго архива.
+
+Бот запускается отдельным процессом против bench/fake_telegram.py, как в
+bench/load_test.py. Команда /start и первый архив ставятся в очередь до запуска
+бота — так пользователь видит бота, который только что перезапустился.
+
+Пример:
+    python bench/bench_startup.py --repeat 3
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'bot'))
+sys.path.insert(0, BENCH_DIR)
+
+import messages  # noqa: E402
+from fake_telegram import FakeTelegram  # noqa: E402
+from load_test import final_status, start_bot  # noqa: E402
+from synthetic import make_archive  # noqa: E402
+
+
+def import_time() -> float:
+    """Время импорта bot/main.py в чистом процессе, секунды."""
+    code = 'import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)'
+    output = subprocess.run([sys.executable, '-c', code], cwd=os.path.join(ROOT_DIR, 'bot'),
+                            check=True, capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def cold_start(archives: list[str], temp_dir: str) -> dict:
+    """Один запуск бота: /start и первый архив ждут в очереди, второй приходит после первого."""
+    server = FakeTelegram(
+        ('127.0.0.1', 0),
+        is_final=lambda text: 'ok' if text == messages.START_MESSAGE else final_status(text),
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    file_ids = [server.add_file(archive) for archive in archives]
+
+    command = server.send_command(1, '/start')
+    first = server.send_document(2, file_ids[0])
+    launched = time.perf_counter()
+    bot = start_bot(server, os.path.join(temp_dir, 'bot.log'), no_cache=True)
+    try:
+        server.wait_finished(300)
+        second = server.send_document(3, file_ids[1])
+        server.wait_finished(300)
+    finally:
+        bot.send_signal(signal.SIGINT)
+        bot.wait(30)
+        server.shutdown()
+    return {
+        'start_reply': command.finished_at - launched,
+        'first_rose': first.finished_at - launched,
+        'second_rose': second.finished_at - second.sent_at,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--years', type=float, default=1)
+    args = parser.parse_args()
+
+    imports = [import_time() for _ in range(args.repeat)]
+    runs = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        archives = [make_archive(os.path.join(temp_dir, f'{i}.xls.gz'), args.years, seed=i) for i in range(2)]
+        for _ in range(args.repeat):
+            runs.append(cold_start(archives, temp_dir))
+
+    print(f"импорт bot/main.py:            {statistics.median(imports):6.2f} с")
+    print(f"ответ на /start после запуска: {statistics.median(r['start_reply'] for r in runs):6.2f} с")
+    print(f"первый архив после запуска:    {statistics.median(r['first_rose'] for r in runs):6.2f} с")
+    print(f"второй архив:                  {statistics.median(r['second_rose'] for r in runs):6.2f} с")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Сравнивает розы и ADD за окно по строкам окна и запросом к префиксным суммам (TimeIndex).
+
+Сценарий /window: архив разобран, пользователь смотрит разные окна. По строкам
+каждое окно заново вырезает наблюдения и считает простую и умную розы и ADD;
+с индексом окно — два двоичных поиска и разности накопленных сумм. Индекс
+строится один раз на архив, время построения печатается отдельно. Совпадение
+результатов проверяет tests/test_time_index.py.
+
+Пример:
+    python bench/bench_time_index.py --years 1 5 20 --windows 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import rozovetrovnitsa as rz  # noqa: E402
+from synthetic import make_archive, read_archive  # noqa: E402
+
+
+def aggregates(dataset: rz.MeteoDataset) -> tuple:
+    """Розы и ADD — то, что окно меняет в графиках роз и вердикте."""
+    return (
+        rz._simple_rose(dataset)['DD'].to_numpy(dtype='float64'),
+        rz._smart_rose(dataset)['importance_wind'].to_numpy(),
+        rz.ADD(dataset),
+    )
+
+
+def random_windows(observations, count: int, seed: int = 0) -> list:
+    """Случайные окна из целых дней архива."""
+    days = np.unique(observations['time'].to_numpy(dtype='datetime64[D]'))
+    rng = np.random.default_rng(seed)
+    return [tuple(pd.Timestamp(day).date() for day in sorted(rng.choice(days, 2))) for _ in range(count)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--years', type=float, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--windows', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'лет':>4} {'строк':>7} {'индекс, с':>10} {'по строкам, мс/окно':>20} "
+          f"{'по индексу, мс/окно':>20} {'ускорение':>10}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for years in args.years:
+            archive = make_archive(os.path.join(temp_dir, f'{years}y.xls.gz'), years)
+            observations = rz.read_rp5(read_archive(archive))
+            base = rz.MeteoDataset(observations)
+            windows = random_windows(observations, args.windows)
+
+            start = time.perf_counter()
+            base.time_index
+            build_time = time.perf_counter() - start
+
+            # По строкам: срез наблюдений окна без индекса
+            start = time.perf_counter()
+            for window in windows:
+                aggregates(rz.MeteoDataset(rz.reframe_dataset(base, window).observations))
+            scan_time = (time.perf_counter() - start) / len(windows)
+
+            start = time.perf_counter()
+            for window in windows:
+                aggregates(rz.reframe_dataset(base, window))
+            index_time = (time.perf_counter() - start) / len(windows)
+
+            print(f"{years:>4g} {len(observations):>7} {build_time:>10.4f} {scan_time * 1000:>20.2f} "
+                  f"{index_time * 1000:>20.2f} {scan_time / index_time:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
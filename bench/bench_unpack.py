@@ -0,0 +1,77 @@
+"""
+Сравнивает распаковку архива во временный файл на диске и в память.
+
+Оба пути — unpack_archive, как в боте: архив больше ARCHIVE_MEMORY_MAX_MB
+скачивается на диск и распаковывается в файл рядом, меньший — в память.
+Колонка «бот» — какой путь бот выберет для архива такого размера при
+--memory-max-mb. Время включает распаковку и разбор .xls через xlrd. На
+общих дисках выигрыш больше, чем на локальном tmpfs: пропадает запись и
+чтение .xls.
+
+Пример:
+    python bench/bench_unpack.py --years 1 5 20 --repeat 3 --memory-max-mb 2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from archive import unpack_archive  # noqa: E402
+from rozovetrovnitsa import read_rp5  # noqa: E402
+from synthetic import make_archive  # noqa: E402
+
+MAX_SIZE = 1 << 30
+
+
+def best_time(func, repeat: int) -> float:
+    """Лучшее время из repeat запусков, секунды."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def on_disk(archive: str) -> None:
+    """Крупный архив: скачан в файл, .xls пишется рядом с ним и удаляется после разбора."""
+    extracted_path = unpack_archive(archive, MAX_SIZE)
+    try:
+        read_rp5(extracted_path)
+    finally:
+        os.remove(extracted_path)
+
+
+def in_memory(archive: str) -> None:
+    """Небольшой архив: уже в памяти после download_to_memory."""
+    with open(archive, 'rb') as f:
+        content = f.read()
+    read_rp5(unpack_archive(content, MAX_SIZE))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--years', type=float, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--memory-max-mb', type=float, default=2,
+                        help='ARCHIVE_MEMORY_MAX_MB бота (по умолчанию — как у бота при ARCHIVE_MAX_MB=20)')
+    parser.add_argument('--dir', default=None, help='папка для архивов (по умолчанию — системная временная)')
+    args = parser.parse_args()
+
+    print(f"{'лет':>4} {'xls.gz, КБ':>11} {'диск, с':>8} {'память, с':>10} {'выигрыш':>8} {'бот':>7}")
+    with tempfile.TemporaryDirectory(dir=args.dir) as temp_dir:
+        for years in args.years:
+            archive = make_archive(os.path.join(temp_dir, f'{years}y.xls.gz'), years)
+            disk = best_time(lambda: on_disk(archive), args.repeat)
+            memory = best_time(lambda: in_memory(archive), args.repeat)
+            size = os.path.getsize(archive)
+            chosen = 'диск' if size > args.memory_max_mb * 1024 * 1024 else 'память'
+            print(f"{years:>4g} {size / 1024:>11.0f} {disk:>8.3f} {memory:>10.3f} {1 - memory / disk:>8.0%} {chosen:>7}")
+
+
+if __name__ == '__main__':
+    main()
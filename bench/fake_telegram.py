@@ -0,0 +1,288 @@
+"""
+Локальная заглушка Telegram Bot API для нагрузочных тестов.
+
+Бот подключается к ней через TG_BASE_URL и TG_BASE_FILE_URL. Заглушка отдаёт
+подготовленные сообщения с документами через getUpdates, файлы архивов — по
+ссылкам из getFile, и принимает ответы бота (sendMessage, sendPhoto,
+sendAnimation, sendDocument, sendMediaGroup). Если бот запущен в режиме webhook и вызвал setWebhook,
+обновления не ждут getUpdates, а отправляются POST-запросом на его адрес. Сообщения приходят из группового чата, поэтому бот отвечает
+на них цитатой, и каждый ответ сопоставляется с загрузкой по message_id.
+
+Запускается из bench/load_test.py.
+"""
+import email.parser
+import email.policy
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Розоветровница', 'username': 'rozovetrovnitsa_test_bot'}
+
+
+@dataclass
+class Upload:
+    """Одно сообщение пользователя (архив или команда) и ответы бота на него."""
+    message_id: int
+    user_id: int
+    sent_at: float
+    replies: list = field(default_factory=list)
+    finished_at: float | None = None
+    status: str | None = None
+
+
+class FakeTelegram(ThreadingHTTPServer):
+    """
+    HTTP-сервер с методами Bot API, которые использует бот.
+
+    Args:
+        address: (host, port); порт 0 — выбрать свободный
+        is_final: Функция (текст ответа) -> статус загрузки или None, если ответ не последний
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], is_final=None):
+        super().__init__(address, _Handler)
+        self.is_final = is_final or (lambda text: None)
+        self.files: dict[str, str] = {}
+        self.uploads: dict[int, Upload] = {}
+        # Бот подключился: начал опрашивать getUpdates или зарегистрировал вебхук
+        self.connected = threading.Event()
+        self.webhook: dict | None = None
+        self._updates: list[dict] = []
+        self._ids = itertools.count(1)
+        self._changed = threading.Condition()
+
+    def handle_error(self, request, client_address):
+        # Бот при остановке обрывает соединение long polling — это не ошибка
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.server_address[0]}:{self.server_address[1]}/bot'
+
+    @property
+    def base_file_url(self) -> str:
+        return f'http://{self.server_address[0]}:{self.server_address[1]}/file/bot'
+
+    def add_file(self, path: str) -> str:
+        """Регистрирует файл архива и возвращает его file_id."""
+        file_id = f'file{len(self.files) + 1}'
+        self.files[file_id] = path
+        return file_id
+
+    def _send_message(self, user_id: int, content: dict) -> Upload:
+        """Кладёт в очередь getUpdates сообщение пользователя."""
+        with self._changed:
+            message_id = next(self._ids)
+            upload = Upload(message_id, user_id, time.perf_counter())
+            self.uploads[message_id] = upload
+            self._updates.append({
+                'update_id': message_id,
+                'message': {
+                    'message_id': message_id,
+                    'date': int(time.time()),
+                    'chat': {'id': -user_id, 'type': 'group', 'title': f'load {user_id}'},
+                    'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'},
+                    **content,
+                },
+            })
+            self._changed.notify_all()
+        return upload
+
+    def send_document(self, user_id: int, file_id: str, media_group_id: str | None = None) -> Upload:
+        """Сообщение пользователя с документом; документы с общим media_group_id — один альбом."""
+        return self._send_message(user_id, {
+            'document': {
+                'file_id': file_id,
+                'file_unique_id': file_id,
+                'file_name': os.path.basename(self.files[file_id]),
+                'file_size': os.path.getsize(self.files[file_id]),
+            },
+            **({'media_group_id': media_group_id} if media_group_id else {}),
+        })
+
+    def send_command(self, user_id: int, command: str) -> Upload:
+        """Сообщение пользователя с командой, например /start."""
+        return self._send_message(user_id, {
+            'text': command,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command.split()[0])}],
+        })
+
+    def wait_finished(self, timeout: float) -> bool:
+        """Ждёт, пока все загрузки получат последний ответ."""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while any(upload.status is None for upload in self.uploads.values()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+        return True
+
+    def get_updates(self, offset: int, timeout: float) -> list[dict]:
+        """Long polling: ждёт новых обновлений не дольше timeout секунд."""
+        self.connected.set()
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            # Подтверждённые ботом обновления больше не отдаём
+            self._updates = [update for update in self._updates if update['update_id'] >= offset]
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            return list(self._updates)
+
+    def set_webhook(self, params: dict) -> None:
+        """Запоминает адрес вебхука и начинает отправлять на него обновления."""
+        with self._changed:
+            started = self.webhook is not None
+            self.webhook = {'url': params['url'], 'secret_token': params.get('secret_token')}
+        if not started:
+            threading.Thread(target=self._deliver_webhook, daemon=True).start()
+        self.connected.set()
+
+    def _deliver_webhook(self) -> None:
+        """Отправляет обновления на вебхук по одному, повторяя, пока сервер бота не поднимется."""
+        while True:
+            with self._changed:
+                while not self._updates:
+                    self._changed.wait()
+                update = self._updates[0]
+                webhook = dict(self.webhook)
+            headers = {'Content-Type': 'application/json'}
+            if webhook['secret_token']:
+                headers['X-Telegram-Bot-Api-Secret-Token'] = webhook['secret_token']
+            request = urllib.request.Request(webhook['url'], json.dumps(update).encode(), headers)
+            try:
+                urllib.request.urlopen(request, timeout=10).close()
+            except (urllib.error.URLError, ConnectionError):
+                # setWebhook приходит до того, как бот начал слушать порт
+                time.sleep(0.1)
+                continue
+            with self._changed:
+                self._updates.remove(update)
+
+    def reply(self, params: dict, kind: str) -> dict:
+        """Записывает ответ бота и возвращает отправленное сообщение."""
+        message_id = next(self._ids)
+        reply_to = (params.get('reply_parameters') or {}).get('message_id')
+        with self._changed:
+            upload = self.uploads.get(reply_to)
+            if upload is not None and upload.status is None:
+                text = params.get('text', '')
+                upload.replies.append((kind, time.perf_counter()))
+                status = self.is_final(text) if kind == 'text' else None
+                if status is not None:
+                    upload.status = status
+                    upload.finished_at = time.perf_counter()
+                    self._changed.notify_all()
+        return {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': params.get('chat_id', 0), 'type': 'group', 'title': 'load'},
+            'from': BOT_USER,
+            **({'text': params['text']} if 'text' in params else {}),
+        }
+
+
+def _decode(value: str):
+    """Параметры Bot API приходят как строки, сложные — в JSON."""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeTelegram
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = 'application/json') -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _result(self, result) -> None:
+        self._send(200, json.dumps({'ok': True, 'result': result}).encode())
+
+    def _params(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('multipart/form-data'):
+            message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                f'Content-Type: {content_type}\r\n\r\n'.encode() + body
+            )
+            params = {}
+            for part in message.iter_parts():
+                if part.get_filename() is None:
+                    params[part.get_param('name', header='content-disposition')] = _decode(part.get_content())
+            return params
+        if content_type.startswith('application/json'):
+            return json.loads(body or b'{}')
+        return {key: _decode(value) for key, value in parse_qsl(body.decode())}
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path.startswith('/file/'):
+            file_id = os.path.basename(path)
+            file_path = self.server.files.get(file_id)
+            if file_path is None:
+                self._send(404, b'{"ok": false}')
+                return
+            with open(file_path, 'rb') as f:
+                self._send(200, f.read(), 'application/octet-stream')
+            return
+        self.do_POST()
+
+    def do_POST(self):
+        method = urlparse(self.path).path.rsplit('/', 1)[-1]
+        params = self._params()
+        if method == 'getMe':
+            self._result(BOT_USER)
+        elif method == 'setWebhook':
+            self.server.set_webhook(params)
+            self._result(True)
+        elif method in ('deleteWebhook', 'close', 'logOut'):
+            self._result(True)
+        elif method == 'getUpdates':
+            self._result(self.server.get_updates(int(params.get('offset') or 0), float(params.get('timeout') or 0)))
+        elif method == 'getFile':
+            file_id = params['file_id']
+            self._result({
+                'file_id': file_id,
+                'file_unique_id': file_id,
+                'file_size': os.path.getsize(self.server.files[file_id]),
+                'file_path': f'documents/{file_id}',
+            })
+        elif method == 'sendMessage':
+            self._result(self.server.reply(params, 'text'))
+        elif method == 'sendPhoto':
+            self._result(self.server.reply(params, 'photo'))
+        elif method == 'sendAnimation':
+            self._result(self.server.reply(params, 'animation'))
+        elif method == 'sendDocument':
+            self._result(self.server.reply(params, 'document'))
+        elif method == 'sendMediaGroup':
+            count = len(params.get('media') or [])
+            self._result([self.server.reply(params, 'photo') for _ in range(count)])
+        else:
+            self._send(404, json.dumps({'ok': False, 'error_code': 404, 'description': f'{method} not faked'}).encode())
+
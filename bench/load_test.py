@@ -0,0 +1,157 @@
+"""
+Нагрузочный тест бота целиком: заглушка Bot API + настоящий bot/main.py.
+
+Бот запускается отдельным процессом и подключается к bench/fake_telegram.py.
+Драйвер присылает --uploads архивов от --users пользователей с частотой --rate
+в секунду (открытая нагрузка: следующий архив не ждёт ответа на предыдущий)
+через getUpdates или, с --webhook, POST-запросами на вебхук бота,
+и меряет время от отправки до последнего ответа бота — ROSE_MESSAGE, отказа
+или сообщения об ошибке. Настройки бота (RENDER_WORKERS, RENDER_MODE и т.д.)
+берутся из окружения, как при обычном запуске.
+
+Пример:
+    RENDER_WORKERS=4 python bench/load_test.py --users 20 --uploads 60 --rate 2 --no-cache
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'bot'))
+sys.path.insert(0, BENCH_DIR)
+
+import messages  # noqa: E402
+from fake_telegram import FakeTelegram  # noqa: E402
+from synthetic import make_archive  # noqa: E402
+
+
+def final_status(text: str) -> str | None:
+    """Статус загрузки по последнему ответу бота или None, если ответ промежуточный."""
+    if text == messages.ROSE_MESSAGE or text.startswith(messages.RERENDER_MESSAGE.split('{')[0]):
+        return 'ok'
+    if text.startswith(messages.ANIMATION_MESSAGE.split('{')[0]):
+        return 'ok'
+    if text in (messages.RERENDER_NO_DATASET_MESSAGE, messages.WINDOW_USAGE_MESSAGE):
+        return 'rejected'
+    if text.startswith((messages.DECAY_USAGE_MESSAGE.split('{')[0], messages.ANIMATION_USAGE_MESSAGE.split('{')[0])):
+        return 'rejected'
+    if text == messages.BUSY_MESSAGE:
+        return 'busy'
+    if text == messages.SUPERSEDED_MESSAGE:
+        return 'superseded'
+    if text == messages.RESTARTING_MESSAGE:
+        return 'restarting'
+    if text.startswith('❌'):
+        return 'error'
+    return None
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_bot(server: FakeTelegram, log_path: str, no_cache: bool, webhook: bool = False) -> subprocess.Popen:
+    """Запускает bot/main.py, направленный на заглушку."""
+    env = dict(os.environ, TG_TOKEN='123456:load-test', TG_BASE_URL=server.base_url,
+               TG_BASE_FILE_URL=server.base_file_url)
+    if no_cache:
+        env.update(RESULT_CACHE_MAX_MB='0', COLUMNAR_CACHE_MAX_MB='0', STATION_HISTORY_MAX_MB='0')
+    if webhook:
+        port = _free_port()
+        env.update(BOT_MODE='webhook', WEBHOOK_LISTEN='127.0.0.1', WEBHOOK_PORT=str(port),
+                   WEBHOOK_PATH='telegram', WEBHOOK_URL=f'http://127.0.0.1:{port}/telegram',
+                   WEBHOOK_SECRET='load-test')
+    with open(log_path, 'wb') as log:
+        return subprocess.Popen([sys.executable, os.path.join('bot', 'main.py')], cwd=ROOT_DIR, env=env,
+                                stdout=log, stderr=subprocess.STDOUT)
+
+
+def summarize(server: FakeTelegram, started: float) -> dict:
+    """Перцентили задержки, пропускная способность и итоги по статусам."""
+    uploads = list(server.uploads.values())
+    finished = [upload for upload in uploads if upload.status is not None]
+    statuses = {}
+    for upload in uploads:
+        statuses[upload.status or 'timeout'] = statuses.get(upload.status or 'timeout', 0) + 1
+    ok = [upload for upload in finished if upload.status == 'ok']
+    latencies = np.array([upload.finished_at - upload.sent_at for upload in ok])
+    first_photo = np.array([
+        next(at for kind, at in upload.replies if kind == 'photo') - upload.sent_at
+        for upload in ok if any(kind == 'photo' for kind, _ in upload.replies)
+    ])
+    span = max((upload.finished_at for upload in finished), default=started) - started
+    summary = {'uploads': len(uploads), 'statuses': statuses, 'seconds': round(span, 2),
+               'throughput_per_s': round(len(ok) / span, 3) if span > 0 else 0.0}
+    for name, values in (('latency', latencies), ('first_photo', first_photo)):
+        if len(values):
+            for q in (50, 95, 99):
+                summary[f'{name}_p{q}_s'] = round(float(np.percentile(values, q)), 3)
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--uploads', type=int, default=30)
+    parser.add_argument('--rate', type=float, default=1.0, help='архивов в секунду; 0 — все сразу')
+    parser.add_argument('--years', type=float, default=1, help='длина синтетических архивов, лет')
+    parser.add_argument('--archives', type=int, default=4, help='сколько разных архивов присылать по кругу')
+    parser.add_argument('--no-cache', action='store_true', help='отключить кэши бота, чтобы каждый архив рисовался заново')
+    parser.add_argument('--webhook', action='store_true', help='запустить бота в режиме webhook вместо getUpdates')
+    parser.add_argument('--timeout', type=float, default=600, help='сколько ждать ответов, с')
+    parser.add_argument('--output', default=None, help='сохранить итог в JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        server = FakeTelegram(('127.0.0.1', 0), is_final=final_status)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        file_ids = [
+            server.add_file(make_archive(os.path.join(temp_dir, f'{i}.xls.gz'), args.years, seed=i))
+            for i in range(args.archives)
+        ]
+
+        log_path = os.path.join(temp_dir, 'bot.log')
+        bot = start_bot(server, log_path, args.no_cache, args.webhook)
+        try:
+            if not server.connected.wait(60):
+                sys.exit(f'бот не подключился к заглушке, лог:\n{open(log_path).read()}')
+
+            started = time.perf_counter()
+            for i in range(args.uploads):
+                if args.rate > 0:
+                    time.sleep(max(0.0, started + i / args.rate - time.perf_counter()))
+                server.send_document(user_id=1000 + i % args.users, file_id=file_ids[i % len(file_ids)])
+            if not server.wait_finished(args.timeout):
+                print(f'не дождались ответов за {args.timeout:g} с')
+            summary = summarize(server, started)
+        finally:
+            bot.send_signal(signal.SIGINT)
+            try:
+                bot.wait(30)
+            except subprocess.TimeoutExpired:
+                bot.kill()
+            server.shutdown()
+
+    summary.update(users=args.users, rate=args.rate, years=args.years, no_cache=args.no_cache,
+                   mode='webhook' if args.webhook else 'polling',
+                   render_workers=os.environ.get('RENDER_WORKERS'), render_mode=os.environ.get('RENDER_MODE'))
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
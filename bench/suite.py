@@ -0,0 +1,192 @@
+"""
+Набор бенчмарков пайплайна: время и пиковая память каждой функции на архивах разной длины.
+
+Каждый замер идёт в отдельном процессе, чтобы пиковый RSS (ru_maxrss) относился
+к одному случаю, а не копился за весь прогон. Результат сохраняется в
+bench/results/<версия>.json; с --baseline замеры сравниваются с прошлым прогоном,
+и случаи, ставшие медленнее порога, помечаются как регрессии.
+
+Пример:
+    python bench/suite.py --years 1 5 20 --repeat 5
+    python bench/suite.py --baseline bench/results/88aba99.json
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'bot'))
+sys.path.insert(0, BENCH_DIR)
+
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+CASES = (
+    'clean_data',
+    'processing',
+    'smartrose_processing',
+    'temperature_processing',
+    'rain_processing',
+    'speed_processing',
+    'ADD',
+    'create_windrose',
+    'create_smartrose',
+    'create_combined_rose',
+    'create_temperature',
+    'create_rain',
+    'create_speedrose',
+)
+
+
+def _rss_mb() -> float:
+    """Пиковый RSS процесса, МБ (ru_maxrss на Linux в КБ, на macOS в байтах)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(case: str, xls_path: str, repeat: int) -> dict:
+    """Замер одного случая в текущем процессе; вызывается в дочернем процессе."""
+    import rozovetrovnitsa as rz
+
+    dataset = rz.MeteoDataset(rz.read_rp5(xls_path))
+    image_path = os.path.join(os.path.dirname(xls_path), f'{case}.jpg')
+    calls = {
+        'clean_data': lambda: rz.clean_data(xls_path),
+        'processing': lambda: rz.processing(dataset.data, rz.WIND_DIRECTIONS),
+        'smartrose_processing': lambda: rz.smartrose_processing(dataset.data, rz.WIND_DIRECTIONS),
+        'temperature_processing': lambda: rz.temperature_processing(dataset.data),
+        'rain_processing': lambda: rz.rain_processing(dataset.data),
+        'speed_processing': lambda: rz.speed_processing(dataset.data, rz.WIND_DIRECTIONS),
+        'ADD': lambda: rz.ADD(dataset),
+    }
+    call = calls.get(case) or (lambda: getattr(rz, case)(dataset, image_path))
+
+    # Первый вызов — прогрев (импорты matplotlib, заготовки графиков); в замер не входит
+    call()
+    setup_rss = _rss_mb()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    peak_rss = _rss_mb()
+    return {
+        'case': case,
+        'rows': len(dataset.observations),
+        'best_s': min(timings),
+        'mean_s': sum(timings) / len(timings),
+        'peak_rss_mb': round(peak_rss, 1),
+        'rss_growth_mb': round(peak_rss - setup_rss, 1),
+    }
+
+
+def _measure(case: str, xls_path: str, repeat: int) -> dict:
+    """Запускает замер случая в отдельном процессе."""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', case, xls_path, '--repeat', str(repeat)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _version() -> str:
+    """Короткий хэш коммита; с пометкой -dirty, если есть незакоммиченные изменения."""
+    try:
+        version = subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], cwd=BENCH_DIR,
+            check=True, capture_output=True, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        version = 'unknown'
+    return version
+
+
+def compare(results: list[dict], baseline: dict, threshold: float, min_ms: float) -> int:
+    """
+    Печатает сравнение с прошлым прогоном и возвращает число регрессий.
+
+    Регрессия — замедление больше threshold и больше min_ms: у функций
+    за доли миллисекунды относительный шум слишком велик.
+    """
+    previous = {(r['case'], r['years']): r for r in baseline['results']}
+    regressions = 0
+    print(f"\nсравнение с {baseline['version']} (порог {threshold:.0%}):")
+    print(f"{'случай':<24} {'лет':>4} {'было, мс':>9} {'стало, мс':>10} {'изменение':>10}")
+    for result in results:
+        old = previous.get((result['case'], result['years']))
+        if old is None:
+            continue
+        change = result['best_s'] / old['best_s'] - 1
+        flag = ''
+        if change > threshold and (result['best_s'] - old['best_s']) * 1000 > min_ms:
+            flag = '  РЕГРЕССИЯ'
+            regressions += 1
+        print(f"{result['case']:<24} {result['years']:>4g} {old['best_s'] * 1000:>9.1f} "
+              f"{result['best_s'] * 1000:>10.1f} {change:>+10.0%}{flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--years', type=float, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--step-hours', type=int, default=3, help='интервал между наблюдениями, ч')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--cases', nargs='+', default=list(CASES), choices=CASES)
+    parser.add_argument('--output', default=None, help='куда сохранить результат (по умолчанию bench/results/<версия>.json)')
+    parser.add_argument('--baseline', default=None, help='прошлый результат для сравнения')
+    parser.add_argument('--threshold', type=float, default=0.2, help='доля замедления, считающаяся регрессией')
+    parser.add_argument('--min-ms', type=float, default=1.0, help='замедление меньше этого не считается регрессией, мс')
+    parser.add_argument('--worker', nargs=2, metavar=('CASE', 'XLS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_case(*args.worker, args.repeat)))
+        return
+
+    from synthetic import make_archive, read_archive
+
+    results = []
+    print(f"{'случай':<24} {'лет':>4} {'строк':>6} {'лучшее, мс':>11} {'среднее, мс':>12} {'RSS, МБ':>8} {'прирост, МБ':>12}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for years in args.years:
+            archive = make_archive(os.path.join(temp_dir, f'{years}y.xls.gz'), years, args.step_hours)
+            xls_path = archive[:-len('.gz')]
+            with open(xls_path, 'wb') as f:
+                f.write(read_archive(archive))
+            for case in args.cases:
+                result = {'years': years, **_measure(case, xls_path, args.repeat)}
+                results.append(result)
+                print(f"{case:<24} {years:>4g} {result['rows']:>6} {result['best_s'] * 1000:>11.1f} "
+                      f"{result['mean_s'] * 1000:>12.1f} {result['peak_rss_mb']:>8.0f} {result['rss_growth_mb']:>12.1f}")
+
+    version = _version()
+    report = {
+        'version': version,
+        'timestamp': dt.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'step_hours': args.step_hours,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f'{version}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nрезультат: {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold, args.min_ms)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
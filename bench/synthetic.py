@@ -0,0 +1,148 @@
+"""
+Генератор синтетических архивов rp5 (.xls.gz) для бенчмарков.
+
+Архив устроен как настоящая выгрузка с rp5.ru: шесть строк преамбулы,
+строка заголовков и наблюдения от новых к старым. Для записи .xls нужен
+xlwt (см. bench/requirements.txt).
+
+Пример:
+    python bench/synthetic.py bench/data/5y.xls.gz --years 5 --step-hours 3
+"""
+import argparse
+import datetime as dt
+import gzip
+import io
+import os
+import sys
+
+import numpy as np
+import xlwt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+
+from rozovetrovnitsa import WIND_NAME_MAPPING  # noqa: E402
+
+STATION_NAME = 'Синтетическая (метеостанция)'
+WMO_ID = 99999
+
+HEADER = [
+    f'Местное время в {STATION_NAME}', 'T', 'Po', 'P', 'Pa', 'U', 'DD', 'Ff', 'ff10', 'ff3',
+    'N', 'WW', 'W1', 'W2', 'Tn', 'Tx', 'Cl', 'Nh', 'H', 'Cm', 'Ch', 'VV', 'Td',
+    'RRR', 'tR', 'E', 'Tg', "E'", 'sss',
+]
+
+WEATHER_TYPES = [
+    'Облака покрывали половину неба или менее в течение всего соответствующего периода.',
+    'Облака покрывали более половины неба в течение части соответствующего периода и половину или менее в течение части периода.',
+    'Дождь.',
+    'Ливень (ливни).',
+    'Снег и/или другие виды твердых осадков',
+    'Туман или ледяной туман или сильная мгла.',
+]
+
+# rp5 ограничивает выгрузку одним листом .xls
+MAX_XLS_ROWS = 65536 - 7
+
+# Время последнего наблюдения синтетических архивов
+END = dt.datetime(2025, 10, 17, 21)
+
+
+def generate_rows(years: float, step_hours: int = 3, seed: int = 0,
+                  end: dt.datetime = END) -> list[list]:
+    """Генерирует строки наблюдений (от новых к старым) для архива длиной years лет."""
+    rng = np.random.default_rng(seed)
+    count = min(int(years * 365.25 * 24 / step_hours), MAX_XLS_ROWS)
+    times = [end - dt.timedelta(hours=step_hours * i) for i in range(count)]
+    day_of_year = np.array([t.timetuple().tm_yday for t in times])
+    hour = np.array([t.hour for t in times])
+
+    # Годовой и суточный ход температуры плюс шум
+    temperature = (5 - 15 * np.cos(2 * np.pi * day_of_year / 365.25)
+                   - 4 * np.cos(2 * np.pi * hour / 24) + rng.normal(0, 3, count))
+    humidity = np.clip(75 + 15 * np.cos(2 * np.pi * hour / 24) + rng.normal(0, 10, count), 15, 100)
+    wind_names = list(WIND_NAME_MAPPING)
+    # Преобладающий ветер — западный, штиль и переменный ветер встречаются реже
+    wind_weights = np.ones(len(wind_names))
+    wind_weights[:2] = 0.5
+    wind_weights[wind_names.index('Ветер, дующий с запада')] = 4
+    wind_weights[wind_names.index('Ветер, дующий с юго-запада')] = 3
+    wind_weights /= wind_weights.sum()
+    wind = rng.choice(len(wind_names), size=count, p=wind_weights)
+    speed = np.clip(rng.gamma(2.0, 1.5, count).round(), 0, 20).astype(int)
+    weather = rng.choice(len(WEATHER_TYPES), size=count)
+    rain = rng.exponential(1.5, count)
+    snow = np.maximum(0, -temperature * 2).round()
+
+    rows = []
+    for i, time in enumerate(times):
+        calm = wind[i] < 2
+        row = {
+            'T': round(float(temperature[i]), 1),
+            'Po': round(float(745 + rng.normal(0, 5)), 1),
+            'U': int(humidity[i]),
+            'DD': wind_names[wind[i]],
+            'Ff': 0 if calm else int(speed[i]),
+            'N': '100%.',
+            'W1': WEATHER_TYPES[weather[i]] if i % 4 else '',
+            'Td': round(float(temperature[i] - 3), 1),
+        }
+        # Осадки измеряются два раза в сутки за 12 часов
+        if time.hour in (6, 18):
+            if weather[i] in (2, 3, 4):
+                row['RRR'] = round(float(rain[i]), 1)
+            else:
+                row['RRR'] = 'Осадков нет' if rng.random() < 0.7 else 'Следы осадков'
+            row['tR'] = 12
+        if time.hour == 9:
+            row['sss'] = int(snow[i]) if snow[i] > 0 else 'Снежный покров не постоянный.'
+        rows.append([time.strftime('%d.%m.%Y %H:%M')] + [row.get(column, '') for column in HEADER[1:]])
+    return rows
+
+
+def make_archive(path: str, years: float, step_hours: int = 3, seed: int = 0,
+                 station: str = STATION_NAME, wmo_id: int = WMO_ID) -> str:
+    """Записывает синтетический архив rp5 станции station в path (.xls.gz) и возвращает путь."""
+    rows = generate_rows(years, step_hours, seed)
+    first, last = rows[-1][0][:10], rows[0][0][:10]
+
+    book = xlwt.Workbook(encoding='utf-8')
+    sheet = book.add_sheet('Архив')
+    preamble = [
+        f'Архив погоды на метеостанции {station}, WMO_ID={wmo_id}, выборка с {first} по {last}, все дни',
+        'Кодировка: UTF-8',
+        'Информация предоставлена сайтом "Расписание Погоды", rp5.ru',
+        f'Обозначения метеопараметров см. на странице https://rp5.ru/archive.php?wmo_id={wmo_id}&lang=ru',
+        '',
+        '',
+    ]
+    for row_index, text in enumerate(preamble):
+        sheet.write(row_index, 0, text)
+    for column_index, name in enumerate([f'Местное время в {station}'] + HEADER[1:]):
+        sheet.write(6, column_index, name)
+    for row_index, row in enumerate(rows, start=7):
+        for column_index, value in enumerate(row):
+            if value != '':
+                sheet.write(row_index, column_index, value)
+
+    buffer = io.BytesIO()
+    book.save(buffer)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with gzip.open(path, 'wb') as f:
+        f.write(buffer.getvalue())
+    return path
+
+
+def read_archive(path: str) -> bytes:
+    """Содержимое .xls из архива — то, что бот передаёт в load_meteo_dataset."""
+    with gzip.open(path, 'rb') as f:
+        return f.read()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('path', help='куда записать .xls.gz')
+    parser.add_argument('--years', type=float, default=1)
+    parser.add_argument('--step-hours', type=int, default=3, help='интервал между наблюдениями, ч')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(make_archive(args.path, args.years, args.step_hours, args.seed))
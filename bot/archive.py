@@ -0,0 +1,115 @@
+import gzip
+import io
+import os
+import shutil
+import zipfile
+import zlib
+
+ZIP_MAGIC = b'PK\x03\x04'
+
+
+def _too_large_message(max_size: int) -> str:
+    return f"❌ Архив слишком большой: после распаковки больше {max_size // (1024 * 1024)} МБ"
+
+
+def decompress_archive(archive: bytes, max_size: int) -> bytes:
+    """
+    Распаковывает gzip архив в память, не распаковывая больше max_size байт.
+    
+    Raises:
+        ValueError: Если архив повреждён или распакованный файл больше max_size
+    """
+    chunks = []
+    size = 0
+    try:
+        # Архив может состоять из нескольких gzip-блоков подряд
+        while archive:
+            decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+            chunk = decompressor.decompress(archive, max_size - size + 1)
+            size += len(chunk)
+            if size > max_size:
+                raise ValueError(_too_large_message(max_size))
+            if not decompressor.eof:
+                raise ValueError("❌ Архив обрывается: файл скачан не полностью")
+            chunks.append(chunk)
+            archive = decompressor.unused_data
+    except zlib.error as e:
+        raise ValueError(f"❌ Файл повреждён или не является gzip архивом: {e}") from e
+    return b''.join(chunks)
+
+
+def extract_gzip_file(file_path: str, max_size: int | None = None) -> str:
+    """
+    Распаковывает .gz файл и возвращает путь к распакованному файлу.
+    
+    Raises:
+        ValueError: Если распакованный файл больше max_size байт
+    """
+    output_path = file_path.replace(".xls.gz", ".xls")
+    with gzip.open(file_path, 'rb') as file_in:
+        with open(output_path, 'wb') as file_out:
+            if max_size is None:
+                shutil.copyfileobj(file_in, file_out)
+            else:
+                size = 0
+                for chunk in iter(lambda: file_in.read(1 << 20), b''):
+                    size += len(chunk)
+                    if size > max_size:
+                        break
+                    file_out.write(chunk)
+    if max_size is not None and size > max_size:
+        os.remove(output_path)
+        raise ValueError(_too_large_message(max_size))
+    return output_path
+
+
+def unpack_archive(archive: bytes | str, max_size: int) -> bytes | str:
+    """
+    Распаковывает архив туда же, где он лежит.
+    
+    Архив в памяти распаковывается в память, архив на диске — в файл рядом с ним.
+    
+    Returns:
+        Содержимое .xls или путь к распакованному .xls
+    """
+    if isinstance(archive, str):
+        return extract_gzip_file(archive, max_size)
+    return decompress_archive(archive, max_size)
+
+
+def read_zip_members(archive: bytes | str, max_files: int, max_member_size: int) -> list[tuple[str, bytes]]:
+    """
+    Достаёт архивы .xls.gz из zip-файла с несколькими станциями.
+
+    Размеры файлов внутри zip проверяются до чтения, и каждый файл читается не
+    больше max_member_size байт, поэтому zip-бомба не распакуется целиком.
+
+    Returns:
+        Список (имя файла, содержимое .xls.gz) в порядке внутри zip
+
+    Raises:
+        ValueError: Если zip повреждён, в нём нет архивов, их больше max_files или какой-то слишком большой
+    """
+    try:
+        with zipfile.ZipFile(io.BytesIO(archive) if isinstance(archive, bytes) else archive) as zf:
+            members = [
+                info for info in zf.infolist()
+                if not info.is_dir() and info.filename.endswith('.gz')
+                and not os.path.basename(info.filename).startswith('.')
+                and not info.filename.startswith('__MACOSX/')
+            ]
+            if not members:
+                raise ValueError("❌ В zip нет архивов .xls.gz")
+            if len(members) > max_files:
+                raise ValueError(f"❌ Слишком много архивов в zip: можно не больше {max_files}")
+            result = []
+            for info in members:
+                if info.file_size > max_member_size:
+                    raise ValueError(
+                        f"❌ {os.path.basename(info.filename)}: больше {max_member_size // (1024 * 1024)} МБ"
+                    )
+                with zf.open(info) as f:
+                    result.append((os.path.basename(info.filename), f.read(max_member_size + 1)))
+    except (zipfile.BadZipFile, zipfile.LargeZipFile, NotImplementedError, EOFError) as e:
+        raise ValueError(f"❌ Файл повреждён или не является zip архивом: {e}") from e
+    return result
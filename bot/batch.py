@@ -0,0 +1,55 @@
+import asyncio
+from dataclasses import dataclass, field
+
+# Сколько секунд ждать следующего файла альбома, прежде чем считать альбом полным
+MEDIA_GROUP_WAIT = 1.0
+
+
+@dataclass
+class _MediaGroup:
+    """Файлы одного альбома, пришедшие на данный момент."""
+    items: list = field(default_factory=list)
+    arrived: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class MediaGroups:
+    """
+    Собирает документы, отправленные одним альбомом (media group).
+
+    Telegram присылает каждый файл альбома отдельным обновлением с общим
+    media_group_id. Первый обработчик альбома ждёт, пока файлы перестанут
+    приходить дольше wait секунд, и получает их все; остальные обработчики
+    получают None и сразу завершаются.
+
+    Args:
+        wait: Сколько секунд тишины считать концом альбома
+    """
+
+    def __init__(self, wait: float = MEDIA_GROUP_WAIT):
+        self.wait = wait
+        self._groups: dict[str, _MediaGroup] = {}
+
+    async def collect(self, group_id: str, item) -> list | None:
+        """
+        Добавляет item в альбом group_id.
+
+        Returns:
+            Все элементы альбома по порядку прихода — для первого вызова, иначе None
+        """
+        group = self._groups.get(group_id)
+        if group is not None:
+            group.items.append(item)
+            group.arrived.set()
+            return None
+
+        group = self._groups[group_id] = _MediaGroup([item])
+        try:
+            while True:
+                group.arrived.clear()
+                try:
+                    await asyncio.wait_for(group.arrived.wait(), self.wait)
+                except asyncio.TimeoutError:
+                    break
+        finally:
+            del self._groups[group_id]
+        return group.items
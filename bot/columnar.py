@@ -0,0 +1,63 @@
+import logging
+import os
+import tempfile
+
+from result_cache import evict_lru
+
+# Меняется вместе со схемой таблицы наблюдений, чтобы не читать старые файлы
+COLUMNAR_VERSION = 4
+
+
+class ColumnarCache:
+    """
+    Кэш разобранных архивов в колоночном формате Arrow (Feather v2).
+
+    Разбор .xls через xlrd — самая медленная часть обработки архива, поэтому
+    очищенная таблица наблюдений сохраняется один раз, а при повторных
+    отрисовках (с другими настройками графиков) читается через memory map.
+    Файлы пишутся без сжатия, чтобы чтение действительно шло через mmap.
+    Сам объект создаётся в основном процессе, а читает и пишет в воркерах,
+    поэтому pyarrow импортируется только там.
+
+    Args:
+        directory: Папка кэша
+        max_bytes: Максимальный суммарный размер кэша
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, digest: str) -> str:
+        """Путь к файлу таблицы для архива с данным хэшем."""
+        return os.path.join(self.directory, f'{digest}.v{COLUMNAR_VERSION}.arrow')
+
+    def load(self, digest: str):
+        """Читает таблицу наблюдений (DataFrame) или возвращает None, если архив ещё не встречался."""
+        import pyarrow.feather as feather
+
+        path = self.path(digest)
+        try:
+            table = feather.read_table(path, memory_map=True)
+            # Время изменения файла — время последнего обращения для LRU
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return table.to_pandas()
+
+    def store(self, digest: str, observations) -> None:
+        """Сохраняет таблицу наблюдений и при необходимости вытесняет старые записи."""
+        import pyarrow.feather as feather
+
+        # Пишем во временный файл и переименовываем, чтобы load не увидел половину файла
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        os.close(fd)
+        try:
+            feather.write_feather(observations, temp_path, compression='uncompressed')
+            os.replace(temp_path, self.path(digest))
+            evict_lru(self.directory, self.max_bytes)
+        except (OSError, ValueError) as e:
+            logging.warning("columnar cache store %s: %s", digest[:12], e)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
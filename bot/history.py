@@ -0,0 +1,155 @@
+import contextlib
+import logging
+import os
+import shutil
+import tempfile
+
+from result_cache import evict_lru
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: без блокировки одновременные загрузки одной станции могут потерять часть новых строк
+    fcntl = None
+
+# Меняется вместе со схемой таблиц истории, чтобы не читать старые файлы
+HISTORY_VERSION = 1
+
+# Сколько кусков наблюдений копится, прежде чем они сливаются в один файл
+HISTORY_MAX_SEGMENTS = 32
+
+
+class StationHistory:
+    """
+    История наблюдений по станциям, ключ — WMO_ID из преамбулы архива rp5.
+
+    Для каждой станции хранятся наблюдения без повторов по времени и их суточные
+    суммы (см. rozovetrovnitsa.merge_station_history), всё в формате Arrow.
+    Наблюдения только дописываются: каждый архив добавляет кусок с новыми
+    строками, поэтому запись не зависит от длины истории. Папка станции — одна
+    запись для вытеснения по LRU. Как и ColumnarCache, объект создаётся в
+    основном процессе, а читает и пишет в воркерах, поэтому pyarrow
+    импортируется только там.
+
+    Args:
+        directory: Папка истории
+        max_bytes: Максимальный суммарный размер истории
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, station_id: int) -> str:
+        """Папка истории станции."""
+        return os.path.join(self.directory, f'{station_id}.v{HISTORY_VERSION}')
+
+    @contextlib.contextmanager
+    def lock(self, station_id: int):
+        """Не даёт двум воркерам одновременно дописывать историю одной станции."""
+        with open(os.path.join(self.directory, f'.{station_id}.lock'), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _segments(self, path: str) -> list[str]:
+        return sorted(name for name in os.listdir(path) if name.startswith('observations-'))
+
+    def load(self, station_id: int, columns: list[str] | None = None):
+        """
+        Читает историю станции. Вызывается под lock станции.
+
+        Повреждённая история (запись оборвалась между файлами или часть файлов
+        удалило вытеснение в другом воркере) удаляется целиком: иначе append
+        дописывал бы новые куски к несогласованным и суммы не сошлись бы уже никогда.
+
+        Args:
+            columns: Какие колонки наблюдений читать (None — все); тех, которых нет в истории,
+                в результате не будет
+
+        Returns:
+            tuple: (наблюдения, суточные суммы) — DataFrame или (None, None), если станции
+            ещё нет или история повреждена
+        """
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        path = self.path(station_id)
+        if not os.path.isdir(path):
+            return None, None
+        try:
+            segments = [
+                feather.read_table(os.path.join(path, name), memory_map=True)
+                for name in self._segments(path)
+            ]
+            if columns is not None:
+                # Колонок, которых нет в истории, не читаем: через memory map чтение всех колонок бесплатно
+                segments = [segment.select([name for name in columns if name in segment.column_names])
+                            for segment in segments]
+            daily = feather.read_table(os.path.join(path, 'daily.arrow'), memory_map=True).to_pandas().set_index('day')
+            # Время изменения папки — время последнего обращения для LRU
+            os.utime(path)
+        except (OSError, ValueError, KeyError) as e:
+            self._discard(station_id, e)
+            return None, None
+        # Кусок наблюдений без сумм или суммы без куска — историю не используем
+        if not segments or sum(len(segment) for segment in segments) != daily['rows'].sum():
+            self._discard(station_id, "rows do not match daily sums")
+            return None, None
+        return pa.concat_tables(segments).to_pandas(), daily
+
+    def append(self, station_id: int, observations, daily) -> None:
+        """
+        Дописывает новые наблюдения станции, заменяет суточные суммы и при необходимости
+        вытесняет давние станции.
+        """
+        path = self.path(station_id)
+        os.makedirs(path, exist_ok=True)
+        try:
+            segments = self._segments(path)
+            number = int(segments[-1].split('-')[1].split('.')[0]) + 1 if segments else 0
+            if len(segments) >= HISTORY_MAX_SEGMENTS:
+                observations = self._compact(path, segments, observations)
+            self._write(path, f'observations-{number:06d}.arrow', observations)
+            self._write(path, 'daily.arrow', daily.reset_index())
+            if len(segments) >= HISTORY_MAX_SEGMENTS:
+                for name in segments:
+                    os.remove(os.path.join(path, name))
+            os.utime(path)
+        except (OSError, ValueError) as e:
+            logging.warning("station history store %s: %s", station_id, e)
+            # Наблюдения без сумм (или наоборот) хуже, чем пустая история
+            shutil.rmtree(path, ignore_errors=True)
+            return
+        try:
+            evict_lru(self.directory, self.max_bytes)
+        except OSError as e:
+            # История станции уже записана целиком — её не трогаем
+            logging.warning("station history evict: %s", e)
+
+    def _discard(self, station_id: int, reason) -> None:
+        """Удаляет повреждённую историю станции, чтобы следующая запись начала её заново."""
+        logging.warning("station history %s discarded: %s", station_id, reason)
+        shutil.rmtree(self.path(station_id), ignore_errors=True)
+
+    def _compact(self, path: str, segments: list[str], observations):
+        """Сливает накопившиеся куски с новыми строками в один."""
+        import pandas as pd
+        import pyarrow.feather as feather
+
+        stored = [feather.read_table(os.path.join(path, name)).to_pandas() for name in segments]
+        return pd.concat(stored + [observations], ignore_index=True)
+
+    def _write(self, path: str, name: str, table) -> None:
+        """Пишет во временный файл и переименовывает, чтобы load не увидел половину файла."""
+        import pyarrow.feather as feather
+
+        fd, temp_path = tempfile.mkstemp(dir=path, prefix='.tmp-')
+        os.close(fd)
+        try:
+            feather.write_feather(table, temp_path, compression='uncompressed')
+            os.replace(temp_path, os.path.join(path, name))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
@@ -1,13 +1,28 @@
 import asyncio
+import contextlib
+import dataclasses
+import datetime as dt
+import io
 import logging
 import os
-from telegram import Update
+import time
+from telegram import InputMediaPhoto, Update
 from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters
 
 import messages
 
-from rozovetrovnitsa import *
-from decouple import config
+from metrics import REGISTRY, request_trace, start_metrics_server, timed
+from archive import unpack_archive
+from batch import MediaGroups
+from render_pool import Packed, RenderPool, RenderQueueFull, default_workers
+from columnar import ColumnarCache
+from history import StationHistory
+from recent import RecentDataset, RecentDatasets
+from result_cache import ResultCache, archive_digest
+from shutdown import GracefulShutdown
+from validation import UploadValidator
+from workspace import UserRequests, Workspace, clear_workspaces
+from decouple import Csv, config
 
 # Enable logging
 logging.basicConfig(
@@ -20,6 +35,120 @@ REPROACH_USER_IDS = {
     if uid.strip()
 }
 
+# Пул процессов для отрисовки: сколько воркеров и сколько запросов может ждать в очереди
+RENDER_WORKERS = config("RENDER_WORKERS", default=default_workers(), cast=int)
+RENDER_QUEUE_SIZE = config("RENDER_QUEUE_SIZE", default=8, cast=int)
+
+# Как отправлять графики: sequential — по очереди, stream — параллельно и каждый по готовности,
+# album — параллельно и одним альбомом
+RENDER_MODE = config("RENDER_MODE", default="sequential")
+
+# Кэш готовых графиков по содержимому архива
+RESULT_CACHE_DIR = 'bot/files/cache'
+RESULT_CACHE_MAX_MB = config("RESULT_CACHE_MAX_MB", default=200, cast=int)
+
+# Кэш разобранных архивов в формате Arrow: повторная отрисовка не разбирает .xls заново
+COLUMNAR_CACHE_DIR = 'bot/files/columnar'
+COLUMNAR_CACHE_MAX_MB = config("COLUMNAR_CACHE_MAX_MB", default=500, cast=int)
+
+# История наблюдений по станциям: новые архивы дописываются к ней, повторы не пересчитываются.
+# 0 — не вести историю. По умолчанию выключена: графики с ней не быстрее (95% времени — разбор .xls,
+# который нужен для каждого нового архива), а каждая загрузка читает и пишет историю под блокировкой
+STATION_HISTORY_DIR = 'bot/files/history'
+STATION_HISTORY_MAX_MB = config("STATION_HISTORY_MAX_MB", default=0, cast=int)
+
+# Последний разобранный архив каждого пользователя держится в памяти, чтобы /window и /decay
+# перерисовывали графики без повторной загрузки: не дольше RECENT_DATASETS_TTL секунд
+# с последнего обращения и не больше RECENT_DATASETS_MAX_MB на всех
+RECENT_DATASETS_MAX_MB = config("RECENT_DATASETS_MAX_MB", default=200, cast=int)
+RECENT_DATASETS_TTL = config("RECENT_DATASETS_TTL", default=3600, cast=float)
+
+# Наибольшее затухание умной розы для /decay, в сутки
+DECAY_MAX = 5.0
+
+# /animate: не больше ANIMATION_MAX_FRAMES кадров, файл не больше ANIMATION_MAX_MB (ботам Telegram
+# можно отправлять до 50 МБ). ANIMATION_FORMAT — gif или mp4; для mp4 нужен ffmpeg, без него — gif
+ANIMATION_MAX_FRAMES = config("ANIMATION_MAX_FRAMES", default=120, cast=int)
+ANIMATION_MAX_MB = config("ANIMATION_MAX_MB", default=10, cast=int)
+ANIMATION_FORMAT = config("ANIMATION_FORMAT", default="gif")
+
+# Кроме картинки, присылать график температуры файлом svg или pdf; пусто — не присылать.
+# Только для коротких рядов (без усреднения по интервалам) и когда графики рисуются заново,
+# а не берутся из кэша готовых
+TEMPERATURE_VECTOR_FORMAT = config("TEMPERATURE_VECTOR_FORMAT", default="")
+
+# Границы классов скорости розы скоростей, м/с: 2,5,8 — классы 0–2, 2–5, 5–8 и ≥8
+SPEED_CLASSES = tuple(sorted(config("SPEED_CLASSES", default="2,5,8,11,15", cast=Csv(float))))
+
+# Шаг между кадрами /animate, часов
+ANIMATION_STEPS = {'day': 24, '6h': 6}
+
+# Архив больше ARCHIVE_MAX_MB не скачиваем, распакованный .xls больше XLS_MAX_MB не принимаем.
+# Архивы до ARCHIVE_MEMORY_MAX_MB скачиваются и распаковываются в памяти, более крупные — на диск:
+# .xls в 4–10 раз больше архива, и несколько крупных архивов сразу заняли бы сотни мегабайт.
+# По умолчанию — десятая часть ARCHIVE_MAX_MB: архив rp5 за 20 лет (около 2.3 МБ, .xls — 10 МБ)
+# уже идёт через диск, за несколько лет — через память
+ARCHIVE_MAX_MB = config("ARCHIVE_MAX_MB", default=20, cast=int)
+ARCHIVE_MEMORY_MAX_MB = config("ARCHIVE_MEMORY_MAX_MB", default=max(1, ARCHIVE_MAX_MB // 10), cast=int)
+XLS_MAX_MB = config("XLS_MAX_MB", default=200, cast=int)
+
+# Пакетная обработка: zip или альбом из нескольких архивов — одна картинка с розами станций
+# рядом и таблица ADD по станциям. Zip может быть размером до ARCHIVE_MAX_MB на каждый архив
+BATCH_MAX_FILES = config("BATCH_MAX_FILES", default=6, cast=int)
+
+# Рабочие папки запросов: архив, распакованный .xls и картинки удаляются после ответа
+WORKSPACE_DIR = 'bot/files/requests'
+
+# Несколько архивов от одного пользователя: parallel — независимо, coalesce — по одному
+# и только последний из ждущих, cancel — новый архив отменяет обработку предыдущего
+USER_POLICY = config("USER_POLICY", default="parallel")
+
+# Адрес Bot API: по умолчанию настоящий, для нагрузочных тестов — заглушка bench/fake_telegram.py
+TG_BASE_URL = config("TG_BASE_URL", default="https://api.telegram.org/bot")
+TG_BASE_FILE_URL = config("TG_BASE_FILE_URL", default="https://api.telegram.org/file/bot")
+
+# Как получать обновления: polling — опрашивать getUpdates, webhook — принимать их HTTP-сервером.
+# Для webhook обязателен WEBHOOK_URL — полный внешний адрес (https://.../WEBHOOK_PATH), на который
+# Telegram шлёт обновления; бот слушает WEBHOOK_LISTEN:WEBHOOK_PORT, обычно за обратным прокси
+BOT_MODE = config("BOT_MODE", default="polling")
+WEBHOOK_URL = config("WEBHOOK_URL", default="")
+WEBHOOK_LISTEN = config("WEBHOOK_LISTEN", default="0.0.0.0")
+WEBHOOK_PORT = config("WEBHOOK_PORT", default=8443, cast=int)
+WEBHOOK_PATH = config("WEBHOOK_PATH", default="telegram")
+WEBHOOK_SECRET = config("WEBHOOK_SECRET", default="")
+# Сколько одновременных соединений Telegram откроет к вебхуку (1–100)
+WEBHOOK_MAX_CONNECTIONS = config("WEBHOOK_MAX_CONNECTIONS", default=40, cast=int)
+
+# Сколько обновлений обрабатывается одновременно и сколько соединений держит HTTP-клиент к Bot API.
+# Отправка графиков многим пользователям сразу упирается в пул соединений: POOL_TIMEOUT — сколько
+# секунд запрос ждёт свободного соединения
+CONCURRENT_UPDATES = config("CONCURRENT_UPDATES", default=64, cast=int)
+CONNECTION_POOL_SIZE = config("CONNECTION_POOL_SIZE", default=256, cast=int)
+POOL_TIMEOUT = config("POOL_TIMEOUT", default=10.0, cast=float)
+
+# Сколько секунд при остановке ждать, пока дорисуются уже принятые архивы
+SHUTDOWN_TIMEOUT = config("SHUTDOWN_TIMEOUT", default=60.0, cast=float)
+
+# Страница метрик Prometheus (GET /metrics); 0 — не поднимать
+METRICS_HOST = config("METRICS_HOST", default="127.0.0.1")
+METRICS_PORT = config("METRICS_PORT", default=0, cast=int)
+
+# pandas и matplotlib импортируются только в воркерах пула: основной процесс
+# запускается быстро и отвечает на команды, не дожидаясь их загрузки.
+# Модуль с графиками загружается один раз в forkserver, и воркеры получают его готовым
+ANALYSIS_MODULE = 'rozovetrovnitsa'
+
+# Графики в порядке отправки: имя, функция отрисовки, сообщение об ошибке, подпись для логов
+CHARTS = (
+    ('windrose', f'{ANALYSIS_MODULE}:create_combined_rose', messages.WINDROSE_ERROR_MESSAGE, 'роза ветров'),
+    ('temperature', f'{ANALYSIS_MODULE}:create_temperature', messages.TEMPERATURE_ERROR_MESSAGE, 'температура'),
+    ('rain', f'{ANALYSIS_MODULE}:create_rain', messages.RAIN_ERROR_MESSAGE, 'осадки'),
+    ('speedrose', f'{ANALYSIS_MODULE}:create_speedrose', messages.SPEEDROSE_ERROR_MESSAGE, 'роза скоростей'),
+)
+
+# Графики, которые зависят от затухания умной розы: /decay перерисовывает только их
+DECAY_CHARTS = ('windrose',)
+
 
 # Define a few command handlers. These usually take the two arguments update and
 # context.
@@ -33,90 +162,801 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     await update.message.reply_text(messages.HELP_MESSAGE)
 
 
+async def _send_chart(update: Update, image, name: str, error_message: str, chart_name: str) -> str | None:
+    """
+    Дожидается отрисовки графика и отправляет его; при ошибке — отправляет error_message.
+
+    Returns:
+        Путь к отправленной картинке или None, если график не получился
+    """
+    try:
+        image_path = await image
+        with timed(f'send_{name}'):
+            await update.message.reply_photo(image_path)
+        return image_path
+    except Exception as e:
+        logging.warning("reply_photo (%s): %s", chart_name, e)
+        REGISTRY.inc('chart_errors_total', chart=name)
+        await update.message.reply_text(error_message)
+        return None
+
+
+async def _send_verdict(update: Update, verdict) -> str | None:
+    """Дожидается вердикта по ADD и отправляет его. Возвращает текст вердикта или None."""
+    try:
+        text = await verdict
+        with timed('send_verdict'):
+            await update.message.reply_text(text=text)
+        return text
+    except Exception:
+        REGISTRY.inc('chart_errors_total', chart='verdict')
+        await update.message.reply_text(messages.VERDICT_ERROR_MESSAGE)
+        return None
+
+
+async def _send_album(update: Update, jobs: dict, charts: tuple = CHARTS) -> dict:
+    """Рисует все графики параллельно и отправляет их одним альбомом."""
+    images = await asyncio.gather(*(jobs[name] for name, *_ in charts), return_exceptions=True)
+    results = {}
+    for image, (name, _, error_message, chart_name) in zip(images, charts):
+        if isinstance(image, Exception):
+            logging.warning("render (%s): %s", chart_name, image)
+            REGISTRY.inc('chart_errors_total', chart=name)
+            await update.message.reply_text(error_message)
+            results[name] = None
+        else:
+            results[name] = image
+    media = [image for image in results.values() if image is not None]
+    if len(media) > 1:
+        with timed('send_album'):
+            await update.message.reply_media_group([InputMediaPhoto(image) for image in media])
+    elif media:
+        # Альбом в Telegram — от двух картинок
+        with timed('send_album'):
+            await update.message.reply_photo(media[0])
+    if 'verdict' in jobs:
+        results['verdict'] = await _send_verdict(update, jobs['verdict'])
+    return results
+
+
+def _vector_path(workspace: Workspace) -> str | None:
+    """Куда задаче графика температуры сохранить векторный файл или None, если он не нужен."""
+    if TEMPERATURE_VECTOR_FORMAT not in ('svg', 'pdf'):
+        return None
+    return workspace.file(f'temperature.{TEMPERATURE_VECTOR_FORMAT}')
+
+
+async def _send_vector(update: Update, path: str | None) -> None:
+    """Отправляет файлом векторный график температуры, если задача графика его сохранила."""
+    if path is None or not os.path.exists(path):
+        return
+    try:
+        with timed('send_temperature_vector'):
+            await update.message.reply_document(path)
+    except Exception as e:
+        # Векторный файл — дополнение к картинке, которая уже отправлена
+        logging.warning("temperature vector: %s", e)
+        REGISTRY.inc('chart_errors_total', chart='temperature_vector')
+
+
+async def _cached(value):
+    """Оборачивает готовое значение из кэша в корутину, как будто его нарисовал пул."""
+    return value
+
+
+def _is_zip(document) -> bool:
+    """Прислан ли zip с архивами нескольких станций."""
+    return (document.file_name or '').lower().endswith('.zip') or document.mime_type in (
+        'application/zip', 'application/x-zip-compressed'
+    )
+
+
+async def _download_document(document, input_file_path: str) -> bytes | str:
+    """
+    Скачивает документ из сообщения.
+    
+    Returns:
+        Содержимое документа или input_file_path, если он больше ARCHIVE_MEMORY_MAX_MB
+    """
+    with timed('download'):
+        file = await document.get_file()
+        if (document.file_size or 0) > ARCHIVE_MEMORY_MAX_MB * 1024 * 1024:
+            await file.download_to_drive(custom_path=input_file_path)
+            return input_file_path
+        buffer = io.BytesIO()
+        await file.download_to_memory(out=buffer)
+        return buffer.getvalue()
+
+
+def _render_jobs(render_pool: RenderPool, dataset: Packed, image_paths: dict,
+                 charts: tuple = CHARTS, verdict: bool = True, vector_path: str | None = None) -> dict:
+    """
+    Корутины отрисовки графиков charts и вердикта в пуле.
+
+    vector_path — куда график температуры сохранит ещё и векторный файл (см. _vector_path).
+    """
+    # Аргументы графиков после датасета и пути к картинке
+    extra = {'speedrose': (SPEED_CLASSES,)}
+    if vector_path is not None:
+        extra['temperature'] = (vector_path,)
+    jobs = {
+        name: render_pool.run(create_chart, dataset, image_paths[name], *extra.get(name, ()))
+        for name, create_chart, *_ in charts
+    }
+    if verdict:
+        jobs['verdict'] = render_pool.run(f'{ANALYSIS_MODULE}:tell_verdict', dataset)
+    return jobs
+
+
+async def _send_charts(update: Update, jobs: dict, mode: str, reproach: bool = False,
+                       charts: tuple = CHARTS) -> dict:
+    """
+    Отправляет графики charts и вердикт, если он есть в jobs (корутины отрисовки), в режиме mode (см. RENDER_MODE).
+
+    Returns:
+        dict: Имя графика или 'verdict' -> отправленная картинка/текст или None, если не получилось
+    """
+    if mode == 'sequential':
+        results = {}
+        for i, (name, _, error_message, chart_name) in enumerate(charts):
+            if reproach and i:
+                await asyncio.sleep(10)
+            results[name] = await _send_chart(update, jobs[name], name, error_message, chart_name)
+        if 'verdict' in jobs:
+            results['verdict'] = await _send_verdict(update, jobs['verdict'])
+    else:
+        # Графики не зависят друг от друга: отдаём их в пул все сразу
+        jobs = {name: asyncio.ensure_future(job) for name, job in jobs.items()}
+        if mode == 'album':
+            results = await _send_album(update, jobs, charts)
+        else:
+            # stream: каждый график уходит, как только готов
+            sends = {
+                name: _send_chart(update, jobs[name], name, error_message, chart_name)
+                for name, _, error_message, chart_name in charts
+            }
+            if 'verdict' in jobs:
+                sends['verdict'] = _send_verdict(update, jobs['verdict'])
+            results = dict(zip(sends, await asyncio.gather(*sends.values())))
+    return results
+
+
+async def _process_archive(update: Update, context: ContextTypes.DEFAULT_TYPE, workspace: Workspace,
+                           log: dict) -> None:
+    """
+    Разбирает архив из сообщения и отправляет графики; все файлы пишутся в workspace.
+
+    Итог обработки (status, cache) дописывается в log — запись лога запроса.
+    """
+    reproach = update.effective_user.id in REPROACH_USER_IDS
+    render_pool = context.bot_data['render_pool']
+    result_cache = context.bot_data['result_cache']
+    validator = context.bot_data['validator']
+
+    input_file_path = workspace.file('archive.xls.gz')
+    image_paths = {name: workspace.file(f'{name}.jpg') for name, *_ in CHARTS}
+
+    archive = await _download_document(update.message.document, input_file_path)
+    with timed('validate'):
+        is_valid, message = await asyncio.to_thread(validator.check_archive, archive)
+    if is_valid:
+        try:
+            # zlib и sha256 отпускают GIL, поэтому поток не держит цикл событий
+            with timed('decompress'):
+                xls = await asyncio.to_thread(unpack_archive, archive, validator.max_xls_bytes)
+        except ValueError as e:
+            is_valid, message = validator.reject('unpack', str(e))
+    if is_valid:
+        with timed('digest'):
+            digest = await asyncio.to_thread(archive_digest, xls)
+        # Настройки графиков известны, когда воркеры прогреты (см. warm_up_render_pool)
+        chart_settings = await context.bot_data['warm_up']
+        cache_key = result_cache.key(digest, {**chart_settings, 'speed_classes': list(SPEED_CLASSES)})
+        # Чтение кэша — файловые операции: в потоке, чтобы не задерживать ответы другим чатам
+        cached = await asyncio.to_thread(result_cache.get, cache_key)
+        log['cache'] = 'miss' if cached is None else 'hit'
+        if cached is None:
+            try:
+                dataset = await render_pool.run(
+                    f'{ANALYSIS_MODULE}:load_meteo_dataset', xls, context.bot_data['columnar_cache'], digest,
+                    context.bot_data['station_history'], pack_result=True,
+                )
+            except ValueError as e:
+                is_valid, message = validator.reject('parse', str(e))
+    if not is_valid:
+        log['status'] = 'rejected'
+        await update.message.reply_text(message)
+        return
+    context.bot_data['recent_datasets'].put(
+        update.effective_user.id, RecentDataset(digest, dataset if cached is None else None)
+    )
+
+    if reproach:
+        await update.message.reply_text(messages.REPROACH_MESSAGE)
+        await asyncio.sleep(20)
+
+    vector_path = _vector_path(workspace)
+    if cached is None:
+        jobs = _render_jobs(render_pool, dataset, image_paths, vector_path=vector_path)
+    else:
+        jobs = {name: _cached(cached.images[name]) for name, *_ in CHARTS}
+        jobs['verdict'] = _cached(cached.verdict)
+
+    # Дебаф упрёков работает только в последовательном режиме
+    results = await _send_charts(update, jobs, 'sequential' if reproach else RENDER_MODE, reproach)
+    if cached is None:
+        await _send_vector(update, vector_path)
+
+    if not all(results.values()):
+        log['status'] = 'partial'
+    # Кэшируем только полностью удачный результат
+    if cached is None and all(results.values()):
+        verdict = results.pop('verdict')
+        # Копирование картинок и вытеснение обходят папку кэша — тоже в потоке
+        await asyncio.to_thread(result_cache.put, cache_key, results, verdict)
+    await update.message.reply_text(text=messages.ROSE_MESSAGE)
+
+
+async def _read_batch(update: Update, context: ContextTypes.DEFAULT_TYPE, workspace: Workspace,
+                      documents: list) -> tuple[list, list]:
+    """
+    Скачивает архивы пакета: все файлы альбома параллельно или один zip.
+
+    Returns:
+        tuple: (список (имя, архив), список (имя, сообщение об отказе))
+    """
+    validator = context.bot_data['validator']
+    if len(documents) == 1:
+        archive = await _download_document(documents[0], workspace.file('batch.zip'))
+        members, message = await asyncio.to_thread(validator.read_batch, archive)
+        return members, [(documents[0].file_name, message)] if message else []
+
+    members, failures = [], []
+    for document in documents[:validator.max_batch_files]:
+        is_valid, message = validator.check_document(document.file_name, document.file_size)
+        if is_valid:
+            members.append(document)
+        else:
+            failures.append((document.file_name, message))
+    for document in documents[validator.max_batch_files:]:
+        failures.append((document.file_name, messages.BATCH_TOO_MANY_MESSAGE.format(limit=validator.max_batch_files)))
+    archives = await asyncio.gather(*(
+        _download_document(document, workspace.file(f'{index}.xls.gz'))
+        for index, document in enumerate(members)
+    ))
+    return [(document.file_name, archive) for document, archive in zip(members, archives)], failures
+
+
+async def _summarize_archive(context: ContextTypes.DEFAULT_TYPE, archive: bytes | str) -> dict:
+    """
+    Проверяет, распаковывает и разбирает в пуле один архив пакета.
+
+    Raises:
+        ValueError: С сообщением для пользователя, если архив не подошёл
+    """
+    validator = context.bot_data['validator']
+    with timed('validate'):
+        is_valid, message = await asyncio.to_thread(validator.check_archive, archive)
+    if not is_valid:
+        raise ValueError(message)
+    try:
+        with timed('decompress'):
+            xls = await asyncio.to_thread(unpack_archive, archive, validator.max_xls_bytes)
+    except ValueError as e:
+        validator.reject('unpack', str(e))
+        raise
+    with timed('digest'):
+        digest = await asyncio.to_thread(archive_digest, xls)
+    await context.bot_data['warm_up']
+    try:
+        return await context.bot_data['render_pool'].run(
+            f'{ANALYSIS_MODULE}:summarize_station', xls, context.bot_data['columnar_cache'], digest,
+            context.bot_data['station_history'],
+        )
+    except ValueError as e:
+        validator.reject('parse', str(e))
+        raise
+
+
+def _station_table(summaries: list[dict], failures: list[tuple[str, str]]) -> str:
+    """Таблица ADD по станциям пакета и архивы, которые не получилось разобрать."""
+    lines = [messages.STATION_TABLE_HEADER]
+    for index, summary in enumerate(summaries, start=1):
+        lines.append(messages.STATION_TABLE_ROW.format(
+            index=index,
+            name=summary['name'] or f'архив {index}',
+            wmo=f", WMO {summary['wmo_id']}" if summary['wmo_id'] else '',
+            period=summary['period'],
+            add=summary['add'],
+            tbs=summary['tbs'],
+        ))
+    if failures:
+        lines.append('')
+        lines.extend(f'{name}: {message}' for name, message in failures)
+    return '\n'.join(lines)
+
+
+async def _process_batch(update: Update, context: ContextTypes.DEFAULT_TYPE, workspace: Workspace,
+                         log: dict, members: list, failures: list) -> None:
+    """
+    Разбирает архивы нескольких станций параллельно и отправляет сетку роз и таблицу ADD.
+
+    Каждый архив разбирается отдельной задачей пула и сводится к нескольким
+    числам (summarize_station), а сетка рисуется одной задачей из этих сводок.
+    """
+    results = await asyncio.gather(
+        *(_summarize_archive(context, archive) for _, archive in members), return_exceptions=True
+    )
+    summaries = []
+    for (name, _), result in zip(members, results):
+        if isinstance(result, ValueError):
+            failures.append((name, str(result)))
+        elif isinstance(result, Exception):
+            logging.warning("batch archive %s: %s", name, result)
+            failures.append((name, f"❌ Ошибка при обработке файла: {result}"))
+        else:
+            summaries.append(result)
+    log['stations'] = len(summaries)
+    if not summaries:
+        log['status'] = 'rejected'
+        await update.message.reply_text(_station_table([], failures))
+        return
+
+    if update.effective_user.id in REPROACH_USER_IDS:
+        await update.message.reply_text(messages.REPROACH_MESSAGE)
+        await asyncio.sleep(20)
+
+    grid = context.bot_data['render_pool'].run(
+        f'{ANALYSIS_MODULE}:create_station_grid', summaries, workspace.file('stations.jpg')
+    )
+    sent = await _send_chart(update, grid, 'station_grid', messages.STATION_GRID_ERROR_MESSAGE, 'сетка станций')
+    await update.message.reply_text(_station_table(summaries, failures))
+
+    if failures or sent is None:
+        log['status'] = 'partial'
+    await update.message.reply_text(text=messages.ROSE_MESSAGE)
+
+
+@contextlib.asynccontextmanager
+async def _replying_errors(update: Update, context: ContextTypes.DEFAULT_TYPE, log: dict):
+    """Отвечает пользователю, если запрос не обработан: очередь полна, бот перезапускается, запрос устарел или упал."""
+    user_requests = context.bot_data['user_requests']
+    shutdown = context.bot_data['shutdown']
+    try:
+        yield
+    except RenderQueueFull:
+        log['status'] = 'busy'
+        await update.message.reply_text(messages.BUSY_MESSAGE)
+    except asyncio.CancelledError:
+        if shutdown.draining:
+            log['status'] = 'restarting'
+            await update.message.reply_text(messages.RESTARTING_MESSAGE)
+            raise
+        if not user_requests.superseded():
+            raise
+        log['status'] = 'superseded'
+        await update.message.reply_text(messages.SUPERSEDED_MESSAGE)
+    except Exception as e:
+        log['status'] = 'error'
+        log['error'] = str(e)
+        await update.message.reply_text(text=f"❌ Ошибка при обработке файла: {e}")
+
+
 async def rose(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.effective_user.id
-    reproach = user_id in REPROACH_USER_IDS
+    render_pool = context.bot_data['render_pool']
+    user_requests = context.bot_data['user_requests']
+    shutdown = context.bot_data['shutdown']
 
-    input_file_path = f'bot/files/{user_id}.xls.gz'
-    windrose_path = f'bot/files/images/{user_id}_windrose.jpg'
-    temperature_path = f'bot/files/images/{user_id}_temperature.jpg'
-    rain_path = f'bot/files/images/{user_id}_rain.jpg'
+    # Файлы альбома приходят отдельными обновлениями: весь альбом обрабатывает первый из них
+    documents = [update.message.document]
+    if update.message.media_group_id:
+        documents = await context.bot_data['media_groups'].collect(
+            update.message.media_group_id, update.message.document
+        )
+        if documents is None:
+            return
+    batch = len(documents) > 1 or _is_zip(documents[0])
 
-    try:
-        file = await update.message.document.get_file()
-        await file.download_to_drive(custom_path=input_file_path)
-        is_valid, message = validate_meteo_file(input_file_path)
-        if not is_valid:
-            await update.message.reply_text(message)
-            if os.path.exists(input_file_path):
-                os.remove(input_file_path)
+    with request_trace(user=user_id) as log, shutdown.track():
+        # Бот останавливается: дорисовываем начатое, новые архивы не берём
+        if shutdown.draining:
+            log['status'] = 'restarting'
+            await update.message.reply_text(messages.RESTARTING_MESSAGE)
             return
 
-        if reproach:
-            await update.message.reply_text(messages.REPROACH_MESSAGE)
-            await asyncio.sleep(20)
+        # Чужой или слишком большой файл отклоняем до скачивания и не занимаем им очередь
+        if len(documents) == 1:
+            is_valid, message = context.bot_data['validator'].check_document(
+                documents[0].file_name, documents[0].file_size, batch
+            )
+            if not is_valid:
+                log['status'] = 'rejected'
+                await update.message.reply_text(message)
+                return
+
+        async with _replying_errors(update, context, log):
+            async with user_requests.turn(user_id) as current:
+                if not current:
+                    log['status'] = 'superseded'
+                    await update.message.reply_text(messages.SUPERSEDED_MESSAGE)
+                    return
+                with Workspace(WORKSPACE_DIR, user_id) as workspace:
+                    # Пакет занимает в очереди по месту на архив: его стоимость — разбор архивов
+                    cost = 1
+                    if batch:
+                        members, failures = await _read_batch(update, context, workspace, documents)
+                        log['batch'] = len(members) + len(failures)
+                        if not members:
+                            log['status'] = 'rejected'
+                            await update.message.reply_text(_station_table([], failures))
+                            return
+                        cost = len(members)
+                    with render_pool.admit(cost) as position:
+                        log['queue_position'] = position
+                        if position:
+                            await update.message.reply_text(messages.QUEUED_MESSAGE.format(position=position))
+                        if batch:
+                            await _process_batch(update, context, workspace, log, members, failures)
+                        else:
+                            await _process_archive(update, context, workspace, log)
+
 
+def _parse_date(text: str) -> dt.date:
+    """Дата из команды: 2025-10-01 или 01.10.2025."""
+    for date_format in ('%Y-%m-%d', '%d.%m.%Y'):
         try:
-            await update.message.reply_photo(
-                create_combined_rose(input_file_path, windrose_path)
-            )
-        except Exception as e:
-            logging.warning("reply_photo (роза ветров): %s", e)
-            await update.message.reply_text(
-                "Извините, я почему-то не смогла отправить розу ветров. Может быть, в архиве не было ветра? Проверьте, пожалуйста, что он именно с метеостанции/из аэропорта, а не с метеодатчика🫠"
+            return dt.datetime.strptime(text, date_format).date()
+        except ValueError:
+            pass
+    raise ValueError(f"не дата: {text}")
+
+
+async def window_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/window ПЕРВЫЙ_ДЕНЬ ПОСЛЕДНИЙ_ДЕНЬ — графики последнего архива только за эти дни; без дат — за весь архив."""
+    args = context.args or []
+    try:
+        if len(args) not in (0, 2):
+            raise ValueError("нужны две даты")
+        window = tuple(sorted(_parse_date(arg) for arg in args)) or None
+    except ValueError:
+        await update.message.reply_text(messages.WINDOW_USAGE_MESSAGE)
+        return
+    await _rerender(update, context, window=window)
+
+
+async def decay_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/decay ЧИСЛО — затухание умной розы в сутки для последнего архива; без числа — как обычно."""
+    args = context.args or []
+    try:
+        if len(args) > 1:
+            raise ValueError("нужно одно число")
+        decay_rate = None
+        if args:
+            value = float(args[0].replace(',', '.'))
+            # NaN не проходит сравнения и тоже отклоняется
+            if not 0 <= value <= DECAY_MAX:
+                raise ValueError(f"затухание вне [0, {DECAY_MAX}]")
+            decay_rate = -value
+    except ValueError:
+        default = -(await context.bot_data['warm_up'])['importance_decay_rate']
+        await update.message.reply_text(messages.DECAY_USAGE_MESSAGE.format(limit=f'{DECAY_MAX:g}', default=f'{default:g}'))
+        return
+    await _rerender(update, context, decay_rate=decay_rate)
+
+
+async def _on_recent_dataset(update: Update, context: ContextTypes.DEFAULT_TYPE, work, cost: int = 1) -> None:
+    """
+    Общая часть команд по последнему архиву пользователя (/window, /decay, /animate).
+
+    Находит архив, дожидается очереди пользователя и места в пуле (cost мест) и
+    вызывает work(entry, workspace, log) — корутину, которая рисует и отправляет
+    результат; entry — снимок записи, его не меняют другие команды и новые архивы.
+    Архив не скачивается и не разбирается заново.
+    """
+    user_id = update.effective_user.id
+    render_pool = context.bot_data['render_pool']
+    recent_datasets = context.bot_data['recent_datasets']
+    user_requests = context.bot_data['user_requests']
+    shutdown = context.bot_data['shutdown']
+
+    with request_trace(user=user_id, command=update.message.text.split()[0]) as log, shutdown.track():
+        if shutdown.draining:
+            log['status'] = 'restarting'
+            await update.message.reply_text(messages.RESTARTING_MESSAGE)
+            return
+        entry = recent_datasets.get(user_id)
+        if entry is None:
+            log['status'] = 'rejected'
+            await update.message.reply_text(messages.RERENDER_NO_DATASET_MESSAGE)
+            return
+
+        async with _replying_errors(update, context, log):
+            async with user_requests.turn(user_id) as current:
+                if not current:
+                    log['status'] = 'superseded'
+                    await update.message.reply_text(messages.SUPERSEDED_MESSAGE)
+                    return
+                with Workspace(WORKSPACE_DIR, user_id) as workspace, render_pool.admit(cost) as position:
+                    log['queue_position'] = position
+                    if position:
+                        await update.message.reply_text(messages.QUEUED_MESSAGE.format(position=position))
+                    await context.bot_data['warm_up']
+                    try:
+                        entry = await _complete_recent_dataset(context, user_id)
+                    except ValueError:
+                        entry = None
+                    if entry is None:
+                        log['status'] = 'rejected'
+                        await update.message.reply_text(messages.RERENDER_NO_DATASET_MESSAGE)
+                        return
+                    await work(entry, workspace, log)
+
+
+async def _complete_recent_dataset(context: ContextTypes.DEFAULT_TYPE, user_id: int) -> RecentDataset | None:
+    """
+    Снимок последнего архива пользователя с разобранным датасетом и индексом.
+
+    Недостающее достраивается в пуле под блокировкой записи пользователя: одновременные
+    команды не делают этого дважды, а новый архив, присланный тем временем,
+    не затирается старым (RecentDatasets.replace).
+
+    Returns:
+        RecentDataset или None, если архива уже нет
+
+    Raises:
+        ValueError: Если архива нет и в колоночном кэше
+    """
+    render_pool = context.bot_data['render_pool']
+    recent_datasets = context.bot_data['recent_datasets']
+    async with recent_datasets.lock(user_id):
+        entry = recent_datasets.get(user_id)
+        if entry is None or entry.index is not None:
+            return entry
+        dataset = entry.dataset
+        if dataset is None:
+            # Графики последнего архива были из кэша готовых, и он не разбирался:
+            # берём разобранный из колоночного кэша
+            dataset = await render_pool.run(
+                f'{ANALYSIS_MODULE}:load_meteo_dataset', None, context.bot_data['columnar_cache'],
+                entry.digest, pack_result=True,
             )
+        # Индекс строится один раз на архив: окна и кадры — запросы к нему
+        index = await render_pool.run(f'{ANALYSIS_MODULE}:build_time_index', dataset, pack_result=True)
+        entry = dataclasses.replace(entry, dataset=dataset, index=index)
+        recent_datasets.replace(user_id, entry)
+    return entry
+
+
+def _period(window: tuple[dt.date, dt.date] | None) -> str:
+    """Период для сообщений: окно /window или весь архив."""
+    return f'{window[0]:%d.%m.%Y} — {window[1]:%d.%m.%Y}' if window else messages.RERENDER_FULL_PERIOD
+
 
-        if reproach:
-            await asyncio.sleep(10)
+async def _rerender(update: Update, context: ContextTypes.DEFAULT_TYPE, **changes) -> None:
+    """
+    Перерисовывает графики по последнему архиву пользователя, не скачивая и не разбирая его заново.
 
+    changes — новые аргументы rozovetrovnitsa.reframe_dataset (window, decay_rate); остальные
+    остаются такими, какими их задали прошлые команды.
+    """
+    render_pool = context.bot_data['render_pool']
+
+    async def rerender(entry: RecentDataset, workspace: Workspace, log: dict) -> None:
+        settings = {**entry.settings, **changes}
         try:
-            await update.message.reply_photo(
-                create_temperature(input_file_path, temperature_path)
+            dataset = await render_pool.run(
+                f'{ANALYSIS_MODULE}:reframe_dataset', entry.dataset,
+                settings.get('window'), settings.get('decay_rate'), entry.index, pack_result=True,
             )
-        except Exception as e:
-            logging.warning("reply_photo (температура): %s", e)
-            await update.message.reply_text(
-                "Почему-то я не смогла сделать график температуры((Хз почему, напишите Бушейше."
+        except ValueError as e:
+            log['status'] = 'rejected'
+            await update.message.reply_text(str(e))
+            return
+        # Запись могла обновиться, пока шла отрисовка: дополняем свежую, а не снимок,
+        # и только если это всё тот же архив
+        recent_datasets = context.bot_data['recent_datasets']
+        current = recent_datasets.get(update.effective_user.id)
+        if current is not None and current.digest == entry.digest:
+            recent_datasets.replace(
+                update.effective_user.id, dataclasses.replace(current, settings={**current.settings, **changes})
             )
 
-        if reproach:
-            await asyncio.sleep(10)
+        # От затухания зависит только умная роза: остальные графики и вердикт не меняются
+        charts, verdict = CHARTS, True
+        if set(changes) == {'decay_rate'}:
+            charts, verdict = tuple(chart for chart in CHARTS if chart[0] in DECAY_CHARTS), False
+        image_paths = {name: workspace.file(f'{name}.jpg') for name, *_ in charts}
+        vector_path = _vector_path(workspace) if 'temperature' in image_paths else None
+        jobs = _render_jobs(render_pool, dataset, image_paths, charts, verdict, vector_path)
+        results = await _send_charts(update, jobs, RENDER_MODE, charts=charts)
+        if not all(results.values()):
+            log['status'] = 'partial'
+        await _send_vector(update, vector_path)
+
+        chart_settings = await context.bot_data['warm_up']
+        decay_rate = settings.get('decay_rate')
+        await update.message.reply_text(messages.RERENDER_MESSAGE.format(
+            period=_period(settings.get('window')),
+            decay=f"{-(chart_settings['importance_decay_rate'] if decay_rate is None else decay_rate):g}",
+        ))
+
+    await _on_recent_dataset(update, context, rerender)
 
+
+async def animate_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/animate [day|6h] — анимация роз за скользящие сутки по последнему архиву с шагом в сутки или 6 часов."""
+    args = context.args or []
+    if len(args) > 1 or (args and args[0].lower() not in ANIMATION_STEPS):
+        await update.message.reply_text(messages.ANIMATION_USAGE_MESSAGE.format(limit=ANIMATION_MAX_FRAMES))
+        return
+    step = args[0].lower() if args else 'day'
+    render_pool = context.bot_data['render_pool']
+    # Кадры рисуются частями во всех воркерах сразу, поэтому анимация занимает весь пул
+    parts = max(1, min(render_pool.workers, ANIMATION_MAX_FRAMES))
+
+    async def animate(entry: RecentDataset, workspace: Workspace, log: dict) -> None:
+        settings = entry.settings
         try:
-            await update.message.reply_photo(create_rain(input_file_path, rain_path))
-        except Exception as e:
-            logging.warning("reply_photo (осадки): %s", e)
-            await update.message.reply_text(
-                "Что-то не ладится с графиком осадков... Надеюсь, он был Вам не очень нужен -- в любом случае, если что, напишите Бушейше."
+            # Розы всех кадров — одна задача: запросы к одному индексу архива
+            frames = await render_pool.run(
+                f'{ANALYSIS_MODULE}:rolling_roses', entry.dataset, settings.get('window'),
+                settings.get('decay_rate'), ANIMATION_STEPS[step], ANIMATION_MAX_FRAMES, entry.index,
             )
+        except ValueError as e:
+            log['status'] = 'rejected'
+            await update.message.reply_text(str(e))
+            return
+        count = len(frames['titles'])
+        paths = [workspace.file(f'frame-{index:04d}.png') for index in range(count)]
+        bounds = [count * part // parts for part in range(parts + 1)]
+        with timed('render_frames'):
+            await asyncio.gather(*(
+                render_pool.run(
+                    f'{ANALYSIS_MODULE}:render_rose_frames', frames['values'][lo:hi], frames['titles'][lo:hi],
+                    paths[lo:hi],
+                )
+                for lo, hi in zip(bounds, bounds[1:]) if hi > lo
+            ))
         try:
-            await update.message.reply_text(text=tell_verdict(input_file_path))
-        except Exception:
-            await update.message.reply_text(
-                "Что-то не ладится с эффективными температурами... Надеюсь, они Вам не очень нужны -- в любом случае, если что, напишите Бушейше."
+            animation = await render_pool.run(
+                f'{ANALYSIS_MODULE}:encode_animation', paths, workspace.file('animation'),
+                ANIMATION_MAX_MB * 1024 * 1024, ANIMATION_FORMAT == 'mp4',
             )
-        await update.message.reply_text(text=messages.ROSE_MESSAGE)
-    except Exception as e:
-        await update.message.reply_text(text=f"❌ Ошибка при обработке файла: {e}")
-        if os.path.exists(input_file_path):
-            os.remove(input_file_path)
+        except ValueError as e:
+            log['status'] = 'rejected'
+            await update.message.reply_text(str(e))
+            return
+        with timed('send_animation'):
+            await update.message.reply_animation(animation)
+        log['frames'] = count
+        await update.message.reply_text(messages.ANIMATION_MESSAGE.format(
+            frames=count, step=messages.ANIMATION_STEP_NAMES[step], period=_period(settings.get('window')),
+        ))
+
+    await _on_recent_dataset(update, context, animate, cost=parts)
+
+
+def _register_metrics(bot_data: dict) -> None:
+    """Метрики, которые читаются из объектов бота в момент запроса страницы."""
+    render_pool = bot_data['render_pool']
+    result_cache = bot_data['result_cache']
+    validator = bot_data['validator']
+    REGISTRY.source('render_queue_depth', 'gauge', lambda: render_pool.pending)
+    REGISTRY.source('render_workers', 'gauge', lambda: render_pool.workers)
+    REGISTRY.source('requests_in_flight', 'gauge', lambda: bot_data['shutdown'].in_flight)
+    REGISTRY.source(
+        'result_cache_lookups_total', 'counter',
+        lambda: {'hit': result_cache.hits, 'miss': result_cache.misses}, label='result',
+    )
+    REGISTRY.source('recent_datasets', 'gauge', lambda: len(bot_data['recent_datasets']))
+    REGISTRY.source('recent_datasets_bytes', 'gauge', lambda: bot_data['recent_datasets'].size)
+    REGISTRY.source('upload_rejections_total', 'counter', lambda: dict(validator.rejections), label='stage')
+
+
+async def warm_up_render_pool(render_pool: RenderPool) -> dict:
+    """
+    Запускает и прогревает воркеры пула.
+
+    Returns:
+        Настройки графиков для ключа кэша — их считает воркер, где уже загружен matplotlib
+    """
+    start = time.perf_counter()
+    await render_pool.start()
+    settings = await render_pool.run(f'{ANALYSIS_MODULE}:chart_settings')
+    REGISTRY.observe('warm_up_seconds', time.perf_counter() - start)
+    logging.info("render pool warmed up in %.2f s", time.perf_counter() - start)
+    return settings
+
+
+async def start_services(application: Application) -> None:
+    """
+    Поднимает страницу метрик, если задан METRICS_PORT, ставит обработчики
+    сигналов остановки и прогревает пул в фоне.
+
+    Бот начинает опрашивать Telegram сразу и отвечает на команды, пока воркеры
+    загружают pandas и matplotlib; архивы ждут окончания прогрева.
+    """
+    if METRICS_PORT:
+        application.bot_data['metrics_server'] = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+    application.bot_data['shutdown'].install(application)
+    application.bot_data['warm_up'] = asyncio.ensure_future(
+        warm_up_render_pool(application.bot_data['render_pool'])
+    )
+
 
+async def shutdown_render_pool(application: Application) -> None:
+    """Останавливает пул отрисовки и страницу метрик после остановки бота."""
+    server = application.bot_data.get('metrics_server')
+    if server is not None:
+        server.close()
+    await asyncio.to_thread(application.bot_data['render_pool'].shutdown)
 
 
 def main() -> None:
     """Start the bot."""
     TOKEN = config('TG_TOKEN')
+    if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+        # Без него PTB собрал бы адрес из WEBHOOK_LISTEN и WEBHOOK_PORT (https://0.0.0.0:8443/...),
+        # зарегистрировал его в Telegram, и обновления молча перестали бы приходить
+        raise SystemExit("BOT_MODE=webhook: задайте WEBHOOK_URL — внешний https-адрес вебхука, "
+                         "например https://example.org/telegram")
 
-    application = Application.builder().token(TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .base_url(TG_BASE_URL)
+        .base_file_url(TG_BASE_FILE_URL)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .connection_pool_size(CONNECTION_POOL_SIZE)
+        .pool_timeout(POOL_TIMEOUT)
+        .post_init(start_services)
+        .post_shutdown(shutdown_render_pool)
+        .build()
+    )
+    application.bot_data['render_pool'] = RenderPool(
+        RENDER_WORKERS, RENDER_QUEUE_SIZE, preload=(ANALYSIS_MODULE,), warm_up=f'{ANALYSIS_MODULE}:warm_up'
+    )
+    application.bot_data['result_cache'] = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB * 1024 * 1024)
+    application.bot_data['columnar_cache'] = ColumnarCache(COLUMNAR_CACHE_DIR, COLUMNAR_CACHE_MAX_MB * 1024 * 1024)
+    application.bot_data['station_history'] = (
+        StationHistory(STATION_HISTORY_DIR, STATION_HISTORY_MAX_MB * 1024 * 1024) if STATION_HISTORY_MAX_MB > 0 else None
+    )
+    application.bot_data['recent_datasets'] = RecentDatasets(RECENT_DATASETS_MAX_MB * 1024 * 1024, RECENT_DATASETS_TTL)
+    application.bot_data['validator'] = UploadValidator(
+        ARCHIVE_MAX_MB * 1024 * 1024, XLS_MAX_MB * 1024 * 1024, BATCH_MAX_FILES
+    )
+    application.bot_data['media_groups'] = MediaGroups()
+    application.bot_data['user_requests'] = UserRequests(USER_POLICY)
+    application.bot_data['shutdown'] = GracefulShutdown(SHUTDOWN_TIMEOUT)
+    clear_workspaces(WORKSPACE_DIR)
+    _register_metrics(application.bot_data)
 
     # on different commands - answer in Telegram
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(MessageHandler(filters.Document.ALL, rose))
+    application.add_handler(CommandHandler("window", window_command, block=False))
+    application.add_handler(CommandHandler("decay", decay_command, block=False))
+    application.add_handler(CommandHandler("animate", animate_command, block=False))
+    # block=False: пока архив обрабатывается в пуле, бот отвечает остальным
+    application.add_handler(MessageHandler(filters.Document.ALL, rose, block=False))
 
 
-    # Run the bot until the user presses Ctrl-C
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    # Run the bot until the user presses Ctrl-C.
+    # Сигналы остановки обрабатывает GracefulShutdown, поэтому stop_signals=None
+    if BOT_MODE == 'webhook':
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET or None,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES,
+            stop_signals=None,
+        )
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES, stop_signals=None)
 
 
 if __name__ == "__main__":
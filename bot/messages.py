@@ -3,6 +3,7 @@ START_MESSAGE = '''Привет! Я Розоветровница - бот, ко
         "windrose" - это обычная роза ветров: она учитывает повторяемость каждого ветра. 
         "smartrose" - это улучшенная роза ветров: она учитывает ещё и скорость ветра, а также плавно снижает значимость ветров, которые были раньше - чем больше давность ветра, тем ниже значимость. Вроде бы теперь время всегда расшифровывается правильно, но если вы видите неправдоподобный результат - напишите @busheisha, чтобы она поняла, что не так.
         "температура и влажность" - это просто график температуры. Размер кружочка отображает влажность.
+        "скорость ветра" - это роза скоростей: для каждого направления видно, какая доля всех наблюдений приходится на слабый, средний и сильный ветер.
         
         Я только анализирую данные и генерирую картинки, но не могу давать советов по поиску. Выбор данных для меня и интерпретация картинок - задача пользователя. Я очень рада вам помочь.'''
 
@@ -15,6 +16,8 @@ HELP_MESSAGE = ''' Актуальные новости и инструкции 
         Если эта информация актуальна, переходим по ссылке "Архив погоды", затем выбираем вкладку "скачать архив погоды", указываем нужный диапазон дат, выбираем формат "XLS (Excell)", жмём синюю кнопку "Выбрать в файл GZ (архив)", затем справа от неё "Скачать".
 
         Вот этот файл и нужно мне отправить.
+
+        После графиков можно перерисовать их по тому же архиву, не загружая его снова: /window 2025-10-01 2025-10-05 — только за эти дни, /decay 0.1 — насколько за сутки падает значимость старого ветра в умной розе, /animate — анимация: как менялся ветер за последние дни (/animate 6h — кадр каждые 6 часов).
         
         Если есть вопросы - пишите @busheisha'''
 
@@ -24,4 +27,45 @@ ROSE_MESSAGE = '''
 '''
 
 REPROACH_MESSAGE = '''Вы думали о науке о данных свысока. Получен дебаф в виде замедления скорости работы и упрёков от Розоветровницы. Вы можете говорить "я и так всё знаю, мне такое не нужно", но зачем тогда пишете мне?
-Ещё не поздно переобуться. Дебаф спадёт при следующем обновлении. (Если отсыпать Бушейше фоточек для датасета, обновление случится раньше)'''
\ No newline at end of file
+Ещё не поздно переобуться. Дебаф спадёт при следующем обновлении. (Если отсыпать Бушейше фоточек для датасета, обновление случится раньше)'''
+
+WINDROSE_ERROR_MESSAGE = "Извините, я почему-то не смогла отправить розу ветров. Может быть, в архиве не было ветра? Проверьте, пожалуйста, что он именно с метеостанции/из аэропорта, а не с метеодатчика🫠"
+
+TEMPERATURE_ERROR_MESSAGE = "Почему-то я не смогла сделать график температуры((Хз почему, напишите Бушейше."
+
+RAIN_ERROR_MESSAGE = "Что-то не ладится с графиком осадков... Надеюсь, он был Вам не очень нужен -- в любом случае, если что, напишите Бушейше."
+
+SPEEDROSE_ERROR_MESSAGE = "Не получилось нарисовать розу скоростей((Может быть, в архиве не указана скорость ветра? Если что, напишите Бушейше."
+
+VERDICT_ERROR_MESSAGE = "Что-то не ладится с эффективными температурами... Надеюсь, они Вам не очень нужны -- в любом случае, если что, напишите Бушейше."
+
+QUEUED_MESSAGE = '''Сейчас я рисую графики для других пользователей. Ваш архив в очереди, позиция {position}. Подождите немного, пожалуйста🙏'''
+
+BUSY_MESSAGE = '''Ой, у меня сейчас слишком много архивов в очереди. Попробуйте отправить файл ещё раз через пару минут, пожалуйста.'''
+SUPERSEDED_MESSAGE = '''Вы прислали новый архив, поэтому этот я рисовать не стала: графики будут по последнему.'''
+
+RESTARTING_MESSAGE = '''Я как раз перезапускаюсь и новые архивы сейчас не беру. Пришлите файл ещё раз через минутку, пожалуйста.'''
+
+STATION_TABLE_HEADER = 'Сумма эффективных температур (ADD) по станциям:'
+
+STATION_TABLE_ROW = '{index}. {name}{wmo}, {period}: ADD {add}, total body score {tbs}'
+
+STATION_GRID_ERROR_MESSAGE = "Не получилось нарисовать розы станций рядом((Напишите, пожалуйста, Бушейше."
+
+BATCH_TOO_MANY_MESSAGE = '❌ За раз я сравниваю не больше {limit} станций, этот архив пропустила'
+
+RERENDER_NO_DATASET_MESSAGE = '''Я уже не помню Ваш последний архив. Пришлите его ещё раз, и потом можно будет менять даты (/window) и затухание умной розы (/decay) без повторной загрузки.'''
+
+WINDOW_USAGE_MESSAGE = '''Напишите даты начала и конца, например: /window 2025-10-01 2025-10-05 (или /window 01.10.2025 05.10.2025). Просто /window — снова весь архив.'''
+
+DECAY_USAGE_MESSAGE = '''Напишите, насколько за сутки падает значимость старого ветра в умной розе, числом от 0 до {limit}, например: /decay 0.1. Чем больше, тем важнее последние дни; 0 — все дни одинаково важны. Просто /decay — как обычно ({default}).'''
+
+RERENDER_MESSAGE = '''Перерисовала по последнему архиву: {period}, затухание умной розы {decay} в сутки.'''
+
+RERENDER_FULL_PERIOD = 'весь архив'
+
+ANIMATION_USAGE_MESSAGE = '''Напишите /animate — анимация роз ветра за скользящие сутки, кадр на каждый день, или /animate 6h — кадр каждые 6 часов. Кадров не больше {limit}, последние — до конца архива (или окна /window).'''
+
+ANIMATION_STEP_NAMES = {'day': 'сутки', '6h': '6 часов'}
+
+ANIMATION_MESSAGE = '''Анимация по последнему архиву: {period}, {frames} кадров, шаг {step}, в каждом кадре — ветер за сутки.'''
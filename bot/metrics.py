@@ -0,0 +1,220 @@
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import json
+import logging
+import time
+from collections import defaultdict
+
+# Границы корзин гистограмм длительности, секунды
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Замеры этапов текущего запроса: список (этап, секунды) или None вне запроса
+_trace: contextvars.ContextVar[list | None] = contextvars.ContextVar('metrics_trace', default=None)
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+class _Histogram:
+    """Гистограмма в духе Prometheus: счётчики по корзинам, сумма и количество."""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: tuple) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", bound),))} {cumulative}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {self.sum:.6f}')
+        lines.append(f'{name}_count{_format_labels(labels)} {self.count}')
+        return lines
+
+
+class Metrics:
+    """
+    Счётчики, гистограммы и источники значений для страницы метрик.
+
+    Живёт в основном процессе. Замеры из воркеров пула приходят вместе
+    с результатом задачи (см. traced_call) и попадают сюда через record.
+    """
+
+    def __init__(self):
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._sources = []
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Увеличивает счётчик name с метками labels."""
+        self._counters[name, tuple(sorted(labels.items()))] += value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Добавляет значение в гистограмму name с метками labels."""
+        key = (name, tuple(sorted(labels.items())))
+        if key not in self._histograms:
+            self._histograms[key] = _Histogram(DURATION_BUCKETS)
+        self._histograms[key].observe(value)
+
+    def source(self, name: str, kind: str, func, label: str | None = None) -> None:
+        """
+        Регистрирует значение, которое читается в момент запроса метрик.
+
+        Args:
+            name: Имя метрики
+            kind: Тип метрики Prometheus: gauge или counter
+            func: Возвращает число или, если задан label, словарь {значение метки: число}
+            label: Имя метки для словаря
+        """
+        self._sources.append((name, kind, func, label))
+
+    def render(self) -> str:
+        """Текст метрик в формате Prometheus."""
+        lines = []
+        typed = set()
+
+        def type_line(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in sorted(self._counters.items()):
+            type_line(name, 'counter')
+            lines.append(f'{name}{_format_labels(labels)} {value:g}')
+        for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+            type_line(name, 'histogram')
+            lines.extend(histogram.lines(name, labels))
+        for name, kind, func, label in self._sources:
+            type_line(name, kind)
+            value = func()
+            if label is None:
+                lines.append(f'{name} {value:g}')
+            else:
+                for label_value, number in sorted(value.items()):
+                    lines.append(f'{name}{_format_labels(((label, label_value),))} {number:g}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Metrics()
+
+
+def record(stage: str, seconds: float) -> None:
+    """Записывает длительность этапа в текущий запрос или, вне запроса, сразу в REGISTRY."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.append((stage, seconds))
+    else:
+        REGISTRY.observe('stage_seconds', seconds, stage=stage)
+
+
+@contextlib.contextmanager
+def timed(stage: str):
+    """
+    Замеряет длительность блока with или вызова функции (как декоратор).
+
+    Работает и в воркерах пула: замеры возвращаются вместе с результатом задачи.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def traced_call(func, *args):
+    """
+    Выполняет func(*args) в воркере и собирает замеры этапов.
+
+    Исключение не пробрасывается, а возвращается, чтобы замеры дошли до
+    основного процесса и в случае ошибки.
+
+    Returns:
+        tuple: (результат, исключение или None, список (этап, секунды))
+    """
+    trace = []
+    token = _trace.set(trace)
+    try:
+        return func(*args), None, trace
+    except Exception as e:
+        return None, e, trace
+    finally:
+        _trace.reset(token)
+
+
+def record_all(trace: list) -> None:
+    """Переносит замеры из воркера в текущий запрос основного процесса."""
+    for stage, seconds in trace:
+        record(stage, seconds)
+
+
+@contextlib.contextmanager
+def request_trace(**fields):
+    """
+    Собирает замеры одного запроса и по завершении пишет их в REGISTRY
+    и одной JSON-строкой в лог.
+
+    Yields:
+        dict: Поля записи лога; обработчик дописывает в него итог (status и т.п.)
+    """
+    trace = []
+    token = _trace.set(trace)
+    start = time.perf_counter()
+    fields.setdefault('status', 'ok')
+    try:
+        yield fields
+    except BaseException:
+        if fields['status'] == 'ok':
+            fields['status'] = 'error'
+        raise
+    finally:
+        _trace.reset(token)
+        total = time.perf_counter() - start
+        stages = defaultdict(float)
+        for stage, seconds in trace:
+            REGISTRY.observe('stage_seconds', seconds, stage=stage)
+            stages[stage] += seconds
+        REGISTRY.observe('request_seconds', total)
+        REGISTRY.inc('requests_total', status=fields['status'])
+        fields['seconds'] = round(total, 4)
+        fields['stages'] = {stage: round(seconds, 4) for stage, seconds in stages.items()}
+        logging.info("request %s", json.dumps(fields, ensure_ascii=False))
+
+
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await reader.readline()
+        # Заголовки запроса не нужны, но их надо дочитать
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        parts = request_line.split()
+        if len(parts) >= 2 and parts[0] == b'GET' and parts[1] == b'/metrics':
+            status, body = '200 OK', REGISTRY.render().encode()
+        else:
+            status, body = '404 Not Found', b'not found\n'
+        writer.write(
+            f'HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host: str, port: int) -> asyncio.Server:
+    """Поднимает страницу метрик GET /metrics в текущем цикле событий."""
+    server = await asyncio.start_server(_serve, host, port)
+    logging.info("metrics on http://%s:%d/metrics", host, port)
+    return server
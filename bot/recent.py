@@ -0,0 +1,118 @@
+import asyncio
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from render_pool import Packed
+
+
+@dataclass(frozen=True)
+class RecentDataset:
+    """
+    Последний архив пользователя для перерисовки командами /window и /decay.
+
+    Запись не меняется на месте: команды работают со своим снимком, а изменения
+    кладут новой записью (dataclasses.replace и RecentDatasets.replace).
+
+    Attributes:
+        digest: Хэш распакованного архива — по нему датасет читается из колоночного кэша,
+            если графики были взяты из кэша готовых и архив не разбирался
+        dataset: Разобранный архив (MeteoDataset в Packed) или None
+        index: Индекс архива (TimeIndex в Packed, см. rozovetrovnitsa.build_time_index) или None —
+            строится при первой команде и дальше не перестраивается
+        settings: Аргументы rozovetrovnitsa.reframe_dataset, заданные командами: window, decay_rate
+    """
+    digest: str
+    dataset: Packed | None = None
+    index: Packed | None = None
+    settings: dict = field(default_factory=dict)
+
+    @property
+    def size(self) -> int:
+        return sum(len(packed.payload) for packed in (self.dataset, self.index) if packed is not None)
+
+
+class RecentDatasets:
+    """
+    Разобранные архивы пользователей в памяти основного процесса, по одному на пользователя.
+
+    Датасет хранится упакованным (Packed), как его вернул воркер, поэтому
+    основному процессу по-прежнему не нужен pandas, а перерисовка не разбирает
+    архив заново. Записи живут не дольше ttl секунд с последнего обращения; если
+    суммарный размер больше max_bytes, удаляются те, к которым дольше всего не обращались.
+
+    Команды одного пользователя дополняют запись под его lock, чтобы одновременные
+    /window, /decay и /animate не разбирали архив дважды и не затирали изменения друг друга.
+
+    Args:
+        max_bytes: Максимальный суммарный размер датасетов
+        ttl: Сколько секунд хранить датасет с последнего обращения
+
+    Attributes:
+        size: Суммарный размер хранимых датасетов, байт
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries: OrderedDict[int, RecentDataset] = OrderedDict()
+        self._used_at: dict[int, float] = {}
+        # Блокировка живёт, пока её кто-то держит или ждёт
+        self._locks: weakref.WeakValueDictionary[int, asyncio.Lock] = weakref.WeakValueDictionary()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, user_id: int, entry: RecentDataset) -> None:
+        """Запоминает последний архив пользователя вместо предыдущего."""
+        self._remove(user_id)
+        if entry.size > self.max_bytes:
+            return
+        self._used_at[user_id] = time.monotonic()
+        self._entries[user_id] = entry
+        self.size += entry.size
+        self._evict()
+
+    def replace(self, user_id: int, entry: RecentDataset) -> None:
+        """
+        Кладёт дополненную запись, если у пользователя всё ещё тот же архив.
+
+        Если пока команда работала, пользователь прислал новый архив или запись
+        устарела, ничего не меняется: новый архив не затирается старым.
+        """
+        current = self._entries.get(user_id)
+        if current is not None and current.digest == entry.digest:
+            self.put(user_id, entry)
+
+    def get(self, user_id: int) -> RecentDataset | None:
+        """Последний архив пользователя или None, если его нет или он устарел."""
+        self._evict()
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._used_at[user_id] = time.monotonic()
+            self._entries.move_to_end(user_id)
+        return entry
+
+    def lock(self, user_id: int) -> asyncio.Lock:
+        """Блокировка записи пользователя: под ней команда берёт снимок записи и дополняет её."""
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    def _evict(self) -> None:
+        """Удаляет устаревшие записи и самые давние, пока размер больше max_bytes."""
+        deadline = time.monotonic() - self.ttl
+        while self._entries:
+            user_id = next(iter(self._entries))
+            if self._used_at[user_id] >= deadline and self.size <= self.max_bytes:
+                break
+            self._remove(user_id)
+
+    def _remove(self, user_id: int) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            del self._used_at[user_id]
+            self.size -= entry.size
@@ -0,0 +1,156 @@
+import asyncio
+import contextlib
+import importlib
+import logging
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import record_all, traced_call
+
+
+class RenderQueueFull(Exception):
+    """Все воркеры заняты, и очередь на отрисовку уже заполнена."""
+
+
+class Packed:
+    """
+    Результат задачи в упакованном виде.
+
+    Основной процесс передаёт его следующим задачам, не распаковывая, поэтому
+    ему не нужны pandas и классы данных из rozovetrovnitsa. Воркер распаковывает
+    Packed-аргументы перед вызовом функции.
+    """
+
+    def __init__(self, payload: bytes):
+        self.payload = payload
+
+
+def _resolve(func):
+    """Функция или её имя вида 'модуль:функция' — модуль импортируется в воркере."""
+    if isinstance(func, str):
+        module_name, _, name = func.partition(':')
+        return getattr(importlib.import_module(module_name), name)
+    return func
+
+
+def _call(func, args: tuple, pack_result: bool):
+    """Выполняется в воркере: распаковывает аргументы, вызывает функцию, упаковывает результат."""
+    args = [pickle.loads(arg.payload) if isinstance(arg, Packed) else arg for arg in args]
+    result = _resolve(func)(*args)
+    if pack_result:
+        result = Packed(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+    return result
+
+
+def _initialize_worker(warm_up) -> None:
+    """Выполняется при старте каждого воркера."""
+    if warm_up is None:
+        return
+    try:
+        _resolve(warm_up)()
+    except Exception as e:
+        # Без прогрева воркер всё равно рабочий, просто первый график будет медленнее
+        logging.warning("warm up %s: %s", warm_up, e)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+class RenderPool:
+    """
+    Пул процессов для разбора архивов и отрисовки графиков.
+
+    Тяжёлая работа (pandas, matplotlib) уходит в отдельные процессы, поэтому
+    цикл событий бота не останавливается и отвечает другим пользователям.
+    Число одновременно принятых запросов ограничено: workers обрабатываются,
+    ещё queue_size ждут в очереди, остальным сразу отказываем.
+
+    Функции задач можно передавать по имени ('модуль:функция'): тогда основной
+    процесс не импортирует их модуль. Модули из preload импортируются один раз
+    в процессе forkserver, и все воркеры получают их уже загруженными; warm_up
+    вызывается в каждом воркере при старте.
+
+    Args:
+        workers: Количество процессов-воркеров
+        queue_size: Сколько запросов может ждать свободного воркера
+        preload: Модули, которые импортируются в forkserver до запуска воркеров
+        warm_up: Функция или её имя для прогрева воркера
+    """
+
+    def __init__(self, workers: int, queue_size: int, preload: tuple[str, ...] = (), warm_up=None):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self._pending = 0
+        context = multiprocessing.get_context('forkserver')
+        if preload:
+            context.set_forkserver_preload(list(preload))
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_initialize_worker,
+            initargs=(warm_up,),
+        )
+
+    @property
+    def pending(self) -> int:
+        """Сколько запросов сейчас обрабатывается или ждёт в очереди."""
+        return self._pending
+
+    @contextlib.contextmanager
+    def admit(self, cost: int = 1):
+        """
+        Принимает запрос в пул на время блока with.
+
+        Пакет из нескольких архивов занимает cost мест: его стоимость определяет
+        разбор архивов, а не число сообщений. Если пул пуст, пакет принимается
+        целиком, даже если он больше очереди.
+
+        Yields:
+            int: Позиция в очереди (0 — воркер свободен и очереди нет)
+
+        Raises:
+            RenderQueueFull: Если очередь заполнена
+        """
+        if self._pending and self._pending + cost > self.workers + self.queue_size:
+            raise RenderQueueFull()
+        position = max(0, self._pending - self.workers + 1)
+        self._pending += cost
+        try:
+            yield position
+        finally:
+            self._pending -= cost
+
+    async def run(self, func, *args, pack_result: bool = False):
+        """
+        Выполняет func(*args) в процессе-воркере и возвращает результат.
+
+        Замеры этапов из воркера (metrics.timed) добавляются к текущему запросу.
+
+        Args:
+            func: Функция или её имя 'модуль:функция'
+            pack_result: Вернуть результат как Packed, не распаковывая в основном процессе
+        """
+        loop = asyncio.get_running_loop()
+        result, error, trace = await loop.run_in_executor(
+            self._executor, traced_call, _call, func, args, pack_result
+        )
+        record_all(trace)
+        if error is not None:
+            raise error
+        return result
+
+    async def start(self) -> None:
+        """Запускает все воркеры сразу (с прогревом), а не по первому запросу."""
+        await asyncio.gather(*(self.run(_ping) for _ in range(self.workers)))
+
+    def shutdown(self) -> None:
+        """Дожидается текущих задач и останавливает воркеры."""
+        self._executor.shutdown(wait=True)
+
+
+def default_workers() -> int:
+    """Количество воркеров по умолчанию — по числу ядер."""
+    return os.cpu_count() or 1
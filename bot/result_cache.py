@@ -0,0 +1,144 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+
+# Меняется, когда меняется внешний вид графиков, чтобы не отдавать старые картинки
+CACHE_VERSION = 4
+
+VERDICT_FILE_NAME = 'verdict.txt'
+
+
+def evict_lru(directory: str, max_bytes: int) -> None:
+    """
+    Удаляет самые давние записи папки, пока она не влезет в max_bytes.
+
+    Запись — файл или папка первого уровня; давность — по времени изменения.
+    Временные записи (с точкой в начале имени) не трогаются. Вытеснение идёт
+    одновременно в нескольких воркерах, поэтому записи, которые удалил другой
+    воркер, пропускаются.
+    """
+    entries = []
+    total = 0
+    for entry in os.scandir(directory):
+        if entry.name.startswith('.'):
+            continue
+        with contextlib.suppress(FileNotFoundError):
+            is_dir = entry.is_dir()
+            if is_dir:
+                size = sum(_size(f) for f in os.scandir(entry.path))
+            else:
+                size = entry.stat().st_size
+            entries.append((entry.stat().st_mtime, size, entry.path, is_dir))
+            total += size
+    for _, size, path, is_dir in sorted(entries):
+        if total <= max_bytes:
+            break
+        # Вид записи запомнен при обходе: к этому моменту другой воркер мог её удалить или создать заново
+        if is_dir:
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+        total -= size
+
+
+def _size(entry: os.DirEntry) -> int:
+    """Размер файла или 0, если его уже удалил другой воркер."""
+    try:
+        return entry.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def archive_digest(source: bytes | str) -> str:
+    """Считает sha256 распакованного архива: содержимого .xls или файла по пути."""
+    if isinstance(source, bytes):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    with open(source, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class CachedResult:
+    """Готовые картинки и вердикт для одного архива."""
+    images: dict[str, str]
+    verdict: str
+
+
+class ResultCache:
+    """
+    Дисковый кэш готовых графиков, адресуемый по содержимому архива.
+
+    Ключ — хэш распакованного архива и настроек графиков, поэтому один и тот же
+    экспорт rp5 от разных пользователей рисуется один раз. При превышении
+    max_bytes удаляются записи, к которым дольше всего не обращались.
+
+    Args:
+        directory: Папка кэша
+        max_bytes: Максимальный суммарный размер кэша
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(digest: str, settings: dict) -> str:
+        """Собирает ключ из хэша архива и настроек графиков."""
+        payload = json.dumps([CACHE_VERSION, digest, settings], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> CachedResult | None:
+        """Возвращает готовый результат или None, если его нет в кэше."""
+        entry_dir = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(entry_dir, VERDICT_FILE_NAME), encoding='utf-8') as f:
+                verdict = f.read()
+            images = {
+                os.path.splitext(name)[0]: os.path.join(entry_dir, name)
+                for name in os.listdir(entry_dir)
+                if name.endswith('.jpg')
+            }
+            # Время изменения папки — время последнего обращения для LRU
+            os.utime(entry_dir)
+        except OSError:
+            self.misses += 1
+            logging.info("result cache miss %s (hits=%d, misses=%d)", key[:12], self.hits, self.misses)
+            return None
+        self.hits += 1
+        logging.info("result cache hit %s (hits=%d, misses=%d)", key[:12], self.hits, self.misses)
+        return CachedResult(images, verdict)
+
+    def put(self, key: str, images: dict[str, str], verdict: str) -> None:
+        """Сохраняет картинки и вердикт и при необходимости вытесняет старые записи."""
+        entry_dir = os.path.join(self.directory, key)
+        if os.path.exists(entry_dir):
+            return
+        # Пишем во временную папку и переименовываем, чтобы get не увидел половину записи
+        temp_dir = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+        try:
+            for name, image_path in images.items():
+                shutil.copyfile(image_path, os.path.join(temp_dir, f'{name}.jpg'))
+            with open(os.path.join(temp_dir, VERDICT_FILE_NAME), 'w', encoding='utf-8') as f:
+                f.write(verdict)
+            os.rename(temp_dir, entry_dir)
+        except OSError as e:
+            logging.warning("result cache put %s: %s", key[:12], e)
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            return
+        self.evict()
+
+    def evict(self) -> None:
+        """Удаляет самые давние записи, пока кэш не влезет в max_bytes."""
+        evict_lru(self.directory, self.max_bytes)
@@ -1,15 +1,28 @@
-
-
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+import xlrd
+from matplotlib import colormaps
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PolyCollection
+from matplotlib.dates import date2num
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter, MaxNLocator
+from PIL import Image
 import datetime as dt
-import gzip
-import shutil
+import logging
+import math
 import os
+import re
+import shutil
+import subprocess
 import tempfile
+from dataclasses import dataclass
+from functools import cached_property
 from pathlib import Path
 
+
+from metrics import timed
+
 # Константы
 WIND_DIRECTIONS = ['С', 'ССВ', 'СВ', 'ВСВ', 'В', 'ВЮВ', 'ЮВ', 'ЮЮВ', 'Ю', 'ЮЮЗ', 'ЮЗ', 'ЗЮЗ', 'З', 'ЗСЗ', 'СЗ', 'ССЗ']
 
@@ -34,6 +47,15 @@ WIND_NAME_MAPPING = {
     'Ветер, дующий с северо-северо-запада': 'ССЗ'
 }
 
+# Коды направлений: 0-15 — WIND_DIRECTIONS по порядку, затем штиль и переменный ветер, -1 — неизвестно
+WIND_DIRECTION_DTYPE = pd.CategoricalDtype(WIND_DIRECTIONS + ['Х', 'ХХ'])
+CALM_CODE = WIND_DIRECTION_DTYPE.categories.get_loc('Х')
+VARIABLE_CODE = WIND_DIRECTION_DTYPE.categories.get_loc('ХХ')
+_DIRECTION_CODES = {
+    **{name: code for code, name in enumerate(WIND_DIRECTION_DTYPE.categories)},
+    **{name: WIND_DIRECTION_DTYPE.categories.get_loc(short) for name, short in WIND_NAME_MAPPING.items()},
+}
+
 CUSTOM_COLORS = [
     "#4B0082",  # Темно-синий (индиго)
     "#0000FF",  # Ярко-синий
@@ -44,160 +66,642 @@ CUSTOM_COLORS = [
     "#D3D3D3",  # Светло-серый
 ]
 
+# Колонки архива rp5, которые используют графики и вердикт
+OBSERVATION_COLUMNS = ['time', 'DD', 'Ff', 'T', 'U', 'W1', 'RRR', 'tR', 'sss']
+NUMERIC_COLUMNS = ['Ff', 'T', 'U', 'RRR', 'tR', 'sss']
+
+# Формат времени в архиве rp5 и сколько строк преамбулы просматривать в поисках заголовков
+RP5_TIME_FORMAT = '%d.%m.%Y %H:%M'
+RP5_HEADER_SEARCH_ROWS = 20
+
+# Станция из преамбулы rp5: «Архив погоды на метеостанции Москва (ВДНХ), WMO_ID=27612, ...»
+# или, если преамбулы нет, из заголовка времени «Местное время в Москве (ВДНХ)»
+RP5_STATION_PATTERN = re.compile(r'(?:на метеостанции|в аэропорту)\s+(?P<name>.+?),\s*(?:WMO_ID=(?P<wmo_id>\d+))?')
+RP5_TIME_HEADER_PREFIX = 'Местное время в '
+# С этого начинается заголовок первой колонки любого архива rp5
+RP5_TIME_COLUMN = 'Местное время'
+
 # Настройки визуализации
 IMPORTANCE_DECAY_RATE = -0.22
+HOUR_NS = 3_600_000_000_000
 TEMP_COLOR_MIN = -10
 TEMP_COLOR_MAX = 30
 DATE_TICKS_MAX = 10
 POLAR_FIGURE_SIZE = (6, 6)
+STATION_GRID_COLUMNS = 3
+STATION_GRID_CELL_SIZE = (4, 4.4)
 REGULAR_FIGURE_SIZE = (10, 6)
+BAR_WIDTH = 0.8  # ширина столбца осадков, сутки
+# Больше точек температуры — вместо каждого наблюдения средние и полоса мин–макс по интервалам
+# из целых суток, не больше TEMPERATURE_MAX_BINS интервалов: время отрисовки не растёт с длиной архива
+TEMPERATURE_DENSE_POINTS = 3000
+TEMPERATURE_MAX_BINS = 200
+ANIMATION_FIGURE_SIZE = (4.4, 4.8)
+ANIMATION_DPI = 80
+ANIMATION_SPAN_HOURS = 24  # кадр анимации — розы за последние сутки до его конца
+ANIMATION_FPS = 4
+
+# Границы классов скорости розы скоростей по умолчанию, м/с: 2,5,8 — классы 0–2, 2–5, 5–8 и ≥8.
+# Бот передаёт свои (SPEED_CLASSES в main.py)
+SPEED_CLASSES = (2.0, 5.0, 8.0, 11.0, 15.0)
+SPEED_CMAP = 'viridis'
 
 # Копирайт
 COPYRIGHT_TEXT = '© 2025 Busheisha'
 
 
-def validate_meteo_file(file_path: str) -> tuple[bool, str]:
+def chart_settings() -> dict:
+    """Настройки, от которых зависит результат: входят в ключ кэша готовых графиков."""
+    return {
+        'importance_decay_rate': IMPORTANCE_DECAY_RATE,
+        'temp_color_min': TEMP_COLOR_MIN,
+        'temp_color_max': TEMP_COLOR_MAX,
+        'date_ticks_max': DATE_TICKS_MAX,
+        'temperature_dense_points': TEMPERATURE_DENSE_POINTS,
+        'temperature_max_bins': TEMPERATURE_MAX_BINS,
+        'copyright': COPYRIGHT_TEXT,
+    }
+
+
+def _find_header_row(sheet) -> int:
+    """Ищет строку заголовков rp5 (в ней есть колонка 'T') под преамбулой."""
+    for row_index in range(min(sheet.nrows, RP5_HEADER_SEARCH_ROWS)):
+        if 'T' in sheet.row_values(row_index):
+            return row_index
+    raise ValueError("не найдена строка заголовков архива rp5")
+
+
+def _read_station(sheet, header_row: int) -> dict:
     """
-    Валидирует файл метеоданных на безопасность.
-    
-    Args:
-        file_path: Путь к файлу .xls.gz
-        
+    Название и WMO_ID станции из преамбулы архива.
+
     Returns:
-        tuple: (is_valid, message) - валидность и сообщение
+        dict: {'name': str | None, 'wmo_id': int | None}
     """
+    for row_index in range(header_row):
+        match = RP5_STATION_PATTERN.search(str(sheet.cell_value(row_index, 0)))
+        if match:
+            wmo_id = match.group('wmo_id')
+            return {'name': match.group('name').strip(), 'wmo_id': int(wmo_id) if wmo_id else None}
+    time_header = str(sheet.cell_value(header_row, 0))
+    if time_header.startswith(RP5_TIME_HEADER_PREFIX):
+        return {'name': time_header[len(RP5_TIME_HEADER_PREFIX):].strip(), 'wmo_id': None}
+    return {'name': None, 'wmo_id': None}
+
+
+def _read_time_column(sheet, column_index: int, start_row: int, datemode: int) -> pd.Series:
+    """Читает колонку времени: текст в формате rp5 или даты Excel."""
+    values = sheet.col_values(column_index, start_rowx=start_row)
+    types = sheet.col_types(column_index, start_rowx=start_row)
+    if xlrd.XL_CELL_DATE in types:
+        values = [
+            xlrd.xldate_as_datetime(value, datemode) if cell_type == xlrd.XL_CELL_DATE else value
+            for value, cell_type in zip(values, types)
+        ]
+        return pd.to_datetime(pd.Series(values, dtype=object), errors='coerce', format='mixed', dayfirst=True)
+    return pd.to_datetime(pd.Series(values, dtype=object), errors='coerce', format=RP5_TIME_FORMAT)
+
+
+@timed('read_rp5')
+def read_rp5(source: str | bytes) -> pd.DataFrame:
+    """
+    Читает Excel файл rp5 сразу в типизированную таблицу.
     
-    # 1. Проверка расширения
-    if not file_path.endswith('.xls.gz'):
-        return False, "❌ Мы принимаем только файлы .xls.gz"
-    
-    # 2. Проверка что файл существует
-    if not os.path.exists(file_path):
-        return False, "❌ Файл не найден"
-    
-    # 3. Проверка что это gzip архив
-    try:
-        with gzip.open(file_path, 'rb') as f:
-            f.read(1024)  # Читаем первые 1024 байта
-    except gzip.BadGzipFile:
-        return False, "❌ Файл повреждён или не является gzip архивом"
-    except Exception as e:
-        return False, f"❌ Ошибка при чтении архива: {str(e)}"
+    source — путь к .xls или его содержимое в памяти.
     
-    # 4. Проверка что внутри Excel файл
-    temp_dir = None
+    Находит строку заголовков под преамбулой и читает только колонки
+    OBSERVATION_COLUMNS (первая колонка — время, её заголовок начинается с RP5_TIME_COLUMN). Время разбирается в формате
+    RP5_TIME_FORMAT, числовые колонки становятся float (текст вроде «Осадков нет»
+    превращается в NaN), направление ветра кодируется категориями WIND_DIRECTION_DTYPE,
+    погода остаётся строкой.
+    Отсутствующие в архиве колонки пропускаются: ошибка всплывёт у того графика, которому они нужны.
+    Станция из преамбулы (см. _read_station) сохраняется в df.attrs['station'] —
+    attrs переживают pickle и кэш Arrow.
+    """
+    if isinstance(source, bytes):
+        book = xlrd.open_workbook(file_contents=source, on_demand=True)
+    else:
+        book = xlrd.open_workbook(source, on_demand=True)
     try:
-        # Создаём временный файл для распаковки
-        temp_dir = tempfile.mkdtemp()
-        temp_xls_path = os.path.join(temp_dir, 'temp.xls')
-        
-        # Распаковываем
-        with gzip.open(file_path, 'rb') as f_in:
-            with open(temp_xls_path, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
-        
-        # Пытаемся прочитать как Excel
-        df = pd.read_excel(temp_xls_path, nrows=1)
-        
-        return True, "✅ Файл прошёл валидацию"
-        
-    except Exception as e:
-        return False, f"❌ Внутри архива должен быть Excel файл: {str(e)}"
-    
+        sheet = book.sheet_by_index(0)
+        header_row = _find_header_row(sheet)
+        header = sheet.row_values(header_row)
+        if not str(header[0]).startswith(RP5_TIME_COLUMN):
+            raise ValueError(f"это не архив погоды rp5: нет колонки «{RP5_TIME_COLUMN}»")
+        start_row = header_row + 1
+
+        df = pd.DataFrame({'time': _read_time_column(sheet, 0, start_row, book.datemode)})
+        for column in OBSERVATION_COLUMNS[1:]:
+            if column not in header:
+                continue
+            values = sheet.col_values(header.index(column), start_rowx=start_row)
+            if column in NUMERIC_COLUMNS:
+                df[column] = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').astype('float64')
+            else:
+                # Пустые ячейки xlrd отдаёт как '' — превращаем их в пропуски
+                df[column] = pd.Series(values, dtype='str').replace('', np.nan)
+        if 'DD' in df.columns:
+            df['DD'] = encode_directions(df['DD'])
+        df.attrs['station'] = _read_station(sheet, header_row)
     finally:
-        # Очищаем временные файлы
-        if temp_dir and os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
+        book.release_resources()
+    return df
 
 
-def extract_gzip_file(file_path: str) -> str:
-    """Распаковывает .gz файл и возвращает путь к распакованному файлу."""
-    output_path = file_path.replace(".xls.gz", ".xls")
-    with gzip.open(file_path, 'rb') as file_in:
-        with open(output_path, 'wb') as file_out:
-            shutil.copyfileobj(file_in, file_out)
-    return output_path
+def encode_directions(values: pd.Series) -> pd.Series:
+    """
+    Переводит направления ветра rp5 (полные названия или сокращения) в категории WIND_DIRECTION_DTYPE.
+    
+    Неизвестные значения и пропуски получают код -1.
+    """
+    if values.dtype == WIND_DIRECTION_DTYPE:
+        return values
+    codes = values.map(_DIRECTION_CODES).fillna(-1).to_numpy(dtype='int8')
+    return pd.Series(
+        pd.Categorical.from_codes(codes, dtype=WIND_DIRECTION_DTYPE), index=values.index, name=values.name
+    )
+
+
+def wind_codes(df: pd.DataFrame) -> np.ndarray:
+    """Коды направлений ветра (int8): 0-15 — WIND_DIRECTIONS, CALM_CODE, VARIABLE_CODE или -1."""
+    return encode_directions(df['DD']).cat.codes.to_numpy()
+
+
+@timed('drop_calm')
+def drop_calm(df: pd.DataFrame) -> pd.DataFrame:
+    """Убирает штиль и переменный ветер."""
+    codes = wind_codes(df)
+    df = df.loc[(codes != CALM_CODE) & (codes != VARIABLE_CODE)]
+    return df.assign(DD=encode_directions(df['DD']))
 
 
 def clean_data(file_path: str) -> pd.DataFrame:
     """Очищает и подготавливает данные из Excel файла."""
-    df = pd.read_excel(file_path)
-    df.columns = df.iloc[5]
-    df = df.drop(range(6))
-    
-    column_rename_map = {df.columns[0]: 'time'}
-    df = df.rename(columns=column_rename_map)
-    
-    df['DD'] = df['DD'].replace(WIND_NAME_MAPPING)
-    df = df.loc[~df['DD'].isin(['Х', 'ХХ'])]
-    
-    return df
+    return drop_calm(read_rp5(file_path))
+
+
+# Веса умной розы в префиксных суммах TimeIndex считаются от начала блока; блок
+# короче SMART_BLOCK_EXPONENT / |decay_rate| суток, чтобы exp не выходил за пределы float64
+SMART_BLOCK_EXPONENT = 300.0
+# Блоки старше этого (в единицах |decay_rate| * сутки) от свежего наблюдения ничего не добавляют
+SMART_HORIZON_EXPONENT = 750.0
+
+
+class TimeIndex:
+    """
+    Префиксные суммы по времени: роза и ADD за любое окно без прохода по наблюдениям.
+
+    Строится один раз на разобранный архив. Окно находится двоичным поиском по
+    отсортированному времени (O(log n)), а роза за окно — разность двух строк
+    накопленных сумм по 16 направлениям (O(16)). Годится и для скользящих окон
+    анимации: каждый кадр — ещё один запрос.
+
+    Наблюдения без времени в индекс не входят, поэтому запросы отвечают за окна
+    по времени, а не за весь архив с такими строками.
+
+    Args:
+        data: Наблюдения без штиля и переменного ветра (MeteoDataset.data) — для роз
+        observations: Все наблюдения (MeteoDataset.observations) — для ADD
+    """
+
+    def __init__(self, data: pd.DataFrame, observations: pd.DataFrame):
+        times = data['time'].to_numpy(dtype='datetime64[ns]')
+        has_time = ~np.isnat(times)
+        order = np.argsort(times[has_time], kind='stable')
+        self.times = times[has_time][order]
+        codes = wind_codes(data)[has_time][order].astype(np.int64)
+        speeds = data['Ff'].to_numpy(dtype='float64')[has_time][order]
+        n_winds = len(WIND_DIRECTIONS)
+        self._direction = (codes >= 0) & (codes < n_winds)
+        self._codes = np.where(self._direction, codes, 0)
+        self._speeds = np.where(self._direction & ~np.isnan(speeds), speeds, 0.0)
+        # Давность умной розы — в целых часах; без округлений раскладывается, только если время кратно часу
+        self._whole_hours = not (self.times.view(np.int64) % HOUR_NS).any()
+        self._hours = self.times.view(np.int64) // HOUR_NS
+
+        # counts[i] — наблюдения по направлениям среди первых i строк
+        one_hot = np.zeros((len(self.times) + 1, n_winds), dtype=np.int32)
+        one_hot[np.flatnonzero(self._direction) + 1, self._codes[self._direction]] = 1
+        self._counts = np.cumsum(one_hot, axis=0, dtype=np.int32)
+        self._smart = {}
+
+        # degree_days[i] — сумма положительных суточных средних за первые i дней
+        observation_times = observations['time'].to_numpy(dtype='datetime64[ns]')
+        temperature = observations['T'].to_numpy(dtype='float64')
+        valid = ~np.isnat(observation_times) & ~np.isnan(temperature)
+        self.days, day_index = np.unique(observation_times[valid].astype('datetime64[D]'), return_inverse=True)
+        means = (np.bincount(day_index, weights=temperature[valid], minlength=len(self.days))
+                 / np.maximum(np.bincount(day_index, minlength=len(self.days)), 1))
+        self._degree_days = np.concatenate([[0.0], np.cumsum(np.clip(means, 0, None))])
+
+    def rows(self, start: np.datetime64, end: np.datetime64) -> tuple[int, int]:
+        """Строки индекса с временем в [start, end)."""
+        return (int(np.searchsorted(self.times, np.datetime64(start, 'ns'))),
+                int(np.searchsorted(self.times, np.datetime64(end, 'ns'))))
+
+    def rose(self, lo: int, hi: int) -> np.ndarray:
+        """
+        Наблюдения по 16 направлениям в строках [lo, hi) — как processing.
+
+        lo и hi могут быть массивами: тогда результат — по строке на каждое окно.
+        """
+        return (self._counts[hi] - self._counts[lo]).astype(np.int64)
+
+    def _smart_sums(self, decay_rate: float):
+        """
+        Накопленные веса умной розы для decay_rate: начала блоков, их опорные часы и суммы.
+
+        Вес строки — скорость * exp(-(час - опорный час блока) / 24 * decay_rate), сумма
+        накапливается заново в каждом блоке, чтобы разность сумм не теряла точность.
+        """
+        if decay_rate not in self._smart:
+            hours = self._hours
+            span = SMART_BLOCK_EXPONENT * 24 / abs(decay_rate) if decay_rate else np.inf
+            block = ((hours - hours[0]) // span).astype(np.int64) if len(hours) else hours
+            starts = np.flatnonzero(np.r_[True, block[1:] != block[:-1]]) if len(hours) else np.array([0])
+            reference = hours[starts] if len(hours) else np.array([0])
+            row_reference = np.repeat(reference, np.diff(np.r_[starts, len(hours)]))
+            weights = np.zeros((len(hours), len(WIND_DIRECTIONS)))
+            weights[np.arange(len(hours)), self._codes] = (
+                self._speeds * np.exp(-(hours - row_reference) / 24 * decay_rate)
+            )
+            # Накопление с начала блока: общая сумма смешала бы веса до e^300 и около 1
+            for begin, end in zip(starts, np.r_[starts[1:], len(hours)]):
+                np.cumsum(weights[begin:end], axis=0, out=weights[begin:end])
+            self._smart[decay_rate] = (starts, reference, weights)
+        return self._smart[decay_rate]
+
+    def smart_rose(self, lo: int, hi: int, decay_rate: float) -> np.ndarray | None:
+        """
+        Важность ветра по 16 направлениям в строках [lo, hi) — как smartrose_processing,
+        давность отсчитывается от последнего наблюдения окна.
+
+        Returns:
+            None, если время не кратно часу и давность в целых часах не раскладывается по блокам
+        """
+        if not self._whole_hours:
+            return None
+        if hi <= lo:
+            return np.zeros(len(WIND_DIRECTIONS))
+        starts, reference, sums = self._smart_sums(decay_rate)
+        latest = self._hours[hi - 1]
+        first_block = np.searchsorted(starts, lo, side='right') - 1
+        last_block = np.searchsorted(starts, hi - 1, side='right') - 1
+        if decay_rate:
+            # Блоки, целиком старше горизонта, умножаются на exp меньше наименьшего float64
+            horizon = latest - SMART_HORIZON_EXPONENT * 24 / abs(decay_rate)
+            first_block = max(first_block, np.searchsorted(reference, horizon, side='right') - 2)
+        result = np.zeros(len(WIND_DIRECTIONS))
+        for block in range(max(first_block, 0), last_block + 1):
+            begin = max(lo, starts[block])
+            end = min(hi, starts[block + 1] if block + 1 < len(starts) else len(self.times))
+            total = sums[end - 1] - (sums[begin - 1] if begin > starts[block] else 0.0)
+            result += total * np.exp((latest - reference[block]) / 24 * decay_rate)
+        return result
 
+    def add(self, first_day: np.datetime64, last_day: np.datetime64) -> int:
+        """ADD за дни с first_day по last_day включительно — как ADD по наблюдениям этих дней."""
+        lo = np.searchsorted(self.days, np.datetime64(first_day, 'D'))
+        hi = np.searchsorted(self.days, np.datetime64(last_day, 'D'), side='right')
+        return int(self._degree_days[hi] - self._degree_days[lo])
 
-def create_zero_filled_dataframe(winds: list[str], column_name: str = 'DD') -> pd.DataFrame:
-    """Создает DataFrame с нулевыми значениями для всех направлений ветра."""
-    return pd.Series(data=0, index=winds).to_frame(name=column_name)
+
+@dataclass
+class WindowSums:
+    """
+    Розы и ADD окна reframe_dataset — ответы TimeIndex всего архива.
+
+    Считаются в задаче reframe_dataset, поэтому задачам графиков передаются
+    эти 33 числа, а не индекс всего архива.
+
+    Attributes:
+        rose: Наблюдения по 16 направлениям — как processing
+        smart_rose: Важность ветра по 16 направлениям — как smartrose_processing,
+            или None, если индекс её не раскладывает (см. TimeIndex.smart_rose)
+        add: ADD за дни окна
+    """
+    rose: np.ndarray
+    smart_rose: np.ndarray | None
+    add: int
 
 
-def reindex_with_all_directions(data: pd.Series, winds: list[str]) -> pd.DataFrame:
-    """Переиндексирует данные, чтобы включить все направления ветра."""
-    zero_filled = create_zero_filled_dataframe(winds, data.name)
+@dataclass
+class MeteoDataset:
+    """
+    Архив погоды, разобранный один раз на загрузку.
     
-    result = pd.concat([data, zero_filled]).reset_index()
-    result = result.drop_duplicates(subset=['index'])
-    result = result.set_index('index')
-    result = result.reindex(index=winds)
-    result = result.reset_index()
+    Все графики и вердикт читают данные отсюда, а не распаковывают архив заново.
     
-    return result
+    Attributes:
+        observations: Все наблюдения архива, колонки OBSERVATION_COLUMNS (нужны для ADD)
+        daily: Суточные суммы из истории станции ровно за дни архива (см. merge_station_history)
+            или None — тогда розы, ADD и осадки считаются по наблюдениям
+        decay_rate: Коэффициент давности умной розы (см. reframe_dataset)
+        window_sums: Розы и ADD окна, посчитанные по индексу всего архива, или None
+    """
+    observations: pd.DataFrame
+    daily: pd.DataFrame | None = None
+    decay_rate: float = IMPORTANCE_DECAY_RATE
+    window_sums: WindowSums | None = None
 
+    @cached_property
+    def data(self) -> pd.DataFrame:
+        """Наблюдения без штиля и переменного ветра — то же, что возвращает clean_data."""
+        return drop_calm(self.observations)
 
-def processing(df: pd.DataFrame, winds: list[str]) -> pd.DataFrame:
-    """Обрабатывает данные для простой розы ветров."""
-    wind_counts = df.groupby(['DD']).size().to_frame(name='DD')
-    return reindex_with_all_directions(wind_counts['DD'], winds)
+    @property
+    def station(self) -> dict:
+        """Станция архива: {'name': str | None, 'wmo_id': int | None}."""
+        return self.observations.attrs.get('station') or {'name': None, 'wmo_id': None}
+
+    @cached_property
+    def time_index(self) -> TimeIndex:
+        """Префиксные суммы по этому архиву; строятся при первом обращении."""
+        with timed('time_index'):
+            return TimeIndex(self.data, self.observations)
 
 
-def smartrose_processing(df: pd.DataFrame, winds: list[str]) -> pd.DataFrame:
-    """Обрабатывает данные для умной розы ветров с учетом временного веса."""
-    rose = df.copy()
-    rose['time'] = pd.to_datetime(rose['time'], dayfirst=True)
+def load_meteo_dataset(source: bytes | str, columnar_cache=None, digest: str | None = None,
+                       history=None) -> MeteoDataset:
+    """
+    Разбирает распакованный архив один раз.
     
-    reftime = rose.iloc[0, 0]
-    rose['reftime'] = reftime
-    rose['age'] = rose['reftime'] - rose['time']
-    rose['age'] = (rose['age'].dt.components.hours + (rose['age'].dt.components.days * 24)) / 24
-    rose['importance'] = np.exp(rose['age'] * IMPORTANCE_DECAY_RATE)
-    rose['importance_wind'] = rose['Ff'] * rose['importance']
+    Args:
+        source: Содержимое .xls (см. unpack_archive) или путь к нему
+        columnar_cache: Кэш разобранных архивов (ColumnarCache) или None
+        digest: Хэш распакованного архива — ключ в columnar_cache
+        history: История станций (StationHistory) или None
+        
+    Raises:
+        ValueError: Если внутри архива не Excel файл
+    """
+    observations = None
+    use_cache = columnar_cache is not None and digest is not None
+    if use_cache:
+        with timed('columnar_load'):
+            observations = columnar_cache.load(digest)
+
+    if observations is None:
+        try:
+            observations = read_rp5(source)
+        except Exception as e:
+            raise ValueError(f"❌ Внутри архива должен быть Excel файл: {str(e)}") from e
+        if use_cache:
+            with timed('columnar_store'):
+                columnar_cache.store(digest, observations)
+
+    dataset = MeteoDataset(observations)
+    if history is not None:
+        try:
+            dataset.daily = merge_station_history(history, dataset)
+        except Exception as e:
+            # История — необязательное дополнение: без неё графики считаются по строкам архива
+            logging.warning("station history merge: %s", e)
+    return dataset
+
+
+def build_time_index(dataset: MeteoDataset) -> TimeIndex:
+    """
+    Индекс архива для задачи пула: строится один раз на архив и хранится рядом
+    с ним (RecentDataset.index), а окна /window и кадры /animate — запросы к нему.
+    """
+    return dataset.time_index
+
+
+def reframe_dataset(dataset: MeteoDataset, window: tuple[dt.date, dt.date] | None = None,
+                    decay_rate: float | None = None, index: TimeIndex | None = None) -> MeteoDataset:
+    """
+    Тот же архив за другие даты или с другим коэффициентом давности — для перерисовки без разбора.
+
+    Args:
+        dataset: Разобранный архив
+        window: (первый день, последний день) включительно или None — весь архив
+        decay_rate: Коэффициент давности умной розы или None — IMPORTANCE_DECAY_RATE
+        index: Индекс dataset (см. build_time_index) или None — построить заново
+
+    Raises:
+        ValueError: Если за эти дни в архиве нет наблюдений
+    """
+    observations, daily = dataset.observations, dataset.daily
+    decay_rate = IMPORTANCE_DECAY_RATE if decay_rate is None else decay_rate
+    if window is None:
+        return MeteoDataset(observations, daily, decay_rate)
+    first_day, last_day = (pd.Timestamp(day) for day in window)
+    end = last_day + pd.Timedelta(days=1)
+    times = observations['time']
+    observations = observations[(times >= first_day) & (times < end)]
+    if not len(observations):
+        raise ValueError(f"❌ В архиве нет наблюдений с {first_day:%d.%m.%Y} по {last_day:%d.%m.%Y}")
+    if daily is not None:
+        # Суммы за целые дни архива остаются точными и для части этих дней
+        daily = daily.loc[first_day:last_day]
+    # Розы и ADD окна — запросы к индексу всего архива, а не проход по строкам окна
+    index = index or dataset.time_index
+    lo, hi = index.rows(first_day.to_datetime64(), end.to_datetime64())
+    window_sums = WindowSums(
+        index.rose(lo, hi), index.smart_rose(lo, hi, decay_rate),
+        index.add(first_day.to_datetime64(), last_day.to_datetime64()),
+    )
+    return MeteoDataset(observations, daily, decay_rate, window_sums)
+
+
+# Суточные суммы истории станции: всё, что можно складывать при дописывании новых строк.
+# rows — строк за сутки; t_sum/t_count — для средней температуры (ADD, по всем наблюдениям);
+# rrr_sum/tr_sum — осадки и периоды их накопления; w0..w15 — скорость ветра по направлениям
+# с весом давности, отсчитанной от начала суток (для умной розы).
+# Осадки и ветер — без штиля и переменного ветра, как в графиках
+DAILY_WEIGHT_COLUMNS = [f'w{code}' for code in range(len(WIND_DIRECTIONS))]
+DAILY_COLUMNS = ['rows', 't_sum', 't_count', 'rrr_sum', 'tr_sum'] + DAILY_WEIGHT_COLUMNS
+
+
+def daily_aggregates(observations: pd.DataFrame, decay_rate: float = IMPORTANCE_DECAY_RATE) -> pd.DataFrame:
+    """
+    Суточные суммы DAILY_COLUMNS по наблюдениям (строки без времени пропускаются).
+
+    Вес давности в w0..w15 отсчитывается от начала суток, поэтому суммы за
+    прошлые дни не меняются, когда приходят новые наблюдения: для розы на момент
+    t0 сутки d домножаются на exp((t0 - d) в целых часах / 24 * decay_rate).
+
+    Returns:
+        DataFrame с индексом day (начало суток) и decay_rate в attrs
+    """
+    times = observations['time'].to_numpy(dtype='datetime64[ns]')
+    has_time = ~np.isnat(times)
+    days, day_index = np.unique(times[has_time].astype('datetime64[D]'), return_inverse=True)
+    hours_into_day = (times[has_time] - days[day_index]).view(np.int64) // HOUR_NS
+    n_days = len(days)
+    n_winds = len(WIND_DIRECTIONS)
+
+    def column(name: str) -> np.ndarray:
+        if name not in observations.columns:
+            return np.full(has_time.sum(), np.nan)
+        return observations[name].to_numpy(dtype='float64')[has_time]
+
+    temperature = column('T')
+    has_temperature = ~np.isnan(temperature)
+    codes = wind_codes(observations)[has_time] if 'DD' in observations.columns else np.full(has_time.sum(), -1)
+    windy = (codes != CALM_CODE) & (codes != VARIABLE_CODE)
+    speeds = column('Ff')
+    weighted = windy & (codes >= 0) & (codes < n_winds) & ~np.isnan(speeds)
+    rain = np.nan_to_num(column('RRR'))
+    rain_period = column('tR')
+    has_period = windy & ~np.isnan(rain_period)
+
+    def per_day(mask: np.ndarray, weights=None) -> np.ndarray:
+        return np.bincount(day_index[mask], weights=None if weights is None else weights[mask], minlength=n_days)
+
+    def per_day_direction(mask: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        flat = day_index[mask] * n_winds + codes[mask]
+        return np.bincount(flat, weights=weights[mask], minlength=n_days * n_winds).reshape(n_days, n_winds)
+
+    # Одна матрица вместо 21 отдельной колонки: DataFrame собирается одним блоком
+    values = np.column_stack([
+        per_day(np.ones_like(has_temperature)),
+        per_day(has_temperature, temperature),
+        per_day(has_temperature),
+        per_day(windy, rain),
+        per_day(has_period, rain_period),
+        per_day_direction(weighted, speeds * np.exp(-hours_into_day / 24 * decay_rate)),
+    ]).astype('float64')
+    daily = pd.DataFrame(values, columns=DAILY_COLUMNS,
+                         index=pd.DatetimeIndex(days.astype('datetime64[ns]'), name='day'))
+    daily.attrs['decay_rate'] = decay_rate
+    return daily
+
+
+def _daily_window(daily: pd.DataFrame, observations: pd.DataFrame) -> pd.DataFrame | None:
+    """
+    Суточные суммы истории ровно за дни архива или None, если по ним не получится тот же результат.
+
+    Суммы годятся, только если за дни архива в истории нет других строк
+    (сверяется число строк в суммах за эти дни), у всех строк архива есть время,
+    время не повторяется и кратно часу — тогда давность в целых часах
+    раскладывается на сутки без округлений.
+    """
+    times = observations['time'].to_numpy(dtype='datetime64[ns]')
+    if not len(times) or np.isnat(times).any() or (times.view(np.int64) % HOUR_NS).any():
+        return None
+    window = daily.loc[pd.Timestamp(times.min()).normalize():pd.Timestamp(times.max()).normalize()]
+    if window['rows'].sum() != len(times) or len(np.unique(times)) != len(times):
+        return None
+    return window
+
+
+# По этим колонкам повторы сверяются с историей: если значения за то же время
+# разошлись (архивы разных станций с одним WMO_ID, исправленные данные), суммы
+# истории к архиву не подходят
+HISTORY_CHECK_COLUMNS = ['T', 'Ff']
+
+
+def _conflicts(stored: pd.DataFrame, repeated: pd.DataFrame) -> bool:
+    """Есть ли среди повторов строки, значения которых отличаются от сохранённых за то же время."""
+    stored = stored.sort_values('time', ignore_index=True)
+    position = np.searchsorted(stored['time'].to_numpy(dtype='datetime64[ns]'),
+                               repeated['time'].to_numpy(dtype='datetime64[ns]'))
+    for name in HISTORY_CHECK_COLUMNS:
+        if name not in stored.columns or name not in repeated.columns:
+            continue
+        old = stored[name].to_numpy(dtype='float64')[position]
+        current = repeated[name].to_numpy(dtype='float64')
+        if not np.array_equal(old, current, equal_nan=True):
+            return True
+    return False
+
+
+def merge_station_history(history, dataset: MeteoDataset) -> pd.DataFrame | None:
+    """
+    Дописывает в историю станции только новые наблюдения архива и обновляет суточные суммы.
+
+    Повторы определяются по времени наблюдения: строки, время которых уже есть
+    в истории, не добавляются и не пересчитываются. Из истории для этого читаются
+    только время и колонки сверки, суточные суммы новых строк прибавляются к сохранённым.
+
+    Returns:
+        Суточные суммы за дни архива (для MeteoDataset.daily) или None, если у архива
+        нет WMO_ID или части OBSERVATION_COLUMNS или суммы истории не повторят расчёт
+        по самому архиву
+    """
+    station_id = dataset.station['wmo_id']
+    if station_id is None:
+        return None
+    observations = dataset.observations
+    # Куски истории — с одинаковыми колонками: архив без части колонок рисуем по его строкам
+    missing = [name for name in OBSERVATION_COLUMNS if name not in observations.columns]
+    if missing:
+        logging.info("station history %s skipped: no columns %s", station_id, ', '.join(missing))
+        return None
+    with timed('history_merge'), history.lock(station_id):
+        # Повреждённую историю load удаляет — тогда она начинается заново с этого архива
+        stored, daily = history.load(station_id, columns=['time'] + HISTORY_CHECK_COLUMNS)
+        archive = observations.dropna(subset=['time']).drop_duplicates('time', ignore_index=True)
+        new = archive
+        conflict = False
+        changed = len(new) > 0
+        if daily is not None:
+            repeated = new['time'].isin(stored['time'])
+            conflict = _conflicts(stored, new[repeated])
+            new = new[~repeated].reset_index(drop=True)
+            changed = len(new) > 0
+            # Суммы, посчитанные с другим коэффициентом давности, пересчитываем целиком
+            if daily.attrs.get('decay_rate') != IMPORTANCE_DECAY_RATE:
+                stored = history.load(station_id)[0]
+                daily = daily_aggregates(stored) if stored is not None else None
+                changed = True
+                if daily is None:
+                    # История пропала между чтениями (вытеснена) — начинаем её заново
+                    new, conflict, changed = archive, False, len(archive) > 0
+        if len(new):
+            new_daily = daily_aggregates(new)
+            if daily is None:
+                daily = new_daily
+            else:
+                daily = daily.add(new_daily, fill_value=0)
+                daily.attrs['decay_rate'] = IMPORTANCE_DECAY_RATE
+        if changed:
+            history.append(station_id, new, daily)
+    if daily is None or conflict:
+        return None
+    return _daily_window(daily, observations)
+
+
+@timed('processing')
+def processing(df: pd.DataFrame, winds: list[str]) -> pd.DataFrame:
+    """
+    Обрабатывает данные для простой розы ветров.
     
-    windrose = rose.groupby('DD')['importance_wind'].sum()
-    return reindex_with_all_directions(windrose, winds)
+    Считает наблюдения по 16 направлениям одним np.bincount по кодам;
+    winds — подписи направлений в порядке кодов (WIND_DIRECTIONS).
+    """
+    codes = wind_codes(df)
+    counts = np.bincount(codes[(codes >= 0) & (codes < len(winds))], minlength=len(winds))
+    return pd.DataFrame({'index': winds, 'DD': counts})
 
 
-def _plot_polar_rose(data: pd.DataFrame, value_column: str, title: str, output_path: str) -> str:
-    """Вспомогательная функция для создания полярного графика розы ветров."""
-    angles = np.linspace(0, 360, len(WIND_DIRECTIONS), endpoint=False)
-    theta = np.radians(angles)
-    r = data[value_column].values
+@timed('smartrose_processing')
+def smartrose_processing(df: pd.DataFrame, winds: list[str],
+                         decay_rate: float = IMPORTANCE_DECAY_RATE) -> pd.DataFrame:
+    """
+    Обрабатывает данные для умной розы ветров с учетом временного веса.
     
-    # Закрываем линию
-    theta_closed = np.concatenate([theta, [theta[0]]])
-    r_closed = np.concatenate([r, [r[0]]])
+    Давность считается от первого (самого свежего) наблюдения в целых часах,
+    вес ветра — скорость, умноженная на exp(давность в сутках * decay_rate).
+    Сумма по направлениям считается одним np.bincount по кодам направлений.
+    """
+    times = df['time'].to_numpy(dtype='datetime64[ns]')
+    speeds = df['Ff'].to_numpy(dtype='float64')
+    codes = wind_codes(df)
     
-    fig, ax = plt.subplots(figsize=POLAR_FIGURE_SIZE, subplot_kw=dict(projection='polar'))
-    ax.plot(theta_closed, r_closed, linewidth=2)
-    ax.fill(theta_closed, r_closed, alpha=0.25)
-    ax.set_theta_zero_location('N')
-    ax.set_theta_direction(-1)
-    ax.set_thetagrids(angles, WIND_DIRECTIONS)
-    ax.set_yticklabels([])  # Убираем подписи радиальных значений
-    ax.set_title(title, pad=20)
+    if len(times) == 0 or np.isnat(times[0]):
+        return pd.DataFrame({'index': winds, 'importance_wind': np.zeros(len(winds))})
     
-    _add_copyright(fig)
+    valid = (codes >= 0) & (codes < len(winds)) & ~np.isnat(times) & ~np.isnan(speeds)
+    age_hours = (times[0] - times[valid]).view(np.int64) // HOUR_NS
+    importance = np.exp(age_hours / 24 * decay_rate)
     
-    plt.savefig(output_path, bbox_inches='tight', dpi=100)
-    plt.close(fig)
-    return output_path
+    importance_wind = np.bincount(
+        codes[valid], weights=speeds[valid] * importance, minlength=len(winds)
+    )
+    return pd.DataFrame({'index': winds, 'importance_wind': importance_wind})
 
 
 def _add_copyright(fig):
@@ -207,98 +711,535 @@ def _add_copyright(fig):
 
 def _setup_date_axis(ax):
     """Настраивает ось дат с автоматическим форматированием."""
-    ax.xaxis.set_major_locator(plt.MaxNLocator(nbins=DATE_TICKS_MAX))
-    plt.xticks(rotation=45, ha='right')
+    ax.xaxis.set_major_locator(MaxNLocator(nbins=DATE_TICKS_MAX))
 
 
-def create_windrose(file_path: str, first_image_path: str) -> str:
-    """Создает простую розу ветров."""
-    extracted_path = extract_gzip_file(file_path)
-    try:
-        df = clean_data(extracted_path)
-        wind_data = processing(df, WIND_DIRECTIONS)
-        return _plot_polar_rose(wind_data, 'DD', 'windrose', first_image_path)
-    finally:
-        if os.path.exists(extracted_path):
-            os.remove(extracted_path)
+def _rotate_date_labels(ax):
+    """Поворачивает подписи дат; вызывается после смены данных, когда тики уже пересчитаны."""
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+        label.set_horizontalalignment('right')
 
 
-def create_smartrose(file_path: str, second_image_path: str) -> str:
-    """Создает умную розу ветров с учетом временного веса."""
-    extracted_path = extract_gzip_file(file_path)
-    try:
-        df = clean_data(extracted_path)
-        windrose_data = smartrose_processing(df, WIND_DIRECTIONS)
-        return _plot_polar_rose(windrose_data, 'importance_wind', 'smartrose', second_image_path)
-    finally:
-        if os.path.exists(extracted_path):
-            os.remove(extracted_path)
+def _reset_data_limits(ax, points: np.ndarray) -> None:
+    """Пересчитывает пределы осей по новым данным коллекции (relim коллекции не учитывает)."""
+    ax.ignore_existing_data_limits = True
+    ax.dataLim.set_points(np.array([[np.inf, np.inf], [-np.inf, -np.inf]]))
+    if len(points):
+        ax.update_datalim(points)
+    ax.autoscale_view()
 
 
-def create_combined_rose(file_path: str, output_image_path: str) -> str:
-    """Создает совмещенный график с обычной и умной розой ветров."""
-    extracted_path = extract_gzip_file(file_path)
-    try:
-        df = clean_data(extracted_path)
+def _bar_vertices(x: np.ndarray, heights: np.ndarray, width: float = BAR_WIDTH) -> np.ndarray:
+    """Вершины прямоугольников столбцов (n, 4, 2) с центрами x, как у ax.bar."""
+    left = x - width / 2
+    right = x + width / 2
+    zeros = np.zeros_like(x)
+    return np.stack([
+        np.column_stack([left, zeros]),
+        np.column_stack([left, heights]),
+        np.column_stack([right, heights]),
+        np.column_stack([right, zeros]),
+    ], axis=1)
+
+
+class _ChartTemplate:
+    """
+    Заготовка фигуры, которая строится один раз на процесс и переиспользуется.
+    
+    Оси, подписи, сетки направлений и копирайт настраиваются в конструкторе,
+    а для каждого архива меняются только данные. Рисуем прямо через Agg,
+    без глобального состояния pyplot.
+    """
+
+    def __init__(self, figsize: tuple, polar: bool = False):
+        self.figure = Figure(figsize=figsize)
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot(projection='polar' if polar else None)
+        _add_copyright(self.figure)
+
+    def save(self, output_path: str) -> str:
+        self.figure.savefig(output_path, bbox_inches='tight', dpi=100)
+        return output_path
+
+
+# Совмещённая роза: smartrose — основной, менее прозрачный; windrose — наложение, более прозрачный
+COMBINED_ROSE_STYLES = [
+    ('smartrose', dict(linewidth=2.5, color='#1f77b4'), 0.3),
+    ('windrose', dict(linewidth=2, color='#1f77b4', linestyle='--'), 0.1),
+]
+
+_ROSE_ANGLES = np.linspace(0, 360, len(WIND_DIRECTIONS), endpoint=False)
+_ROSE_THETA_CLOSED = np.radians(np.append(_ROSE_ANGLES, _ROSE_ANGLES[0]))
+
+
+def _setup_polar_rose(ax, styles: list[tuple[str | None, dict, float]]) -> list[tuple]:
+    """Настраивает полярные оси розы ветров и возвращает пустые (линия, заливка) для каждого стиля."""
+    zeros = np.zeros_like(_ROSE_THETA_CLOSED)
+    series = []
+    for label, line_style, fill_alpha in styles:
+        line, = ax.plot(_ROSE_THETA_CLOSED, zeros, label=label, **line_style)
+        fill, = ax.fill(_ROSE_THETA_CLOSED, zeros, alpha=fill_alpha, color=line.get_color())
+        series.append((line, fill))
+    
+    ax.set_theta_zero_location('N')
+    ax.set_theta_direction(-1)
+    ax.set_thetagrids(_ROSE_ANGLES, WIND_DIRECTIONS)
+    ax.set_yticklabels([])  # Убираем подписи радиальных значений
+    return series
+
+
+def _set_rose_values(series: list[tuple], values: list[np.ndarray]) -> None:
+    """Подставляет значения по направлениям в линии и заливки розы."""
+    for (line, fill), r in zip(series, values):
+        # Закрываем линию
+        r_closed = np.concatenate([r, [r[0]]])
+        line.set_ydata(r_closed)
+        fill.set_xy(np.column_stack([_ROSE_THETA_CLOSED, r_closed]))
+
+
+class _PolarRoseTemplate(_ChartTemplate):
+    """
+    Полярная роза ветров из нескольких замкнутых линий с заливкой.
+    
+    Args:
+        styles: Для каждой линии — (подпись, стиль линии, прозрачность заливки)
+        legend: Показывать ли легенду
+    """
+
+    def __init__(self, styles: list[tuple[str | None, dict, float]], legend: bool):
+        super().__init__(POLAR_FIGURE_SIZE, polar=True)
+        self.series = _setup_polar_rose(self.ax, styles)
+        if legend:
+            self.ax.legend(loc='upper right', bbox_to_anchor=(1.3, 1.1))
+
+    def render(self, values: list[np.ndarray], title: str, output_path: str) -> str:
+        _set_rose_values(self.series, values)
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self.ax.set_yticklabels([])
+        self.ax.set_title(title, pad=20)
+        return self.save(output_path)
+
+
+class _StationGridTemplate(_ChartTemplate):
+    """
+    Совмещённые розы нескольких станций рядом, в одном масштабе.
+
+    Строится отдельно для каждого числа станций: сетка до STATION_GRID_COLUMNS
+    роз в ряд, розы нормализованы, поэтому радиус у всех от 0 до 1.
+
+    Args:
+        count: Сколько станций на рисунке
+    """
+
+    def __init__(self, count: int):
+        columns = min(count, STATION_GRID_COLUMNS)
+        rows = math.ceil(count / columns)
+        self.figure = Figure(figsize=(STATION_GRID_CELL_SIZE[0] * columns, STATION_GRID_CELL_SIZE[1] * rows))
+        FigureCanvasAgg(self.figure)
+        self.cells = []
+        for index in range(count):
+            ax = self.figure.add_subplot(rows, columns, index + 1, projection='polar')
+            series = _setup_polar_rose(ax, COMBINED_ROSE_STYLES)
+            ax.set_ylim(0, 1.05)
+            self.cells.append((ax, series))
+        self.cells[0][0].legend(loc='upper right', bbox_to_anchor=(1.25, 1.15), fontsize=8)
+        _add_copyright(self.figure)
+        self.figure.tight_layout()
+
+    def render(self, roses: list[tuple[str, list[np.ndarray]]], output_path: str) -> str:
+        for (ax, series), (title, values) in zip(self.cells, roses):
+            _set_rose_values(series, values)
+            ax.set_yticklabels([])
+            ax.set_title(title, pad=18, fontsize=10)
+        return self.save(output_path)
+
+
+def speed_class_labels(classes: tuple[float, ...]) -> list[str]:
+    """Подписи классов скорости: 0–2 м/с, ..., ≥15 м/с."""
+    edges = [0.0, *classes]
+    return [f'{lo:g}–{hi:g} м/с' for lo, hi in zip(edges, edges[1:])] + [f'≥{edges[-1]:g} м/с']
+
+
+class _SpeedRoseTemplate(_ChartTemplate):
+    """
+    Роза скоростей: по каждому направлению столбцы классов скорости один на другом.
+
+    Столбцы строятся один раз, для архива меняются только их высоты и основания.
+
+    Args:
+        classes: Границы классов скорости, м/с
+    """
+
+    def __init__(self, classes: tuple[float, ...]):
+        super().__init__(POLAR_FIGURE_SIZE, polar=True)
+        _setup_polar_rose(self.ax, [])
+        theta = np.radians(_ROSE_ANGLES)
+        width = 2 * np.pi / len(WIND_DIRECTIONS) * 0.9
+        labels = speed_class_labels(classes)
+        colors = colormaps[SPEED_CMAP](np.linspace(0, 1, len(labels)))
+        zeros = np.zeros(len(WIND_DIRECTIONS))
+        self.bars = [
+            self.ax.bar(theta, zeros, width=width, bottom=zeros, color=color, edgecolor='white',
+                        linewidth=0.5, label=label)
+            for label, color in zip(labels, colors)
+        ]
+        # Радиус — доля наблюдений, в процентах; подписи — между направлениями
+        self.ax.yaxis.set_major_locator(MaxNLocator(nbins=4))
+        self.ax.yaxis.set_major_formatter(FuncFormatter(lambda value, _: f'{value:g}%'))
+        self.ax.set_rlabel_position(180 / len(WIND_DIRECTIONS))
+        self.ax.legend(title='скорость', loc='upper left', bbox_to_anchor=(1.1, 1.05), fontsize=8)
+        self.ax.set_title('скорость ветра', pad=20)
+
+    def render(self, shares: np.ndarray, calm: float, output_path: str) -> str:
+        # Штиль без направления: как принято у роз скоростей, его доля — в заголовке
+        self.ax.set_title(f'скорость ветра, штиль {calm:.1f}%', pad=20)
+        bottom = np.zeros(len(WIND_DIRECTIONS))
+        for bars, heights in zip(self.bars, shares.T):
+            for bar, base, height in zip(bars, bottom, heights):
+                bar.set_y(base)
+                bar.set_height(height)
+            bottom = bottom + heights
+        self.ax.set_ylim(0, bottom.max() * 1.05 if bottom.max() > 0 else 1)
+        return self.save(output_path)
+
+
+class _AnimationFrameTemplate(_ChartTemplate):
+    """
+    Кадр анимации: совмещённая роза в постоянном масштабе.
+
+    Розы нормализованы, поэтому радиус от 0 до 1 и оси, сетка и подписи
+    направлений у всех кадров одни. Они рисуются один раз в фон, а для кадра
+    поверх фона рисуются только линии, заливки и заголовок (blitting): это
+    в десятки раз быстрее полной отрисовки. Все кадры одного размера, как
+    нужно GIF и видео.
+    """
+
+    def __init__(self):
+        super().__init__(ANIMATION_FIGURE_SIZE, polar=True)
+        self.figure.set_dpi(ANIMATION_DPI)
+        self.series = _setup_polar_rose(self.ax, COMBINED_ROSE_STYLES)
+        self.ax.set_ylim(0, 1.05)
+        self.ax.set_yticklabels([])
+        # Легенда — в фоне: она за пределами розы, и линии её не перекрывают
+        self.ax.legend(loc='lower left', bbox_to_anchor=(-0.2, -0.2), fontsize=8)
+        self.title = self.ax.set_title('', pad=24, fontsize=10)
+        self.figure.tight_layout()
+        for artist in (*(a for pair in self.series for a in pair), self.title):
+            artist.set_animated(True)
+        canvas = self.figure.canvas
+        canvas.draw()
+        self.background = canvas.copy_from_bbox(self.figure.bbox)
+
+    def render(self, values: list[np.ndarray], title: str, output_path: str) -> str:
+        canvas = self.figure.canvas
+        canvas.restore_region(self.background)
+        _set_rose_values(self.series, values)
+        self.title.set_text(title)
+        for line, fill in self.series:
+            self.ax.draw_artist(fill)
+            self.ax.draw_artist(line)
+        self.ax.draw_artist(self.title)
+        image = Image.frombuffer('RGBA', canvas.get_width_height(), canvas.buffer_rgba())
+        image.convert('RGB').save(output_path, compress_level=1)
+        return output_path
+
+
+class _TemperatureTemplate(_ChartTemplate):
+    """
+    Точечный график температуры: цвет — температура, размер — влажность.
+
+    Плотный ряд (больше TEMPERATURE_DENSE_POINTS точек) рисуется по интервалам
+    temperature_bins: точка — средние за интервал, серая полоса — минимум и
+    максимум. Точки растрируются в SVG и PDF, поэтому и векторный файл не
+    разрастается.
+    """
+
+    def __init__(self):
+        # Делаем график шире на 20% для лучшей читаемости с colorbar
+        super().__init__((12, 6))
+        self.ax.xaxis_date()
+        self.scatter = self.ax.scatter([], [],
+                                       c=[],
+                                       cmap='RdBu_r',
+                                       vmin=TEMP_COLOR_MIN, vmax=TEMP_COLOR_MAX,
+                                       edgecolors='black', linewidths=0.5,
+                                       alpha=0.7, rasterized=True)
+        self.band = PolyCollection([], facecolors='grey', alpha=0.3, linewidths=0, zorder=0.5)
+        self.ax.add_collection(self.band, autolim=False)
+        self.ax.set_xlabel('время')
+        self.ax.set_ylabel('температура, °C')
         
-        # Получаем данные для обоих графиков
-        simple_wind_data = processing(df, WIND_DIRECTIONS)
-        smart_wind_data = smartrose_processing(df, WIND_DIRECTIONS)
+        # Добавляем цветовую шкалу
+        cbar = self.figure.colorbar(self.scatter, ax=self.ax)
+        cbar.set_label('температура, °C')
         
-        # Нормализуем данные для лучшего визуального сравнения
-        simple_values = simple_wind_data['DD'].values
-        smart_values = smart_wind_data['importance_wind'].values
+        _setup_date_axis(self.ax)
+
+    def render(self, sorted_df: pd.DataFrame, output_path: str, vector_path: str | None = None) -> str:
+        x = date2num(sorted_df['time'])
+        y = sorted_df['T'].to_numpy(dtype='float64')
+        # Как и ax.scatter, пропускаем точки без времени или температуры
+        valid = np.isfinite(x) & np.isfinite(y)
         
-        # Нормализуем на максимум, чтобы оба графика были в одном масштабе
-        simple_max = simple_values.max()
-        smart_max = smart_values.max()
-        if simple_max > 0:
-            simple_normalized = simple_values / simple_max
+        if valid.sum() > TEMPERATURE_DENSE_POINTS:
+            bins, days = temperature_bins(sorted_df)
+            points = bins[['time', 'T']].to_numpy()
+            # Кружки не шире двух интервалов: площадь — доля от наибольшей влажности
+            spacing = self.ax.get_position().width * self.figure.get_figwidth() * 72 / TEMPERATURE_MAX_BINS
+            humidity = bins['U'].to_numpy()
+            sizes = np.maximum(humidity / max(humidity.max(), 1) * (2 * spacing) ** 2, 4)
+            band = np.concatenate([bins[['time', 'T_min']].to_numpy(), bins[['time', 'T_max']].to_numpy()[::-1]])
+            self.band.set_verts([band])
+            limits = band
+            self.ax.set_title(f'температура и влажность: средние за {days} сут., полоса — мин. и макс.')
         else:
-            simple_normalized = simple_values
-            
-        if smart_max > 0:
-            smart_normalized = smart_values / smart_max
-        else:
-            smart_normalized = smart_values
+            points = np.column_stack([x[valid], y[valid]])
+            sizes = sorted_df['U'].to_numpy()[valid] * 10
+            self.band.set_verts([])
+            limits = points
+            self.ax.set_title('температура и влажность')
         
-        # Подготовка углов
-        angles = np.linspace(0, 360, len(WIND_DIRECTIONS), endpoint=False)
-        theta = np.radians(angles)
+        self.scatter.set_offsets(points)
+        self.scatter.set_sizes(sizes)
+        self.scatter.set_array(points[:, 1])
+        _reset_data_limits(self.ax, limits)
+        _rotate_date_labels(self.ax)
+        self.save(output_path)
+        # Векторный файл — тот же рисунок, только для рядов без усреднения по интервалам
+        if vector_path is not None and valid.sum() <= TEMPERATURE_DENSE_POINTS:
+            self.save(vector_path)
+        return output_path
+
+
+class _RainTemplate(_ChartTemplate):
+    """Столбцы осадков по типам погоды и линия высоты снежного покрова на второй оси."""
+
+    def __init__(self):
+        super().__init__(REGULAR_FIGURE_SIZE)
+        self.ax.xaxis_date()
+        self.ax.set_xlabel('время')
+        self.ax.set_ylabel('количество осадков, мм')
+        self.ax.set_title('осадки')
         
-        # Закрываем линии
-        theta_closed = np.concatenate([theta, [theta[0]]])
-        simple_closed = np.concatenate([simple_normalized, [simple_normalized[0]]])
-        smart_closed = np.concatenate([smart_normalized, [smart_normalized[0]]])
+        # Вторая ось Y для снежного покрова
+        self.ax2 = self.ax.twinx()
+        self.snow_line, = self.ax2.plot([], [], color='black', linewidth=2,
+                                        label='высота снежного покрова, см')
+        self.ax2.set_ylabel('высота снежного покрова, см')
         
-        # Создаем график
-        fig, ax = plt.subplots(figsize=POLAR_FIGURE_SIZE, subplot_kw=dict(projection='polar'))
+        self.bar_collections = []
+        _setup_date_axis(self.ax)
+
+    def render(self, rain_df: pd.DataFrame, output_path: str) -> str:
+        # Столбцы прошлого архива убираем, оси и подписи остаются
+        for collection in self.bar_collections:
+            collection.remove()
+        self.bar_collections = []
         
-        # Рисуем smartrose (основной, менее прозрачный)
-        ax.plot(theta_closed, smart_closed, linewidth=2.5, label='smartrose', color='#1f77b4')
-        ax.fill(theta_closed, smart_closed, alpha=0.3, color='#1f77b4')
+        x = date2num(rain_df['time'])
+        heights = rain_df['RRR'].to_numpy(dtype='float64')
         
-        # Рисуем windrose (наложение, более прозрачный - 1/3 от smartrose)
-        ax.plot(theta_closed, simple_closed, linewidth=2, label='windrose', color='#1f77b4', linestyle='--')
-        ax.fill(theta_closed, simple_closed, alpha=0.1, color='#1f77b4')
+        # Получаем уникальные типы осадков и создаем маппинг цветов
+        unique_w1 = rain_df['W1'].unique()
+        color_map = {w1: CUSTOM_COLORS[i % len(CUSTOM_COLORS)] for i, w1 in enumerate(unique_w1)}
         
-        ax.set_theta_zero_location('N')
-        ax.set_theta_direction(-1)
-        ax.set_thetagrids(angles, WIND_DIRECTIONS)
-        ax.set_yticklabels([])
-        ax.set_title('роза ветров', pad=20)
-        ax.legend(loc='upper right', bbox_to_anchor=(1.3, 1.1))
+        # Столбцы одного типа осадков — одна коллекция: это одна запись в легенде
+        # и гораздо быстрее, чем отдельный Rectangle на каждые сутки
+        _reset_data_limits(self.ax, np.empty((0, 2)))
+        for w1_type in unique_w1:
+            mask = (rain_df['W1'] == w1_type).to_numpy() & np.isfinite(heights)
+            collection = PolyCollection(
+                _bar_vertices(x[mask], heights[mask]),
+                facecolors=color_map[w1_type], label=w1_type,
+            )
+            collection.sticky_edges.y.append(0)
+            self.ax.add_collection(collection)
+            self.bar_collections.append(collection)
         
-        _add_copyright(fig)
+        self.snow_line.set_data(rain_df['time'], rain_df['sss'])
         
-        plt.savefig(output_image_path, bbox_inches='tight', dpi=100)
-        plt.close(fig)
-        return output_image_path
-    finally:
-        if os.path.exists(extracted_path):
-            os.remove(extracted_path)
+        # Настройка легенды
+        self.ax.legend(title='тип осадков', bbox_to_anchor=(1.22, 1), loc='upper left')
+        
+        self.ax2.relim()
+        self.ax.autoscale_view()
+        self.ax2.autoscale_view()
+        _rotate_date_labels(self.ax)
+        return self.save(output_path)
+
+
+# Заготовки графиков текущего процесса: строятся при первом использовании
+_TEMPLATES = {}
+
+_TEMPLATE_FACTORIES = {
+    'rose': lambda: _PolarRoseTemplate([(None, dict(linewidth=2), 0.25)], legend=False),
+    'combined_rose': lambda: _PolarRoseTemplate(COMBINED_ROSE_STYLES, legend=True),
+    'temperature': _TemperatureTemplate,
+    'rain': _RainTemplate,
+    'station_grid': _StationGridTemplate,
+    'speedrose': _SpeedRoseTemplate,
+    'animation_frame': _AnimationFrameTemplate,
+}
+
+
+def _get_template(kind: str, *args):
+    """
+    Возвращает заготовку графика kind, при первом вызове в процессе — строит её.
+
+    args передаются фабрике, и для каждого их набора строится своя заготовка
+    (например, сетка станций — своя для каждого числа станций).
+    """
+    key = (kind, *args)
+    if key not in _TEMPLATES:
+        _TEMPLATES[key] = _TEMPLATE_FACTORIES[kind](*args)
+    return _TEMPLATES[key]
+
+
+def _render(kind: str, *args) -> str:
+    """Рисует график по заготовке kind; время отрисовки — этап plot_<kind>."""
+    with timed(f'plot_{kind}'):
+        return _get_template(kind).render(*args)
+
+
+def warm_up() -> None:
+    """
+    Готовит процесс к первому графику: строит все заготовки и рисует пробную розу.
+
+    Первая отрисовка в процессе загружает шрифты и бэкенд Agg; после warm_up
+    первый настоящий график рисуется так же быстро, как следующие.
+    """
+    for kind in _TEMPLATE_FACTORIES:
+        # Сетки станций строятся по запросу: их размер зависит от числа архивов
+        if kind not in ('station_grid', 'speedrose'):
+            _get_template(kind)
+    # Роза скоростей — с классами по умолчанию: другие классы бот передаёт при отрисовке
+    _get_template('speedrose', SPEED_CLASSES)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        values = np.linspace(0, 1, len(WIND_DIRECTIONS))
+        _get_template('combined_rose').render([values, values], 'роза ветров', os.path.join(temp_dir, 'warm_up.jpg'))
+
+
+def _plot_polar_rose(data: pd.DataFrame, value_column: str, title: str, output_path: str) -> str:
+    """Вспомогательная функция для создания полярного графика розы ветров."""
+    return _render('rose', [data[value_column].values], title, output_path)
+
+
+@timed('smartrose_processing')
+def daily_smartrose_processing(daily: pd.DataFrame, winds: list[str], latest: np.datetime64,
+                               decay_rate: float = IMPORTANCE_DECAY_RATE) -> pd.DataFrame:
+    """
+    То же, что smartrose_processing, но по суточным суммам истории станции.
+
+    latest — время первого (самого свежего) наблюдения, от которого считается давность.
+    """
+    day_age_hours = (latest - daily.index.to_numpy(dtype='datetime64[ns]')).view(np.int64) // HOUR_NS
+    importance = np.exp(day_age_hours / 24 * decay_rate)
+    importance_wind = importance @ daily[DAILY_WEIGHT_COLUMNS].to_numpy()
+    return pd.DataFrame({'index': winds, 'importance_wind': importance_wind})
+
+
+def _simple_rose(dataset: MeteoDataset) -> pd.DataFrame:
+    """processing для датасета: для окна — запрос к индексу всего архива."""
+    if dataset.window_sums is not None:
+        return pd.DataFrame({'index': WIND_DIRECTIONS, 'DD': dataset.window_sums.rose})
+    return processing(dataset.data, WIND_DIRECTIONS)
+
+
+def _smart_rose(dataset: MeteoDataset) -> pd.DataFrame:
+    """
+    smartrose_processing для датасета: для окна — запрос к индексу всего архива,
+    иначе по суточным суммам истории, если они есть.
+    """
+    if dataset.window_sums is not None and dataset.window_sums.smart_rose is not None:
+        return pd.DataFrame({'index': WIND_DIRECTIONS, 'importance_wind': dataset.window_sums.smart_rose})
+    daily = dataset.daily
+    latest = dataset.data['time'].to_numpy(dtype='datetime64[ns]')[:1]
+    # Вес давности внутри суток в суммах посчитан с коэффициентом истории
+    if daily is not None and daily.attrs.get('decay_rate') == dataset.decay_rate and len(latest):
+        return daily_smartrose_processing(daily, WIND_DIRECTIONS, latest[0], dataset.decay_rate)
+    return smartrose_processing(dataset.data, WIND_DIRECTIONS, dataset.decay_rate)
+
+
+def create_windrose(dataset: MeteoDataset, first_image_path: str) -> str:
+    """Создает простую розу ветров."""
+    wind_data = _simple_rose(dataset)
+    return _plot_polar_rose(wind_data, 'DD', 'windrose', first_image_path)
+
+
+def create_smartrose(dataset: MeteoDataset, second_image_path: str) -> str:
+    """Создает умную розу ветров с учетом временного веса."""
+    windrose_data = _smart_rose(dataset)
+    return _plot_polar_rose(windrose_data, 'importance_wind', 'smartrose', second_image_path)
+
+
+@timed('speed_processing')
+def speed_processing(df: pd.DataFrame, winds: list[str], classes: tuple[float, ...] = SPEED_CLASSES) -> pd.DataFrame:
+    """
+    Доли наблюдений по направлениям и классам скорости, в процентах от всех наблюдений
+    ветра: с направлением и скоростью и штилей.
+
+    Считается одной двумерной гистограммой по кодам направлений и классам Ff: номер
+    ячейки — код * число классов + класс, счёт — один np.bincount, как в processing.
+    Это то же, что np.histogram2d, но без её общего поиска по обеим осям.
+
+    Args:
+        df: Наблюдения со штилем (MeteoDataset.observations): без него не посчитать его долю
+
+    Returns:
+        DataFrame: строки — направления winds, колонки — speed_class_labels(classes);
+        доля штиля в процентах — в attrs['calm']
+    """
+    codes = wind_codes(df)
+    speeds = df['Ff'].to_numpy(dtype='float64')
+    valid = (codes >= 0) & (codes < len(winds)) & ~np.isnan(speeds)
+    n_classes = len(classes) + 1
+    speed_class = np.searchsorted(np.asarray(classes, dtype='float64'), speeds[valid], side='right')
+    cells = codes[valid].astype(np.intp) * n_classes + speed_class
+    counts = np.bincount(cells, minlength=len(winds) * n_classes).reshape(len(winds), n_classes)
+    calm = int(np.count_nonzero(codes == CALM_CODE))
+    total = counts.sum() + calm
+    shares = pd.DataFrame(counts / total * 100 if total else counts.astype('float64'),
+                          index=winds, columns=speed_class_labels(classes))
+    shares.attrs['calm'] = calm / total * 100 if total else 0.0
+    return shares
+
+
+def create_speedrose(dataset: MeteoDataset, output_image_path: str,
+                     classes: tuple[float, ...] = SPEED_CLASSES) -> str:
+    """Создает розу скоростей: повторяемость направлений по классам скорости и доля штиля."""
+    shares = speed_processing(dataset.observations, WIND_DIRECTIONS, classes)
+    with timed('plot_speedrose'):
+        return _get_template('speedrose', tuple(classes)).render(
+            shares.to_numpy(), shares.attrs['calm'], output_image_path
+        )
+
+
+def _normalize(values: np.ndarray) -> np.ndarray:
+    """Нормализует на максимум, чтобы розы были в одном масштабе."""
+    values_max = values.max()
+    return values / values_max if values_max > 0 else values
+
+
+def _combined_rose_values(dataset: MeteoDataset) -> list[np.ndarray]:
+    """Нормализованные умная и простая розы — значения для COMBINED_ROSE_STYLES."""
+    # Получаем данные для обоих графиков
+    simple_wind_data = _simple_rose(dataset)
+    smart_wind_data = _smart_rose(dataset)
+    
+    # Нормализуем данные для лучшего визуального сравнения
+    simple_normalized = _normalize(simple_wind_data['DD'].values)
+    smart_normalized = _normalize(smart_wind_data['importance_wind'].values)
+    return [smart_normalized, simple_normalized]
 
 
+def create_combined_rose(dataset: MeteoDataset, output_image_path: str) -> str:
+    """Создает совмещенный график с обычной и умной розой ветров."""
+    return _render('combined_rose', _combined_rose_values(dataset), 'роза ветров', output_image_path)
+
+
+@timed('temperature_processing')
 def temperature_processing(df: pd.DataFrame) -> pd.DataFrame:
     """Обрабатывает данные температуры и влажности."""
     sorted_df = df.iloc[::-1].copy()
@@ -309,126 +1250,123 @@ def temperature_processing(df: pd.DataFrame) -> pd.DataFrame:
     return sorted_df
 
 
-def rain_processing(df: pd.DataFrame) -> pd.DataFrame:
-    """Обрабатывает данные осадков."""
+@timed('temperature_bins')
+def temperature_bins(sorted_df: pd.DataFrame, max_bins: int = TEMPERATURE_MAX_BINS) -> tuple[pd.DataFrame, int]:
+    """
+    Сводит ряд температуры (см. temperature_processing) к интервалам из целых суток.
+
+    Длина интервала — столько суток, чтобы интервалов было не больше max_bins.
+    Суммы, минимумы и максимумы по интервалам считаются np.bincount и
+    np.minimum.at / np.maximum.at за один проход по наблюдениям.
+
+    Returns:
+        tuple: (DataFrame с колонками time — середина интервала в числах дат matplotlib,
+        T_min, T, T_max, U — средняя влажность; интервалы без наблюдений пропущены,
+        длина интервала в сутках)
+    """
+    x = date2num(sorted_df['time'])
+    t = sorted_df['T'].to_numpy(dtype='float64')
+    u = sorted_df['U'].to_numpy(dtype='float64')
+    valid = np.isfinite(x) & np.isfinite(t)
+    x, t, u = x[valid], t[valid], u[valid]
+    if not len(x):
+        return pd.DataFrame(columns=['time', 'T_min', 'T', 'T_max', 'U'], dtype='float64'), 1
+    first = np.floor(x.min())
+    days = max(1, math.ceil((x.max() - first + 1) / max_bins))
+    bins = ((x - first) // days).astype(np.intp)
+    n_bins = bins.max() + 1
+    counts = np.bincount(bins, minlength=n_bins)
+    low = np.full(n_bins, np.inf)
+    high = np.full(n_bins, -np.inf)
+    np.minimum.at(low, bins, t)
+    np.maximum.at(high, bins, t)
+    filled = counts > 0
+    counts = np.maximum(counts, 1)
+    return pd.DataFrame({
+        'time': first + (np.arange(n_bins) + 0.5) * days,
+        'T_min': low,
+        'T': np.bincount(bins, weights=t, minlength=n_bins) / counts,
+        'T_max': high,
+        'U': np.bincount(bins, weights=u, minlength=n_bins) / counts,
+    })[filled].reset_index(drop=True), days
+
+
+def _daily_mode(days: pd.Series, values: pd.Series) -> pd.Series:
+    """Самое частое значение за каждые сутки; при равенстве — наименьшее, как у Series.mode()[0]."""
+    counts = pd.DataFrame({'time': days, 'value': values}).value_counts(sort=False).reset_index(name='count')
+    counts = counts.sort_values(['time', 'count', 'value'], ascending=[True, False, True])
+    return counts.drop_duplicates('time').set_index('time')['value']
+
+
+@timed('rain_processing')
+def rain_processing(df: pd.DataFrame, daily: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    Обрабатывает данные осадков.
+    
+    За каждые сутки: самый частый тип погоды W1, осадки RRR, приведённые
+    к 24 часам по периодам накопления tR, и максимальная высота снежного покрова.
+    Все агрегаты считаются групповыми операциями над колонками, без лямбд.
+    Если переданы суточные суммы истории станции (daily), RRR берётся из них.
+    """
     df = df.iloc[::-1]
-    rain_df = df[['time', 'W1', 'RRR', 'tR', 'sss']].copy()
-    rain_df['RRR'] = pd.to_numeric(rain_df['RRR'], errors='coerce')
-    rain_df['RRR'] = rain_df['RRR'].fillna(0)
-    rain_df['sss'] = pd.to_numeric(rain_df['sss'], errors='coerce')
-    rain_df['sss'] = rain_df['sss'].interpolate(method='linear')
-    rain_df['tR'] = pd.to_numeric(rain_df['tR'], errors='coerce')
-    rain_df['time'] = pd.to_datetime(rain_df['time'], errors='coerce', dayfirst=True).dt.date
-    rain_df['W1'] = rain_df['W1'].fillna('').apply(lambda x: (x[:20] + '...') if len(x) > 20 else x)
+    days = pd.to_datetime(df['time'], errors='coerce', dayfirst=True).dt.normalize()
+    w1 = df['W1'].fillna('').astype(str)
+    w1 = w1.where(w1.str.len() <= 20, w1.str[:20] + '...')
+    rain_df = pd.DataFrame({
+        'time': days,
+        'RRR': pd.to_numeric(df['RRR'], errors='coerce').fillna(0),
+        'tR': pd.to_numeric(df['tR'], errors='coerce'),
+        'sss': pd.to_numeric(df['sss'], errors='coerce').interpolate(method='linear'),
+    })
     
-    grouped_rain_df = rain_df.groupby('time').agg({
-        'W1': lambda x: x.mode()[0] if not x.mode().empty else np.nan,
-        'RRR': lambda x: (x.sum() / rain_df.loc[x.index, 'tR'].sum()) * 24 if rain_df.loc[x.index, 'tR'].sum() != 0 else np.nan,
-        'sss': 'max'
-    }).reset_index()
+    grouped = rain_df.groupby('time')
+    if daily is not None:
+        # Дни, где был только штиль, в графике не показываются
+        sums = daily[['rrr_sum', 'tr_sum']].set_axis(['RRR', 'tR'], axis=1).reindex(grouped.size().index)
+    else:
+        sums = grouped[['RRR', 'tR']].sum()
+    daily_rain = (sums['RRR'] / sums['tR'] * 24).where(sums['tR'] != 0)
     
-    return grouped_rain_df
+    grouped_rain_df = pd.DataFrame({
+        'W1': _daily_mode(days, w1),
+        'RRR': daily_rain,
+        'sss': grouped['sss'].max(),
+    })
+    grouped_rain_df.index = grouped_rain_df.index.date
+    return grouped_rain_df.rename_axis('time').reset_index()
 
 
-def create_rain(file_path: str, fourth_image_path: str) -> str:
+def create_rain(dataset: MeteoDataset, fourth_image_path: str) -> str:
     """Создает график осадков."""
-    extracted_path = extract_gzip_file(file_path)
-    try:
-        df = clean_data(extracted_path)
-        rain_df = rain_processing(df)
-        
-        fig, ax = plt.subplots(figsize=REGULAR_FIGURE_SIZE)
-        
-        # Получаем уникальные типы осадков и создаем маппинг цветов
-        unique_w1 = rain_df['W1'].unique()
-        color_map = {w1: CUSTOM_COLORS[i % len(CUSTOM_COLORS)] for i, w1 in enumerate(unique_w1)}
-        
-        # Группируем данные по типу осадков для создания легенды
-        for w1_type in unique_w1:
-            mask = rain_df['W1'] == w1_type
-            ax.bar(rain_df[mask]['time'], rain_df[mask]['RRR'],
-                   label=w1_type, color=color_map[w1_type])
-        
-        ax.set_xlabel('время')
-        ax.set_ylabel('количество осадков, мм')
-        ax.set_title('осадки')
-        
-        # Вторая ось Y для снежного покрова
-        ax2 = ax.twinx()
-        ax2.plot(rain_df['time'], rain_df['sss'], color='black', linewidth=2,
-                 label='высота снежного покрова, см')
-        ax2.set_ylabel('высота снежного покрова, см')
-        
-        # Настройка легенды
-        ax.legend(title='тип осадков', bbox_to_anchor=(1.22, 1), loc='upper left')
-        
-        _setup_date_axis(ax)
-        
-        _add_copyright(fig)
-        
-        plt.savefig(fourth_image_path, bbox_inches='tight', dpi=100)
-        plt.close(fig)
-        return fourth_image_path
-    finally:
-        if os.path.exists(extracted_path):
-            os.remove(extracted_path)
+    rain_df = rain_processing(dataset.data, dataset.daily)
+    return _render('rain', rain_df, fourth_image_path)
 
 
-def create_temperature(file_path: str, third_image_path: str) -> str:
-    """Создает график температуры и влажности."""
-    extracted_path = extract_gzip_file(file_path)
-    try:
-        df = clean_data(extracted_path)
-        sorted_df = temperature_processing(df)
-        
-        # Делаем график шире на 20% для лучшей читаемости с colorbar
-        fig, ax = plt.subplots(figsize=(12, 6))
-        
-        # Scatter plot с размером и цветом
-        scatter = ax.scatter(sorted_df['time'], sorted_df['T'],
-                            s=sorted_df['U'] * 10,
-                            c=sorted_df['T'],
-                            cmap='RdBu_r',
-                            vmin=TEMP_COLOR_MIN, vmax=TEMP_COLOR_MAX,
-                            edgecolors='black', linewidths=0.5,
-                            alpha=0.7)
-        
-        ax.set_xlabel('время')
-        ax.set_ylabel('температура, °C')
-        ax.set_title('температура и влажность')
-        
-        # Добавляем цветовую шкалу
-        cbar = plt.colorbar(scatter, ax=ax)
-        cbar.set_label('температура, °C')
-        
-        _setup_date_axis(ax)
-        
-        _add_copyright(fig)
-        
-        plt.savefig(third_image_path, bbox_inches='tight', dpi=100)
-        plt.close(fig)
-        return third_image_path
-    finally:
-        if os.path.exists(extracted_path):
-            os.remove(extracted_path)
+def create_temperature(dataset: MeteoDataset, third_image_path: str, vector_path: str | None = None) -> str:
+    """
+    Создает график температуры и влажности.
 
-def ADD(file_path: str) -> int:
+    vector_path — куда ещё сохранить тот же рисунок в svg или pdf (по расширению), если
+    наблюдений не больше TEMPERATURE_DENSE_POINTS; для более длинных рядов файл не пишется.
+    """
+    sorted_df = temperature_processing(dataset.data)
+    return _render('temperature', sorted_df, third_image_path, vector_path)
+
+
+@timed('ADD')
+def ADD(dataset: MeteoDataset) -> int:
     """Считает сумму положительных суточных средних температур (degree-days, Tbase=0)."""
-    extracted_path = extract_gzip_file(file_path)
-    try:
-        df = pd.read_excel(extracted_path)
-        df.columns = df.iloc[5]
-        df = df.drop(range(6))
-        df = df.rename(columns={df.columns[0]: 'time'})
-
-        df['time'] = pd.to_datetime(df['time'], errors='coerce', dayfirst=True).dt.date
-        df['T'] = pd.to_numeric(df['T'], errors='coerce')
-        df = df.dropna(subset=['time', 'T'])
-        daily = df.groupby('time', as_index=False)['T'].mean()
-        return int(daily['T'].clip(lower=0).sum())
-    finally:
-        if os.path.exists(extracted_path):
-            os.remove(extracted_path)
+    if dataset.window_sums is not None:
+        return dataset.window_sums.add
+    if dataset.daily is not None:
+        daily = dataset.daily[dataset.daily['t_count'] > 0]
+        return int((daily['t_sum'] / daily['t_count']).clip(lower=0).sum())
+    df = dataset.observations[['time', 'T']].copy()
+    df['time'] = pd.to_datetime(df['time'], errors='coerce', dayfirst=True).dt.date
+    df['T'] = pd.to_numeric(df['T'], errors='coerce')
+    df = df.dropna(subset=['time', 'T'])
+    daily = df.groupby('time', as_index=False)['T'].mean()
+    return int(daily['T'].clip(lower=0).sum())
 
 
 #def calculate_tbs(add: int) -> int:
@@ -521,7 +1459,162 @@ def verdict_tbs(tbs: int, add: int) -> str:
     return verdict
 
 
-def tell_verdict(file_path: str) -> str:
-    add = ADD(file_path)
+def tell_verdict(dataset: MeteoDataset) -> str:
+    add = ADD(dataset)
     tbs = calculate_tbs(add)
-    return verdict_tbs(tbs, add)
\ No newline at end of file
+    return verdict_tbs(tbs, add)
+
+def summarize_station(source: bytes | str, columnar_cache=None, digest: str | None = None,
+                      history=None) -> dict:
+    """
+    Разбирает архив одной станции для пакетной обработки и сводит его к тому, что нужно сетке и таблице.
+
+    Разбор — самая дорогая часть, поэтому в основной процесс и в задачу сетки
+    уходят не наблюдения, а несколько чисел: розы по 16 направлениям, ADD и период.
+
+    Args:
+        source, columnar_cache, digest, history: Как в load_meteo_dataset
+
+    Returns:
+        dict: name, wmo_id, period (строка «с — по»), add, tbs, rose (список из двух списков по 16 чисел)
+
+    Raises:
+        ValueError: Если внутри архива не Excel файл
+    """
+    dataset = load_meteo_dataset(source, columnar_cache, digest, history)
+    times = dataset.observations['time'].dropna()
+    period = f"{times.min():%d.%m.%Y} — {times.max():%d.%m.%Y}" if len(times) else ''
+    add = ADD(dataset)
+    return {
+        **dataset.station,
+        'period': period,
+        'add': add,
+        'tbs': calculate_tbs(add),
+        'rose': [values.tolist() for values in _combined_rose_values(dataset)],
+    }
+
+
+def create_station_grid(summaries: list[dict], output_image_path: str) -> str:
+    """Рисует совмещённые розы нескольких станций рядом (см. summarize_station)."""
+    roses = [
+        (summary['name'] or f'архив {index}', [np.asarray(values) for values in summary['rose']])
+        for index, summary in enumerate(summaries, start=1)
+    ]
+    with timed('plot_station_grid'):
+        return _get_template('station_grid', len(roses)).render(roses, output_image_path)
+
+
+@timed('rolling_roses')
+def rolling_roses(dataset: MeteoDataset, window: tuple[dt.date, dt.date] | None = None,
+                  decay_rate: float | None = None, step_hours: int = 24, max_frames: int = 120,
+                  index: TimeIndex | None = None) -> dict:
+    """
+    Совмещённые розы за скользящие сутки для анимации: кадр на каждые step_hours.
+
+    Все кадры — запросы к одному TimeIndex архива (две строки накопленных сумм на
+    кадр), а не processing по срезу на каждый кадр. Кадры идут до последнего
+    наблюдения окна, не больше max_frames штук.
+
+    Args:
+        dataset: Разобранный архив
+        window, decay_rate, index: Как в reframe_dataset
+        step_hours: Шаг между кадрами, часов
+        max_frames: Наибольшее число кадров
+
+    Returns:
+        dict: titles — подписи кадров, values — для каждого кадра нормализованные
+        умная и простая розы по 16 чисел (как _combined_rose_values)
+
+    Raises:
+        ValueError: Если в окне нет наблюдений ветра
+    """
+    framed = reframe_dataset(dataset, window, decay_rate, index)
+    index = index or dataset.time_index
+    first, last = 0, len(index.times)
+    if window is not None:
+        first, last = index.rows(np.datetime64(window[0], 'D'), np.datetime64(window[1], 'D') + np.timedelta64(1, 'D'))
+    if last <= first:
+        raise ValueError("❌ В архиве нет наблюдений ветра для анимации")
+
+    # Кадры кончаются на границах шага, последний — сразу после последнего наблюдения
+    latest_hour = index.times[last - 1].astype('datetime64[h]').astype(np.int64)
+    final_end = np.datetime64(int((latest_hour // step_hours + 1) * step_hours), 'h')
+    ends = final_end - np.timedelta64(step_hours, 'h') * np.arange(max_frames)[::-1]
+    starts = ends - np.timedelta64(ANIMATION_SPAN_HOURS, 'h')
+    # Кадры целиком внутри окна; если окно короче суток — один последний кадр
+    inside = starts >= index.times[first].astype('datetime64[h]')
+    inside[-1] = True
+    ends, starts = ends[inside].astype('datetime64[ns]'), starts[inside].astype('datetime64[ns]')
+    los = np.clip(np.searchsorted(index.times, starts), first, last)
+    his = np.clip(np.searchsorted(index.times, ends), first, last)
+
+    simple = index.rose(los, his)
+    titles, values = [], []
+    for start, end, lo, hi, counts in zip(starts, ends, los, his, simple):
+        smart = index.smart_rose(lo, hi, framed.decay_rate)
+        if smart is None:
+            # Время не кратно часу — умная роза кадра по его наблюдениям
+            times = framed.data['time']
+            frame = framed.data[(times >= start) & (times < end)]
+            smart = smartrose_processing(frame, WIND_DIRECTIONS, framed.decay_rate)['importance_wind'].to_numpy()
+        titles.append(f"{pd.Timestamp(start):%d.%m.%Y %H:%M} — {pd.Timestamp(end):%d.%m %H:%M}")
+        values.append([_normalize(smart).tolist(), _normalize(counts.astype('float64')).tolist()])
+    return {'titles': titles, 'values': values}
+
+
+def render_rose_frames(values: list, titles: list[str], output_paths: list[str]) -> list[str]:
+    """Рисует кадры анимации (см. rolling_roses); пул рисует части кадров параллельно."""
+    return [
+        _render('animation_frame', [np.asarray(rose) for rose in frame], title, output_path)
+        for frame, title, output_path in zip(values, titles, output_paths)
+    ]
+
+
+def _encode_gif(frame_paths: list[str], output_path: str, fps: float) -> str:
+    """GIF с одной палитрой на все кадры: цвета роз одни и те же, поэтому и без дизеринга."""
+    images = [Image.open(path).convert('RGB') for path in frame_paths]
+    palette = images[0].quantize(colors=64)
+    frames = [palette] + [image.quantize(palette=palette, dither=Image.Dither.NONE) for image in images[1:]]
+    frames[0].save(output_path, save_all=True, append_images=frames[1:], duration=round(1000 / fps), loop=0)
+    return output_path
+
+
+def _encode_video(frame_paths: list[str], output_path: str, fps: float) -> str:
+    """MP4 (H.264) через ffmpeg: кадры передаются в stdin без промежуточных файлов."""
+    frames = b''.join(Path(path).read_bytes() for path in frame_paths)
+    subprocess.run(
+        ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'image2pipe', '-framerate', f'{fps:g}', '-i', '-',
+         '-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2', '-pix_fmt', 'yuv420p', '-movflags', '+faststart',
+         output_path],
+        input=frames, check=True,
+    )
+    return output_path
+
+
+def encode_animation(frame_paths: list[str], output_path: str, max_bytes: int, video: bool = False) -> str:
+    """
+    Собирает кадры в GIF, а если video и установлен ffmpeg — в MP4.
+
+    Если файл больше max_bytes, остаётся каждый второй кадр с той же общей
+    длительностью, и так до тех пор, пока файл не уместится.
+
+    Args:
+        output_path: Путь без расширения — добавляется .gif или .mp4
+
+    Returns:
+        Путь к готовому файлу
+
+    Raises:
+        ValueError: Если не умещается даже один кадр
+    """
+    encode, extension = (_encode_video, '.mp4') if video and shutil.which('ffmpeg') else (_encode_gif, '.gif')
+    stride = 1
+    with timed('encode_animation'):
+        while True:
+            frames = frame_paths[::stride]
+            path = encode(frames, output_path + extension, ANIMATION_FPS / stride)
+            if os.path.getsize(path) <= max_bytes:
+                return path
+            if len(frames) == 1:
+                raise ValueError(f"❌ Анимация не помещается в {max_bytes / 1024 / 1024:g} МБ")
+            stride *= 2
@@ -0,0 +1,78 @@
+import asyncio
+import contextlib
+import logging
+import signal
+
+
+class GracefulShutdown:
+    """
+    Плавная остановка бота по SIGINT/SIGTERM.
+
+    После сигнала бот продолжает получать обновления, но новые архивы не
+    берёт (draining). Уже начатые запросы дорисовываются, и только потом
+    приложение останавливается. Если запросы не успели за timeout секунд,
+    они отменяются. Повторный сигнал останавливает бота сразу.
+
+    Args:
+        timeout: Сколько секунд ждать незавершённых запросов
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.draining = False
+        self._tasks: set[asyncio.Task] = set()
+        self._idle = asyncio.Event()
+        self._drain_task: asyncio.Task | None = None
+
+    @property
+    def in_flight(self) -> int:
+        """Сколько запросов сейчас обрабатывается."""
+        return len(self._tasks)
+
+    @contextlib.contextmanager
+    def track(self):
+        """Учитывает текущую задачу как незавершённый запрос на время блока with."""
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            yield
+        finally:
+            self._tasks.discard(task)
+            if not self._tasks:
+                self._idle.set()
+
+    def install(self, application) -> None:
+        """Ставит обработчики сигналов в текущий цикл событий вместо стандартных из PTB."""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.begin, application)
+            except NotImplementedError:
+                # Windows: остаётся KeyboardInterrupt без ожидания запросов
+                logging.warning("graceful shutdown is not supported on this platform")
+                return
+
+    def begin(self, application) -> None:
+        """Начинает остановку; при повторном вызове останавливает приложение сразу."""
+        if self.draining:
+            logging.info("second stop signal, cancelling %d requests", self.in_flight)
+            self._cancel()
+            application.stop_running()
+            return
+        self.draining = True
+        logging.info("stopping: waiting for %d requests (up to %g s)", self.in_flight, self.timeout)
+        self._drain_task = asyncio.ensure_future(self._drain(application))
+
+    async def _drain(self, application) -> None:
+        if self._tasks:
+            self._idle.clear()
+            try:
+                await asyncio.wait_for(self._idle.wait(), self.timeout)
+            except asyncio.TimeoutError:
+                logging.warning("drain timeout, cancelling %d requests", self.in_flight)
+                self._cancel()
+        application.stop_running()
+
+    def _cancel(self) -> None:
+        for task in self._tasks:
+            task.cancel()
@@ -0,0 +1,152 @@
+import logging
+import struct
+import zlib
+from collections import Counter
+
+from archive import ZIP_MAGIC, read_zip_members
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+# Сигнатура составного документа OLE2 — в нём лежит книга .xls (BIFF8)
+OLE2_MAGIC = bytes.fromhex('D0CF11E0A1B11AE1')
+
+# Расширение, с которым rp5 отдаёт архивы
+ARCHIVE_SUFFIX = '.xls.gz'
+
+# Сколько байт распакованного .xls распаковывать ради сигнатуры OLE2
+SIGNATURE_SEARCH_BYTES = 256 * 1024
+
+GZIP_CHUNK_SIZE = 64 * 1024
+
+
+def _compressed_chunks(archive: bytes | str):
+    """Отдаёт сжатый архив кусками — из памяти или с диска."""
+    if isinstance(archive, bytes):
+        for start in range(0, len(archive), GZIP_CHUNK_SIZE):
+            yield archive[start:start + GZIP_CHUNK_SIZE]
+    else:
+        with open(archive, 'rb') as f:
+            yield from iter(lambda: f.read(GZIP_CHUNK_SIZE), b'')
+
+
+def _read_bytes(archive: bytes | str, count: int) -> bytes:
+    """Первые count байт архива или, при отрицательном count, последние -count."""
+    if isinstance(archive, bytes):
+        return archive[:count] if count >= 0 else archive[count:]
+    with open(archive, 'rb') as f:
+        if count < 0:
+            f.seek(0, 2)
+            f.seek(max(0, f.tell() + count))
+            count = -count
+        return f.read(count)
+
+
+def read_prefix(archive: bytes | str, size: int) -> bytes:
+    """
+    Распаковывает только первые size байт архива.
+
+    Raises:
+        zlib.error: Если это не gzip архив
+    """
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    prefix = b''
+    for chunk in _compressed_chunks(archive):
+        prefix += decompressor.decompress(chunk, size - len(prefix))
+        if len(prefix) >= size or decompressor.eof:
+            break
+    return prefix
+
+
+def declared_size(archive: bytes | str) -> int:
+    """
+    Размер распакованного содержимого, записанный в конце gzip архива (поле ISIZE).
+
+    Поле хранит размер по модулю 2**32 и только последнего блока, поэтому ему нельзя
+    верить на слово: оно лишь позволяет сразу отклонить архив, который сам
+    признаётся, что он слишком большой.
+    """
+    tail = _read_bytes(archive, -4)
+    if len(tail) < 4:
+        return 0
+    return struct.unpack('<I', tail)[0]
+
+
+class UploadValidator:
+    """
+    Поэтапная проверка загруженного архива: от дешёвых проверок к дорогим.
+
+    1. Имя и размер документа — до скачивания (document.file_name, document.file_size).
+    2. Сигнатура gzip, заявленный в нём размер и сигнатура OLE2 в начале распакованного
+       файла — распаковываются только SIGNATURE_SEARCH_BYTES.
+    3. Предел распакованного размера — при полной распаковке (unpack_archive).
+
+    Заголовок таблицы rp5 проверяется уже по разобранной первой строке листа (read_rp5):
+    искать его в байтах ненадёжно — xlrd хранит строки то в UTF-16, то сжатыми
+    в 8 бит, и строка может разрываться записью CONTINUE.
+
+    Zip с архивами нескольких станций проходит этап 1 с пределом на весь пакет,
+    а каждый архив из него — этапы 2 и 3 отдельно (см. read_batch).
+
+    Отказы считаются по этапам в rejections.
+
+    Args:
+        max_archive_bytes: Максимальный размер архива .xls.gz
+        max_xls_bytes: Максимальный размер .xls после распаковки
+        max_batch_files: Сколько архивов можно прислать одним zip или альбомом
+    """
+
+    def __init__(self, max_archive_bytes: int, max_xls_bytes: int, max_batch_files: int = 1):
+        self.max_archive_bytes = max_archive_bytes
+        self.max_xls_bytes = max_xls_bytes
+        self.max_batch_files = max_batch_files
+        self.rejections = Counter()
+
+    def reject(self, stage: str, message: str) -> tuple[bool, str]:
+        """Засчитывает отказ на этапе stage и возвращает (False, message)."""
+        self.rejections[stage] += 1
+        logging.info("upload rejected at %s: %s (%s)", stage, message, dict(self.rejections))
+        return False, message
+
+    def check_document(self, file_name: str | None, file_size: int | None,
+                       batch: bool = False) -> tuple[bool, str]:
+        """Этап 1: проверка по данным сообщения, до скачивания; batch — zip с несколькими архивами."""
+        if not batch and file_name is not None and not file_name.lower().endswith(ARCHIVE_SUFFIX):
+            return self.reject('file_name', f"❌ Мы принимаем только файлы {ARCHIVE_SUFFIX}")
+        max_bytes = self.max_archive_bytes * (self.max_batch_files if batch else 1)
+        if file_size is not None and file_size > max_bytes:
+            return self.reject(
+                'file_size',
+                f"❌ Файл слишком большой: больше {max_bytes // (1024 * 1024)} МБ",
+            )
+        return True, "✅ Файл прошёл валидацию"
+
+    def read_batch(self, archive: bytes | str) -> tuple[list[tuple[str, bytes]], str]:
+        """
+        Достаёт архивы из zip.
+
+        Returns:
+            tuple: (список (имя, архив), '') или ([], сообщение об отказе)
+        """
+        if _read_bytes(archive, len(ZIP_MAGIC)) != ZIP_MAGIC:
+            return [], self.reject('zip', "❌ Файл повреждён или не является zip архивом")[1]
+        try:
+            return read_zip_members(archive, self.max_batch_files, self.max_archive_bytes), ''
+        except ValueError as e:
+            return [], self.reject('zip', str(e))[1]
+
+    def check_archive(self, archive: bytes | str) -> tuple[bool, str]:
+        """Этап 2: проверка скачанного архива без полной распаковки."""
+        if _read_bytes(archive, len(GZIP_MAGIC)) != GZIP_MAGIC:
+            return self.reject('gzip', "❌ Файл повреждён или не является gzip архивом")
+        if declared_size(archive) > self.max_xls_bytes:
+            return self.reject(
+                'declared_size',
+                f"❌ Архив слишком большой: после распаковки больше {self.max_xls_bytes // (1024 * 1024)} МБ",
+            )
+        try:
+            prefix = read_prefix(archive, min(SIGNATURE_SEARCH_BYTES, self.max_xls_bytes))
+        except zlib.error:
+            return self.reject('gzip', "❌ Файл повреждён или не является gzip архивом")
+        if not prefix.startswith(OLE2_MAGIC):
+            return self.reject('excel', "❌ Внутри архива должен быть Excel файл (.xls)")
+        return True, "✅ Файл прошёл валидацию"
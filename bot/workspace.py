@@ -0,0 +1,127 @@
+import asyncio
+import contextlib
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass, field
+
+# Как обрабатывать несколько архивов от одного пользователя
+USER_POLICIES = ('parallel', 'coalesce', 'cancel')
+
+
+class Workspace:
+    """
+    Отдельная папка одного запроса: архив, распакованный .xls и картинки.
+
+    Пути не зависят от других запросов того же пользователя, поэтому два
+    одновременно присланных архива не перезаписывают файлы друг друга.
+    Папка удаляется целиком при выходе из блока with, в том числе при ошибке
+    и при отмене запроса.
+
+    Args:
+        root: Папка, в которой создаются рабочие папки запросов
+        user_id: Пользователь — для читаемого имени папки
+    """
+
+    def __init__(self, root: str, user_id: int):
+        os.makedirs(root, exist_ok=True)
+        self.path = tempfile.mkdtemp(dir=root, prefix=f'{user_id}_')
+
+    def file(self, name: str) -> str:
+        """Путь к файлу name внутри рабочей папки."""
+        return os.path.join(self.path, name)
+
+    def cleanup(self) -> None:
+        """Удаляет рабочую папку со всем содержимым."""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cleanup()
+
+
+def clear_workspaces(root: str) -> None:
+    """Удаляет рабочие папки, оставшиеся после аварийной остановки бота."""
+    if not os.path.isdir(root):
+        return
+    for entry in os.scandir(root):
+        if entry.is_dir():
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+@dataclass
+class _UserState:
+    """Запросы одного пользователя: очередь по одному и последний пришедший."""
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    latest: int = 0
+    active: int = 0
+    task: asyncio.Task | None = None
+
+
+class UserRequests:
+    """
+    Согласует запросы одного пользователя.
+
+    Политики:
+        parallel — запросы обрабатываются независимо;
+        coalesce — по одному; из ждущих своей очереди обрабатывается только
+            последний, более ранние пропускаются;
+        cancel — новый запрос отменяет обрабатываемый предыдущий.
+
+    Задача, уже переданная в пул процессов, при отмене доработает в воркере,
+    но её результат никуда не отправится.
+
+    Args:
+        policy: Одна из USER_POLICIES
+    """
+
+    def __init__(self, policy: str):
+        if policy not in USER_POLICIES:
+            raise ValueError(f"Неизвестная политика {policy!r}, ожидается одна из {USER_POLICIES}")
+        self.policy = policy
+        self._users: dict[int, _UserState] = {}
+        self._superseded: set[asyncio.Task] = set()
+
+    @contextlib.asynccontextmanager
+    async def turn(self, user_id: int):
+        """
+        Дожидается очереди запроса пользователя на время блока async with.
+
+        Yields:
+            bool: False, если запрос устарел и его не нужно обрабатывать
+        """
+        state = self._users.setdefault(user_id, _UserState())
+        state.latest += 1
+        ticket = state.latest
+        state.active += 1
+        try:
+            if self.policy == 'coalesce':
+                async with state.lock:
+                    yield ticket == state.latest
+            elif self.policy == 'cancel':
+                current = asyncio.current_task()
+                if state.task is not None and not state.task.done():
+                    self._superseded.add(state.task)
+                    state.task.cancel()
+                state.task = current
+                try:
+                    yield True
+                finally:
+                    if state.task is current:
+                        state.task = None
+            else:
+                yield True
+        finally:
+            state.active -= 1
+            if not state.active:
+                del self._users[user_id]
+
+    def superseded(self) -> bool:
+        """Был ли текущий запрос отменён более новым запросом того же пользователя."""
+        task = asyncio.current_task()
+        if task in self._superseded:
+            self._superseded.discard(task)
+            return True
+        return False
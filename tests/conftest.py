@@ -0,0 +1,36 @@
+"""
+Общие фикстуры тестов.
+
+Модули бота импортируют друг друга по имени файла (как при запуске bot/main.py),
+а эталонные реализации и генератор синтетических архивов лежат в bench/,
+поэтому обе папки добавляются в sys.path.
+"""
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'bot'))
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+
+import pytest  # noqa: E402
+
+import rozovetrovnitsa as rz  # noqa: E402
+from synthetic import make_archive, read_archive  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def archive(tmp_path_factory) -> str:
+    """Синтетический архив rp5 за год, наблюдения раз в 3 часа."""
+    return make_archive(str(tmp_path_factory.mktemp('archives') / 'archive.xls.gz'), 1)
+
+
+@pytest.fixture(scope='session')
+def xls(archive) -> bytes:
+    """Распакованный .xls синтетического архива."""
+    return read_archive(archive)
+
+
+@pytest.fixture(scope='session')
+def observations(xls):
+    """Наблюдения синтетического архива в том виде, как их отдаёт read_rp5."""
+    return rz.read_rp5(xls)
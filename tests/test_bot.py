@@ -0,0 +1,86 @@
+"""
+Сквозная проверка бота против заглушки Bot API (bench/fake_telegram.py), как в bench/load_test.py.
+
+Бот запускается отдельным процессом без кэшей один раз на модуль; каждый тест
+присылает сообщения от своего пользователя и ждёт последнего ответа.
+"""
+import shutil
+import signal
+import subprocess
+import threading
+
+import pytest
+
+from fake_telegram import FakeTelegram
+from load_test import final_status, start_bot
+
+# Сколько ждать ответа на архив или команду, секунд: первый архив ждёт ещё и прогрева воркеров
+REPLY_TIMEOUT = 300
+CHART_COUNT = 4
+
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('bot')
+    server = FakeTelegram(('127.0.0.1', 0), is_final=final_status)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with pytest.MonkeyPatch.context() as patch:
+        # Ответы считаются по отдельным картинкам, а команды одного пользователя не должны вытеснять друг друга
+        patch.setenv('RENDER_MODE', 'sequential')
+        patch.setenv('USER_POLICY', 'parallel')
+        bot = start_bot(server, str(directory / 'bot.log'), no_cache=True)
+    try:
+        if not server.connected.wait(60):
+            pytest.fail(f"бот не подключился к заглушке, лог:\n{(directory / 'bot.log').read_text()}")
+        yield server
+    finally:
+        bot.send_signal(signal.SIGINT)
+        try:
+            bot.wait(60)
+        except subprocess.TimeoutExpired:
+            bot.kill()
+        server.shutdown()
+
+
+@pytest.fixture(scope='module')
+def file_id(server, archive) -> str:
+    return server.add_file(archive)
+
+
+def replies(server, *uploads) -> list[list[str]]:
+    """Дожидается последних ответов и возвращает виды ответов на каждое сообщение."""
+    assert server.wait_finished(REPLY_TIMEOUT)
+    return [[kind for kind, _ in upload.replies] for upload in uploads]
+
+
+def test_upload_sends_charts(server, file_id):
+    upload = server.send_document(1, file_id)
+    kinds, = replies(server, upload)
+    assert upload.status == 'ok'
+    assert kinds.count('photo') == CHART_COUNT
+
+
+def test_wrong_name_rejected_before_download(server, archive, tmp_path):
+    path = str(tmp_path / 'archive.csv')
+    shutil.copy(archive, path)
+    upload = server.send_document(2, server.add_file(path))
+    kinds, = replies(server, upload)
+    assert upload.status == 'error'
+    assert 'photo' not in kinds
+
+
+def test_commands_rerender_last_archive(server, file_id):
+    replies(server, server.send_document(3, file_id))
+    window = server.send_command(3, '/window 2025-03-01 2025-06-01')
+    decay = server.send_command(3, '/decay 0.3')
+    window_kinds, decay_kinds = replies(server, window, decay)
+    assert (window.status, decay.status) == ('ok', 'ok')
+    assert window_kinds.count('photo') == CHART_COUNT
+    # /decay перерисовывает только розу ветров
+    assert decay_kinds.count('photo') == 1
+
+
+def test_command_without_archive(server):
+    upload = server.send_command(4, '/window')
+    replies(server, upload)
+    assert upload.status == 'rejected'
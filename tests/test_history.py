@@ -0,0 +1,61 @@
+"""История станции: суточные суммы из истории дают те же графики, что расчёт по строкам архива."""
+import os
+
+import numpy as np
+import pytest
+
+import rozovetrovnitsa as rz
+from bench_history import NEW_DAYS, aggregates
+from history import StationHistory
+
+
+@pytest.fixture
+def history(tmp_path) -> StationHistory:
+    return StationHistory(str(tmp_path / 'history'), max_bytes=1 << 40)
+
+
+def known_part(observations):
+    """Архив без последних NEW_DAYS суток — то, что станция уже прислала раньше."""
+    times = observations['time'].to_numpy(dtype='datetime64[ns]')
+    cutoff = times[0].astype('datetime64[D]') - (NEW_DAYS - 1)
+    known = observations[times < cutoff]
+    known.attrs = dict(observations.attrs)
+    return known
+
+
+def test_history_matches_row_path(history, observations):
+    rz.merge_station_history(history, rz.MeteoDataset(known_part(observations)))
+    merged = rz.MeteoDataset(observations)
+    merged.daily = rz.merge_station_history(history, merged)
+    assert merged.daily is not None
+    for expected, actual in zip(aggregates(rz.MeteoDataset(observations)), aggregates(merged)):
+        assert np.allclose(expected, actual, equal_nan=True)
+
+
+def test_repeated_archive_adds_nothing(history, observations):
+    first = rz.merge_station_history(history, rz.MeteoDataset(observations))
+    second = rz.merge_station_history(history, rz.MeteoDataset(observations))
+    assert np.allclose(first.to_numpy(dtype='float64'), second.to_numpy(dtype='float64'), equal_nan=True)
+
+
+def test_archive_without_column_skips_history(history, observations):
+    partial = observations.drop(columns=['Ff'])
+    partial.attrs = dict(observations.attrs)
+    rz.merge_station_history(history, rz.MeteoDataset(observations))
+    assert rz.merge_station_history(history, rz.MeteoDataset(partial)) is None
+
+
+def test_damaged_history_is_rebuilt(history, observations):
+    rz.merge_station_history(history, rz.MeteoDataset(known_part(observations)))
+    os.remove(os.path.join(history.path(observations.attrs['station']['wmo_id']), 'daily.arrow'))
+    assert rz.merge_station_history(history, rz.MeteoDataset(observations)) is not None
+
+
+def test_history_failure_does_not_fail_upload(xls):
+    class BrokenHistory:
+        def lock(self, station_id):
+            raise OSError('диск недоступен')
+
+    dataset = rz.load_meteo_dataset(xls, history=BrokenHistory())
+    assert dataset.daily is None
+    assert len(dataset.observations) > 0
@@ -0,0 +1,48 @@
+"""Векторные расчёты графиков совпадают с прежними реализациями из бенчмарков."""
+import numpy as np
+import pandas as pd
+
+import rozovetrovnitsa as rz
+from bench_rain import legacy_rain_processing
+from bench_smartrose import legacy_smartrose_processing, make_observations
+from bench_speedrose import groupby_speed_processing, histogram2d_speed_processing, make_speed_observations
+from columnar import ColumnarCache
+from result_cache import archive_digest
+
+
+def test_rain_matches_legacy(observations):
+    df = rz.MeteoDataset(observations).data
+    # Суммы осадков за сутки считаются другим порядком сложения: расхождение в последнем знаке
+    pd.testing.assert_frame_equal(
+        legacy_rain_processing(df), rz.rain_processing(df), check_exact=False, rtol=1e-12, atol=0,
+    )
+
+
+def test_smartrose_matches_legacy():
+    # Короткая выборка, чтобы старая реализация не ушла в underflow весов
+    df = make_observations(5000)
+    pd.testing.assert_frame_equal(
+        legacy_smartrose_processing(df, rz.WIND_DIRECTIONS),
+        rz.smartrose_processing(df.assign(DD=rz.encode_directions(df['DD'])), rz.WIND_DIRECTIONS),
+        check_dtype=False, rtol=1e-9,
+    )
+
+
+def test_speedrose_matches_groupby():
+    df = make_speed_observations(20000)
+    encoded = df.assign(DD=rz.encode_directions(df['DD']))
+    expected = groupby_speed_processing(df, rz.WIND_DIRECTIONS).to_numpy()
+    shares = rz.speed_processing(encoded, rz.WIND_DIRECTIONS)
+    np.testing.assert_allclose(shares.to_numpy(), expected, rtol=1e-9)
+    np.testing.assert_allclose(histogram2d_speed_processing(encoded, rz.WIND_DIRECTIONS).to_numpy(), expected, rtol=1e-9)
+    # Доли классов и штиль вместе — все наблюдения ветра
+    assert abs(shares.to_numpy().sum() + shares.attrs['calm'] - 100) < 1e-9
+
+
+def test_columnar_cache_round_trip(xls, observations, tmp_path):
+    cache = ColumnarCache(str(tmp_path / 'columnar'), max_bytes=1 << 40)
+    digest = archive_digest(xls)
+    parsed = rz.load_meteo_dataset(xls, cache, digest).observations
+    assert cache.load(digest) is not None
+    pd.testing.assert_frame_equal(parsed, rz.load_meteo_dataset(None, cache, digest).observations)
+    pd.testing.assert_frame_equal(parsed, observations)
@@ -0,0 +1,38 @@
+"""Окна /window и кадры /animate по TimeIndex совпадают с расчётом по строкам."""
+import numpy as np
+import pytest
+
+import rozovetrovnitsa as rz
+from bench_animation import sliced_roses
+from bench_time_index import aggregates, random_windows
+
+
+@pytest.fixture(scope='module')
+def dataset(observations) -> rz.MeteoDataset:
+    return rz.MeteoDataset(observations)
+
+
+def test_window_matches_row_scan(dataset, observations):
+    for window in random_windows(observations, 20):
+        simple, smart, add = aggregates(rz.MeteoDataset(rz.reframe_dataset(dataset, window).observations))
+        simple_index, smart_index, add_index = aggregates(rz.reframe_dataset(dataset, window))
+        assert np.array_equal(simple, simple_index)
+        assert np.allclose(smart, smart_index, rtol=1e-9, atol=1e-12 * smart.max())
+        # ADD отбрасывает дробную часть, а разность накопленных сумм отличается от суммы в последних знаках
+        assert abs(add - add_index) <= 1
+
+
+def test_window_with_prebuilt_index(dataset, observations):
+    index = rz.build_time_index(dataset)
+    window = random_windows(observations, 1, seed=1)[0]
+    expected = aggregates(rz.reframe_dataset(dataset, window))
+    actual = aggregates(rz.reframe_dataset(dataset, window, index=index))
+    assert np.array_equal(expected[0], actual[0])
+    assert np.allclose(expected[1], actual[1])
+    assert expected[2] == actual[2]
+
+
+def test_rolling_roses_match_slices(dataset):
+    frames = rz.rolling_roses(dataset, step_hours=6, max_frames=40)
+    assert len(frames['titles']) == 40
+    assert np.allclose(np.array(sliced_roses(dataset, frames['titles'])), np.array(frames['values']))
@@ -0,0 +1,107 @@
+"""Поэтапная проверка загрузок: настоящий архив rp5 проходит, остальное отклоняется на своём этапе."""
+import gzip
+import io
+import os
+import zipfile
+import zlib
+
+import pytest
+import xlwt
+
+import rozovetrovnitsa as rz
+from archive import unpack_archive
+from validation import UploadValidator
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def validator() -> UploadValidator:
+    return UploadValidator(max_archive_bytes=20 * MB, max_xls_bytes=200 * MB, max_batch_files=3)
+
+
+def foreign_xls(header: str) -> bytes:
+    """Книга .xls с одной таблицей, первая колонка которой называется header."""
+    book = xlwt.Workbook()
+    sheet = book.add_sheet('data')
+    for column, name in enumerate([header, 'T', 'DD', 'Ff']):
+        sheet.write(0, column, name)
+    sheet.write(1, 0, '17.10.2025 21:00')
+    sheet.write(1, 1, 5.0)
+    buffer = io.BytesIO()
+    book.save(buffer)
+    return buffer.getvalue()
+
+
+def test_accepts_rp5_archive(validator, archive):
+    assert validator.check_document('archive.xls.gz', os.path.getsize(archive))[0]
+    with open(archive, 'rb') as f:
+        content = f.read()
+    # Архив на диске и в памяти
+    for source in (archive, content):
+        assert validator.check_archive(source)[0]
+    assert not validator.rejections
+
+
+def test_rejects_before_download(validator):
+    assert not validator.check_document('archive.csv', 1024)[0]
+    assert not validator.check_document('archive.xls.gz', 21 * MB)[0]
+    # Zip с несколькими станциями проверяется по размеру всего пакета, имя — у архивов внутри
+    assert validator.check_document('stations.zip', 50 * MB, batch=True)[0]
+    assert validator.rejections == {'file_name': 1, 'file_size': 1}
+
+
+def test_rejects_not_gzip(validator):
+    assert not validator.check_archive(os.urandom(4096))[0]
+    assert validator.rejections == {'gzip': 1}
+
+
+def test_rejects_gzip_bomb_by_declared_size(validator):
+    bomb = gzip.compress(bytes(300 * MB), compresslevel=1)
+    assert not validator.check_archive(bomb)[0]
+    assert validator.rejections == {'declared_size': 1}
+
+
+def test_bomb_with_lying_size_stops_at_limit():
+    compressor = zlib.compressobj(1, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    bomb = compressor.compress(bytes(8 * MB)) + compressor.flush()
+    # Поле ISIZE в конце gzip говорит, что внутри 1 КБ
+    bomb = bomb[:-4] + (1024).to_bytes(4, 'little')
+    with pytest.raises(ValueError):
+        unpack_archive(bomb, MB)
+
+
+def test_rejects_not_excel(validator):
+    assert not validator.check_archive(gzip.compress(b'time;T;DD;Ff\n' * 1000))[0]
+    assert validator.rejections == {'excel': 1}
+
+
+def test_rejects_excel_without_rp5_header(validator):
+    archive = gzip.compress(foreign_xls('Time'))
+    # Сигнатура OLE2 на месте: заголовок rp5 проверяется по разобранной таблице
+    assert validator.check_archive(archive)[0]
+    with pytest.raises(ValueError, match='Местное время'):
+        rz.load_meteo_dataset(gzip.decompress(archive))
+    assert len(rz.load_meteo_dataset(foreign_xls('Местное время в Москве')).observations) == 1
+
+
+def test_batch_members(validator, archive, tmp_path):
+    path = str(tmp_path / 'stations.zip')
+    with zipfile.ZipFile(path, 'w') as zf:
+        for index in range(2):
+            zf.write(archive, f'station{index}.xls.gz')
+        zf.writestr('readme.txt', 'не архив')
+    members, message = validator.read_batch(path)
+    assert not message
+    assert [name for name, _ in members] == ['station0.xls.gz', 'station1.xls.gz']
+    assert all(validator.check_archive(member)[0] for _, member in members)
+
+
+def test_rejects_too_many_batch_members(validator, archive, tmp_path):
+    path = str(tmp_path / 'stations.zip')
+    with zipfile.ZipFile(path, 'w') as zf:
+        for index in range(4):
+            zf.write(archive, f'station{index}.xls.gz')
+    members, message = validator.read_batch(path)
+    assert not members and message
+    assert validator.rejections == {'zip': 1}